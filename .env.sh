@@ -11,6 +11,9 @@ export REDIS_EXT_PORT=6380
 export DATA_WORKDIR_PATH=$PWD/data # Shares a data folder with containers
 export LOGS_WORKDIR_PATH=$PWD/logs # Shares a folder with containers that stores components' logs
 export APP_MODE=DEV # DEV or PROD
+export CONTAINER_MANAGER=DOCKER_SWARM # DOCKER_SWARM, or PROCESS to run services as local processes of admin
+export ARTIFACT_STORE=FILE_SYSTEM # FILE_SYSTEM to store trials' parameters in the data folder, or S3 (with ARTIFACT_STORE_S3_BUCKET)
+export DOCKER_REGISTRY= # Registry that built worker images are pushed to (e.g. localhost:5000), for multi-node swarms
 
 # Internal credentials for Rafiki's components
 export POSTGRES_USER=rafiki
@@ -4,15 +4,18 @@ import traceback
 import bcrypt
 import uuid
 import csv
+import threading
 
 from rafiki.db import Database
 from rafiki.constants import ServiceStatus, UserType, ServiceType, InferenceJobStatus, \
-    TrainJobStatus, ModelAccessRight, BudgetType
+    TrainJobStatus, ModelAccessRight, BudgetType, OutputPolicyType, EarlyStoppingType
 from rafiki.config import SUPERADMIN_EMAIL, SUPERADMIN_PASSWORD
 from rafiki.model import ModelLogger
-from rafiki.container import DockerSwarmContainerManager 
+from rafiki.container import make_container_manager
+from rafiki.artifact import make_artifact_store
 
 from .services_manager import ServicesManager
+from .operations import operations_manager as default_operations_manager
 
 logger = logging.getLogger(__name__)
 
@@ -26,24 +29,54 @@ class InvalidTrainJobError(Exception): pass
 class InvalidTrialError(Exception): pass
 class RunningInferenceJobExistsError(Exception): pass
 class NoModelsForTrainJobError(Exception): pass
+class InvalidOperationError(Exception): pass
+class InvalidOutputPolicyError(Exception): pass
+class InvalidBudgetError(Exception): pass
+
+# Artifact store shared across instances of admin, as e.g. the S3 artifact store creates a client
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+def _get_artifact_store():
+    global _artifact_store
+    with _artifact_store_lock:
+        if _artifact_store is None:
+            _artifact_store = make_artifact_store()
+        return _artifact_store
 
 class Admin(object):
-    def __init__(self, db=None, container_manager=None):
+    def __init__(self, db=None, container_manager=None, operations_manager=None, artifact_store=None):
         if db is None: 
             db = Database()
         if container_manager is None: 
-            container_manager = DockerSwarmContainerManager()
+            container_manager = make_container_manager()
+        if operations_manager is None:
+            operations_manager = default_operations_manager
+        if artifact_store is None:
+            artifact_store = _get_artifact_store()
             
         self._base_worker_image = '{}:{}'.format(os.environ['RAFIKI_IMAGE_WORKER'],
                                                 os.environ['RAFIKI_VERSION'])
 
         self._db = db
+        self._container_manager = container_manager
+        self._operations_manager = operations_manager
+        self._artifact_store = artifact_store
         self._services_manager = ServicesManager(db, container_manager)
 
     def seed(self):
         with self._db:
             self._seed_users()
 
+    def build_worker_images(self):
+        with self._db:
+            for model in self._db.get_all_models():
+                self._services_manager.build_worker_images(model)
+
+    def create_warm_worker_pools(self):
+        with self._db:
+            self._services_manager.create_warm_worker_pools(self._db.get_all_models())
+
     ####################################
     # Users
     ####################################
@@ -97,8 +130,10 @@ class Admin(object):
     ####################################
 
     def create_train_job(self, user_id, app, task, train_dataset_uri, 
-                        test_dataset_uri, budget, models=None):
+                        test_dataset_uri, budget, models=None, wait=True):
         
+        self._validate_budget(budget)
+
         # Compute auto-incremented app version
         train_jobs = self._db.get_train_jobs_of_app(app)
         app_version = max([x.app_version for x in train_jobs], default=0) + 1
@@ -139,8 +174,22 @@ class Admin(object):
                 model_id=model_id,
                 user_id=train_job.user_id
             )
+        self._db.commit()
 
-        train_job = self._services_manager.create_train_services(train_job.id)
+        # Deploy services of train job in the background if not waiting
+        if not wait:
+            operation = self._start_operation(user_id, '_create_train_services', train_job.id)
+            return {
+                'id': train_job.id,
+                'app': train_job.app,
+                'app_version': train_job.app_version,
+                'operation_id': operation['id']
+            }
+
+        return self._create_train_services(train_job.id)
+
+    def _create_train_services(self, train_job_id):
+        train_job = self._services_manager.create_train_services(train_job_id)
 
         return {
             'id': train_job.id,
@@ -320,7 +369,9 @@ class Admin(object):
             'datetime_stopped': trial.datetime_stopped,
             'model_name': model.name,
             'score': trial.score,
-            'knobs': trial.knobs
+            'knobs': trial.knobs,
+            'profile': trial.profile,
+            'metrics': trial.metrics
         }
 
     def get_trial_logs(self, trial_id):
@@ -343,13 +394,18 @@ class Admin(object):
         if trial is None:
             raise InvalidTrialError()
 
-        return trial.parameters
+        if trial.parameters_artifact_id is not None:
+            return self._artifact_store.get_artifact(trial.parameters_artifact_id)
+
+        return self._db.get_trial_parameters(trial.id)
 
     ####################################
     # Inference Job
     ####################################
 
-    def create_inference_job(self, user_id, app, app_version):
+    def create_inference_job(self, user_id, app, app_version, output_policy=None, wait=True):
+        self._validate_output_policy(output_policy)
+
         train_job = self._db.get_train_job_by_app_version(app, app_version=app_version)
         if train_job is None:
             raise InvalidTrainJobError('Have you started a train job for this app?')
@@ -366,12 +422,57 @@ class Admin(object):
 
         inference_job = self._db.create_inference_job(
             user_id=user_id,
-            train_job_id=train_job.id
+            train_job_id=train_job.id,
+            output_policy=output_policy
         )
         self._db.commit()
 
+        # Deploy services of inference job in the background if not waiting
+        if not wait:
+            operation = self._start_operation(user_id, '_create_inference_services', inference_job.id)
+            return {
+                'id': inference_job.id,
+                'train_job_id': train_job.id,
+                'app': train_job.app,
+                'app_version': train_job.app_version,
+                'operation_id': operation['id']
+            }
+
+        return self._create_inference_services(inference_job.id)
+
+    # Rejects invalid budgets upfront, instead of letting them fail every train worker
+    def _validate_budget(self, budget):
+        if not isinstance(budget, dict):
+            raise InvalidBudgetError('Budget should be a dictionary')
+
+        early_stopping = budget.get(BudgetType.EARLY_STOPPING)
+        early_stopping_types = [EarlyStoppingType.MEDIAN, EarlyStoppingType.SUCCESSIVE_HALVING]
+        if early_stopping is not None and early_stopping not in early_stopping_types:
+            raise InvalidBudgetError('Invalid early stopping type "{}" - should be one of {}' \
+                                    .format(early_stopping, early_stopping_types))
+
+    # Ensures that workers can compact predictions with the output policy, 
+    # as a bad output policy would fail every inference worker of the inference job
+    def _validate_output_policy(self, output_policy):
+        if output_policy is None:
+            return
+
+        if not isinstance(output_policy, dict):
+            raise InvalidOutputPolicyError('Output policy should be a dictionary')
+
+        policy_types = [OutputPolicyType.TOP_K, OutputPolicyType.FLOAT16, OutputPolicyType.ARGMAX]
+        for (policy_type, value) in output_policy.items():
+            if policy_type not in policy_types:
+                raise InvalidOutputPolicyError('Invalid output policy type "{}"'.format(policy_type))
+
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise InvalidOutputPolicyError('Value of output policy type "{}" should be a non-negative integer' \
+                                                .format(policy_type))
+
+    def _create_inference_services(self, inference_job_id):
         (inference_job, predictor_service) = \
-            self._services_manager.create_inference_services(inference_job.id)
+            self._services_manager.create_inference_services(inference_job_id)
+        train_job = self._db.get_train_job(inference_job.train_job_id)
 
         return {
             'id': inference_job.id,
@@ -381,6 +482,39 @@ class Admin(object):
             'predictor_host': self._get_service_host(predictor_service)
         }
 
+    def update_inference_job(self, user_id, app, app_version=-1, wait=True):
+        train_job = self._db.get_train_job_by_app_version(app, app_version=app_version)
+        if train_job is None:
+            raise InvalidRunningInferenceJobError()
+
+        inference_job = self._db.get_running_inference_job_by_train_job(train_job.id)
+        if inference_job is None:
+            raise InvalidRunningInferenceJobError()
+
+        # Switch workers of inference job in the background if not waiting
+        if not wait:
+            operation = self._start_operation(user_id, '_update_inference_services', inference_job.id)
+            return {
+                'id': inference_job.id,
+                'train_job_id': train_job.id,
+                'app': train_job.app,
+                'app_version': train_job.app_version,
+                'operation_id': operation['id']
+            }
+
+        return self._update_inference_services(inference_job.id)
+
+    def _update_inference_services(self, inference_job_id):
+        inference_job = self._services_manager.update_inference_services(inference_job_id)
+        train_job = self._db.get_train_job(inference_job.train_job_id)
+
+        return {
+            'id': inference_job.id,
+            'train_job_id': train_job.id,
+            'app': train_job.app,
+            'app_version': train_job.app_version
+        }
+
     def stop_inference_job(self, app, app_version=-1):
         train_job = self._db.get_train_job_by_app_version(app, app_version=app_version)
         if train_job is None:
@@ -423,6 +557,7 @@ class Admin(object):
             'datetime_started': inference_job.datetime_started,
             'datetime_stopped': inference_job.datetime_stopped,
             'predictor_host': predictor_host,
+            'output_policy': inference_job.output_policy,
             'workers': [
                 {
                     'service_id': service.id,
@@ -497,7 +632,8 @@ class Admin(object):
     ####################################
 
     def create_model(self, user_id, name, task, model_file_bytes, 
-                    model_class, docker_image=None, dependencies={}, access_right=ModelAccessRight.PRIVATE):
+                    model_class, docker_image=None, dependencies={}, access_right=ModelAccessRight.PRIVATE,
+                    resources=None):
         
         model = self._db.create_model(
             user_id=user_id,
@@ -507,8 +643,14 @@ class Admin(object):
             model_class=model_class,
             docker_image=(docker_image or self._base_worker_image),
             dependencies=dependencies,
-            access_right=access_right
+            access_right=access_right,
+            resources=resources
         )
+        self._db.commit()
+
+        # Have worker images with the model's dependencies & warm workers ready for the new model
+        self._services_manager.build_worker_images(model)
+        self._services_manager.create_warm_worker_pools([model])
 
         return {
             'name': model.name 
@@ -542,7 +684,7 @@ class Admin(object):
         if model.access_right == ModelAccessRight.PRIVATE and model.user_id != user_id:
             raise InvalidModelAccessError()
 
-        return model.model_file_bytes
+        return self._db.get_model_file(model.id)
 
     def get_models(self, user_id):
         models = self._db.get_models(user_id)
@@ -652,6 +794,39 @@ class Admin(object):
             workers += self._db.get_workers_of_sub_train_job(sub_train_job.id)
         return workers
 
+    ####################################
+    # Operations
+    ####################################
+
+    def get_operation(self, user_id, operation_id, timeout=0):
+        operation = self._operations_manager.get_operation(operation_id, timeout=timeout)
+        if operation is None or operation['user_id'] != user_id:
+            raise InvalidOperationError()
+
+        return {
+            'id': operation['id'],
+            'status': operation['status'],
+            'result': operation['result'],
+            'error': operation['error'],
+            'datetime_started': operation['datetime_started'],
+            'datetime_stopped': operation['datetime_stopped']
+        }
+
+    # Runs a method of admin in the background on a new instance of admin (with its own DB session),
+    # returning the operation created
+    def _start_operation(self, user_id, method_name, *args):
+        container_manager = self._container_manager
+        operations_manager = self._operations_manager
+        artifact_store = self._artifact_store
+
+        def run():
+            admin = Admin(container_manager=container_manager, operations_manager=operations_manager, 
+                        artifact_store=artifact_store)
+            with admin:
+                return getattr(admin, method_name)(*args)
+
+        return self._operations_manager.start_operation(user_id, run)
+
     ####################################
     # Private / Services
     ####################################
@@ -7,7 +7,7 @@ import json
 from rafiki.constants import UserType
 from rafiki.utils.auth import generate_token, decode_token, auth
 
-from .admin import Admin
+from .admin import Admin, InvalidOutputPolicyError, InvalidBudgetError
 
 app = Flask(__name__)
 CORS(app)
@@ -231,6 +231,15 @@ def get_running_inference_job(auth, app, app_version):
     with admin:
         return jsonify(admin.get_running_inference_job(app, app_version=int(app_version), **params))
 
+@app.route('/inference_jobs/<app>/<app_version>/update', methods=['POST'])
+@auth([UserType.ADMIN, UserType.MODEL_DEVELOPER, UserType.APP_DEVELOPER])
+def update_inference_job(auth, app, app_version=-1):
+    admin = get_admin()
+    params = get_request_params()
+
+    with admin:
+        return jsonify(admin.update_inference_job(auth['user_id'], app, app_version=int(app_version), **params))
+
 @app.route('/inference_jobs/<app>/<app_version>/stop', methods=['POST'])
 @auth([UserType.ADMIN, UserType.MODEL_DEVELOPER, UserType.APP_DEVELOPER])
 def stop_inference_job(auth, app, app_version=-1):
@@ -240,6 +249,22 @@ def stop_inference_job(auth, app, app_version=-1):
     with admin:
         return jsonify(admin.stop_inference_job(app, app_version=int(app_version), **params))
 
+####################################
+# Operations
+####################################
+
+@app.route('/operations/<operation_id>', methods=['GET'])
+@auth([UserType.ADMIN, UserType.MODEL_DEVELOPER, UserType.APP_DEVELOPER])
+def get_operation(auth, operation_id):
+    admin = get_admin()
+    params = get_request_params()
+
+    # Long-poll operation if timeout is specified
+    if 'timeout' in params:
+        params['timeout'] = float(params['timeout'])
+
+    return jsonify(admin.get_operation(auth['user_id'], operation_id, **params))
+
 ####################################
 # Models
 ####################################
@@ -258,6 +283,10 @@ def create_model(auth):
     if 'dependencies' in params and isinstance(params['dependencies'], str):
         params['dependencies'] = json.loads(params['dependencies'])
 
+    # Expect model resources as dict
+    if 'resources' in params and isinstance(params['resources'], str):
+        params['resources'] = json.loads(params['resources'])
+
     with admin:
         return jsonify(admin.create_model(auth['user_id'], **params))
 
@@ -315,6 +344,15 @@ def stop_all_jobs(auth):
             'inference_jobs': inference_jobs
         })
     
+# Handle invalid output policies of inference jobs as bad requests
+@app.errorhandler(InvalidOutputPolicyError)
+def handle_invalid_output_policy(error):
+    return str(error), 400
+
+@app.errorhandler(InvalidBudgetError)
+def handle_invalid_budget(error):
+    return str(error), 400
+
 # Handle uncaught exceptions with a server error & the error's stack trace (for development)
 @app.errorhandler(Exception)
 def handle_error(error):
@@ -0,0 +1,127 @@
+import math
+import time
+import logging
+import traceback
+
+from rafiki.db import Database
+from rafiki.cache import Cache, make_worker_ids
+from rafiki.constants import InferenceJobStatus, ServiceStatus
+from rafiki.config import AUTOSCALER_SLEEP, AUTOSCALER_SCALE_UP_COOLDOWN, AUTOSCALER_SCALE_DOWN_COOLDOWN, \
+    AUTOSCALER_MAX_QUEUE_DEPTH_PER_REPLICA, AUTOSCALER_MAX_PREDICT_LATENCY, \
+    INFERENCE_WORKER_MIN_REPLICAS, INFERENCE_WORKER_MAX_REPLICAS
+from rafiki.container import make_container_manager
+from rafiki.admin.services_manager import ServicesManager
+
+logger = logging.getLogger(__name__)
+
+class InferenceWorkerAutoscaler(object):
+    '''
+    Periodically scales the replicas of running inference jobs' worker services, 
+    based on the workers' queue depths & prediction latencies in the cache.
+
+    Replicas are only added as far as they fit into the free resources of nodes, or for services run by 
+    warm workers from a pool, as far as the pool's warm workers are idle.
+    '''
+    def __init__(self, db=None, cache=None, container_manager=None):
+        if db is None: 
+            db = Database()
+        if cache is None: 
+            cache = Cache()
+        if container_manager is None: 
+            container_manager = make_container_manager()
+
+        self._db = db
+        self._cache = cache
+        self._services_manager = ServicesManager(db=db, container_manager=container_manager, cache=cache)
+        self._service_to_last_scaled = {} # { <service_id>: <time of last scaling> }
+
+    def start(self):
+        logger.info('Starting autoscaler of inference workers...')
+
+        while True:
+            try:
+                with self._db:
+                    self.scale()
+            except Exception:
+                logger.error('Error while autoscaling inference workers:')
+                logger.error(traceback.format_exc())
+
+            time.sleep(AUTOSCALER_SLEEP)
+
+    def scale(self):
+        inference_jobs = self._db.get_inference_jobs_by_status(InferenceJobStatus.RUNNING)
+        for inference_job in inference_jobs:
+            workers = self._db.get_workers_of_inference_job(inference_job.id)
+
+            # A worker service can host multiple trials
+            service_to_trial_ids = {}
+            for worker in workers:
+                service_to_trial_ids[worker.service_id] = service_to_trial_ids.get(worker.service_id, []) + [worker.trial_id]
+
+            for (service_id, trial_ids) in service_to_trial_ids.items():
+                service = self._db.get_service(service_id)
+                self._scale_service(service, trial_ids)
+
+    def _scale_service(self, service, trial_ids):
+        if service.status != ServiceStatus.RUNNING:
+            return
+
+        worker_ids = list(make_worker_ids(service.id, trial_ids).values())
+
+        replicas = service.replicas
+        queue_depth = sum([self._cache.get_queue_depth_of_worker(x) for x in worker_ids])
+        latencies = [self._cache.get_prediction_latency_of_worker(x) for x in worker_ids]
+        latencies = [x for x in latencies if x is not None]
+        predict_latency = max(latencies) if len(latencies) > 0 else None
+        trials = [self._db.get_trial(x) for x in trial_ids]
+        min_replicas = max(self._services_manager.get_inference_worker_min_replicas(trials), INFERENCE_WORKER_MIN_REPLICAS)
+        target_replicas = self._compute_target_replicas(replicas, queue_depth, predict_latency, min_replicas)
+
+        if target_replicas == replicas:
+            return
+
+        # Don't scale a service again within its cooldown
+        cooldown = AUTOSCALER_SCALE_UP_COOLDOWN if target_replicas > replicas else AUTOSCALER_SCALE_DOWN_COOLDOWN
+        last_scaled = self._service_to_last_scaled.get(service.id)
+        if last_scaled is not None and time.time() - last_scaled < cooldown:
+            return
+
+        # Scaling up might be limited by free resources of nodes or idle warm workers
+        model = self._db.get_model(trials[0].model_id)
+        reservations = self._services_manager.get_worker_reservations(model)
+        target_replicas = self._services_manager.scale_service(service, target_replicas, reservations)
+        if target_replicas == replicas:
+            logger.info('No room to scale service of ID {} beyond {} replicas'.format(service.id, replicas))
+            return
+
+        logger.info('Scaled service of ID {} from {} to {} replicas (queue depth: {}, predict latency: {})' \
+            .format(service.id, replicas, target_replicas, queue_depth, predict_latency))
+
+        self._db.create_service_scaling_event(
+            service_id=service.id,
+            replicas_from=replicas,
+            replicas_to=target_replicas,
+            queue_depth=queue_depth,
+            predict_latency=predict_latency
+        )
+        self._db.commit()
+
+        # Have subsequent scaling decisions based on latencies after this scaling
+        for worker_id in worker_ids:
+            self._cache.clear_prediction_latencies_of_worker(worker_id)
+        self._service_to_last_scaled[service.id] = time.time()
+
+    # Never scales below the replicas that the service was sized with for its trials' profiled throughput
+    def _compute_target_replicas(self, replicas, queue_depth, predict_latency, min_replicas):
+        is_overloaded = queue_depth > AUTOSCALER_MAX_QUEUE_DEPTH_PER_REPLICA * replicas or \
+            (predict_latency is not None and predict_latency > AUTOSCALER_MAX_PREDICT_LATENCY)
+        is_underloaded = queue_depth == 0 and \
+            (predict_latency is None or predict_latency < AUTOSCALER_MAX_PREDICT_LATENCY / 2)
+
+        target_replicas = replicas
+        if is_overloaded:
+            target_replicas = max(replicas + 1, math.ceil(queue_depth / AUTOSCALER_MAX_QUEUE_DEPTH_PER_REPLICA))
+        elif is_underloaded:
+            target_replicas = replicas - 1
+
+        return min(max(target_replicas, min_replicas), INFERENCE_WORKER_MAX_REPLICAS)
@@ -0,0 +1,84 @@
+import uuid
+import logging
+import datetime
+import traceback
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rafiki.constants import OperationStatus
+from rafiki.config import ADMIN_OPERATION_THREADS, ADMIN_OPERATION_MAX_WAIT, ADMIN_OPERATION_TTL
+
+logger = logging.getLogger(__name__)
+
+class OperationsManager(object):
+    '''
+    Runs long-running operations of admin (e.g. deployment of services of a job) in the background,
+    outside of HTTP requests, tracking their statuses & results by operation IDs.
+
+    Operations are kept in memory of the admin process, so they don't survive a restart of admin.
+    '''
+    def __init__(self, max_workers=ADMIN_OPERATION_THREADS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._operations = {} # { <operation_id>: <operation> }
+        self._condition = threading.Condition()
+
+    # Runs `target()` in the background, returning the operation created
+    # Its return value becomes the operation's result
+    def start_operation(self, user_id, target):
+        self._delete_expired_operations()
+
+        operation = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'status': OperationStatus.RUNNING,
+            'result': None,
+            'error': None,
+            'datetime_started': datetime.datetime.utcnow(),
+            'datetime_stopped': None
+        }
+
+        with self._condition:
+            self._operations[operation['id']] = operation
+
+        self._executor.submit(self._run_operation, operation['id'], target)
+        return dict(operation)
+
+    # Returns the operation, or `None` if it doesn't exist
+    # If `timeout` (in seconds) is given, waits up to that long for the operation to stop running
+    def get_operation(self, operation_id, timeout=0):
+        timeout = min(timeout, ADMIN_OPERATION_MAX_WAIT)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._operations.get(operation_id, {}).get('status') != OperationStatus.RUNNING,
+                timeout=timeout
+            )
+            operation = self._operations.get(operation_id)
+            return dict(operation) if operation is not None else None
+
+    def _run_operation(self, operation_id, target):
+        result = None
+        error = None
+        try:
+            result = target()
+        except Exception as e:
+            logger.error('Error while running operation of ID {}:'.format(operation_id))
+            logger.error(traceback.format_exc())
+            error = str(e) or type(e).__name__
+
+        with self._condition:
+            operation = self._operations[operation_id]
+            operation['status'] = OperationStatus.ERRORED if error is not None else OperationStatus.COMPLETED
+            operation['result'] = result
+            operation['error'] = error
+            operation['datetime_stopped'] = datetime.datetime.utcnow()
+            self._condition.notify_all()
+
+    def _delete_expired_operations(self):
+        expiry = datetime.datetime.utcnow() - datetime.timedelta(seconds=ADMIN_OPERATION_TTL)
+        with self._condition:
+            for (operation_id, operation) in list(self._operations.items()):
+                if operation['datetime_stopped'] is not None and operation['datetime_stopped'] < expiry:
+                    del self._operations[operation_id]
+
+# Operations are shared by all instances of admin in the process
+operations_manager = OperationsManager()
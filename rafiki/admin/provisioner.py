@@ -0,0 +1,85 @@
+import logging
+
+from rafiki.constants import ModelResource
+from rafiki.config import WORKER_DEFAULT_CPUS, WORKER_DEFAULT_MEMORY
+
+logger = logging.getLogger(__name__)
+
+class ReplicaProvisioner(object):
+    '''
+    Computes the numbers of replicas of worker services & the resources to reserve for each replica,
+    packing replicas onto the nodes of the cluster by their free CPU & memory without oversubscribing them.
+    '''
+    def __init__(self, container_manager):
+        self._container_manager = container_manager
+
+    # Returns resources to reserve for each replica of a worker of the model,
+    # as reservations for the container manager
+    # Replicas that run multiple trials in parallel reserve resources for each trial
+    def get_reservations(self, model, parallel_trials=1):
+        resources = model.resources or {}
+        return {
+            'cpus': float(resources.get(ModelResource.CPU, WORKER_DEFAULT_CPUS)) * parallel_trials,
+            'memory': int(float(resources.get(ModelResource.MEMORY, WORKER_DEFAULT_MEMORY)) * 1024 * 1024) * parallel_trials
+        }
+
+    # Given { <key>: (<reservations>, <max replicas>, <whether GPU is required>) }, returns { <key>: <replicas> }
+    # Replicas are placed one at a time, round-robin across keys, onto the node with the most free CPU that fits them,
+    # until no more replicas fit or all keys have their max replicas. Each key gets at least 1 replica
+    # regardless, so that its job can still run (its replica waits for resources to be free)
+    def compute_replicas(self, key_to_request):
+        nodes = self._get_free_resources_of_nodes()
+        key_to_replicas = { key: 0 for key in key_to_request.keys() }
+
+        pending_keys = list(key_to_request.keys())
+        while len(pending_keys) > 0:
+            for key in list(pending_keys):
+                (reservations, max_replicas, is_gpu) = key_to_request[key]
+                node = self._place_replica(nodes, reservations, is_gpu)
+                if node is None and key_to_replicas[key] > 0:
+                    pending_keys.remove(key)
+                    continue
+
+                key_to_replicas[key] += 1
+                if key_to_replicas[key] >= max_replicas:
+                    pending_keys.remove(key)
+
+        logger.info('Provisioned replicas: {}'.format(list(key_to_replicas.values())))
+        return key_to_replicas
+
+    # Returns how many replicas, up to `max_replicas`, fit onto the free resources of nodes, which might be none
+    def count_free_replicas(self, reservations, max_replicas, is_gpu=False):
+        nodes = self._get_free_resources_of_nodes()
+        count = 0
+        while count < max_replicas and self._place_replica(nodes, reservations, is_gpu) is not None:
+            count += 1
+
+        return count
+
+    # Reserves resources for a replica on the node with the most free CPU that fits the replica,
+    # returning the node, or `None` if no node fits the replica
+    def _place_replica(self, nodes, reservations, is_gpu):
+        fit_nodes = [
+            x for x in nodes
+            if x['free_cpus'] >= reservations['cpus'] and x['free_memory'] >= reservations['memory'] \
+                and (not is_gpu or x['gpus'] > 0)
+        ]
+
+        if len(fit_nodes) == 0:
+            return None
+
+        node = max(fit_nodes, key=lambda x: x['free_cpus'])
+        node['free_cpus'] -= reservations['cpus']
+        node['free_memory'] -= reservations['memory']
+        return node
+
+    def _get_free_resources_of_nodes(self):
+        return [
+            {
+                'id': x['id'],
+                'gpus': x['gpus'],
+                'free_cpus': x['cpus'] - x['reserved_cpus'],
+                'free_memory': x['memory'] - x['reserved_memory']
+            }
+            for x in self._container_manager.get_nodes()
+        ]
@@ -1,27 +1,51 @@
 import os
+import math
 import logging
 import traceback
 import time
 import socket
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
 
 from rafiki.db import Database
+from rafiki.cache import Cache, make_worker_ids
 from rafiki.constants import ServiceStatus, UserType, ServiceType, BudgetType
 from rafiki.config import TRAIN_WORKER_REPLICAS_PER_SUB_TRAIN_JOB, INFERENCE_WORKER_REPLICAS_PER_TRIAL, \
-    INFERENCE_MAX_BEST_TRIALS, SERVICE_STATUS_WAIT
-from rafiki.container import DockerSwarmContainerManager, ServiceRequirement, InvalidServiceRequest
+    INFERENCE_MAX_BEST_TRIALS, SERVICE_STATUS_WAIT, INFERENCE_WORKER_MAX_TRIALS, INFERENCE_WORKER_READY_TIMEOUT, \
+    WARM_WORKER_POOL_SIZE, TRAIN_WORKER_POOL_SIZE, SERVICE_DEPLOYMENT_THREADS, SERVICE_DEPLOYMENT_TIMEOUT, \
+    INFERENCE_WORKER_TARGET_THROUGHPUT, INFERENCE_WORKER_MAX_REPLICAS, INFERENCE_WORKER_PREDICT_BATCH_SIZE
+from rafiki.container import make_container_manager, ServiceRequirement, InvalidServiceRequest
 from rafiki.model import parse_model_install_command
 
+from .provisioner import ReplicaProvisioner
+
 logger = logging.getLogger(__name__)
 
+# Container manager type of services that are run by warm workers from a pool
+WARM_WORKER_POOL = 'WarmWorkerPool'
+
+# Environment variables configuring the artifact store that are passed on to workers, if set to non-empty values
+ARTIFACT_STORE_ENVIRONMENT_VARS = ['ARTIFACT_STORE', 'ARTIFACT_STORE_PATH', 'ARTIFACT_STORE_S3_BUCKET',
+                                    'ARTIFACT_STORE_S3_ENDPOINT_URL', 'AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY',
+                                    'AWS_DEFAULT_REGION']
+
+# Container services are created & destroyed concurrently by a pool of threads, shared by all services managers
+# (e.g. of each request to admin)
+_executor = ThreadPoolExecutor(max_workers=SERVICE_DEPLOYMENT_THREADS)
+
 class ServiceDeploymentException(Exception): pass
 
 class ServicesManager(object):
-    def __init__(self, db=None, container_manager=None):
+    def __init__(self, db=None, container_manager=None, cache=None):
         if db is None: 
             db = Database()
         if container_manager is None: 
-            container_manager = DockerSwarmContainerManager()
+            container_manager = make_container_manager()
+        if cache is None: 
+            cache = Cache()
         
         self._postgres_host = os.environ['POSTGRES_HOST']
         self._postgres_port = os.environ['POSTGRES_PORT']
@@ -46,6 +70,10 @@ class ServicesManager(object):
 
         self._db = db
         self._container_manager = container_manager
+        self._cache = cache
+        self._provisioner = ReplicaProvisioner(container_manager)
+
+        self._service_deployments = {} # { <service_id>: <future of container service deployment> }
 
     def create_inference_services(self, inference_job_id):
         inference_job = self._db.get_inference_job(inference_job_id)
@@ -53,23 +81,25 @@ class ServicesManager(object):
         # Prepare all inputs for inference job deployment
         # Throws error early to make service deployment more atomic
         best_trials = self._get_best_trials_for_inference(inference_job)
-        trial_to_replicas = self._compute_inference_worker_replicas_for_trials(best_trials)
+        trial_groups = self._group_trials_for_inference_workers(best_trials)
+        group_to_replicas = self._compute_inference_worker_replicas_for_trial_groups(trial_groups)
 
+        services = []
         try:
             # Create predictor
             predictor_service = self._create_predictor_service(inference_job)
+            services.append(predictor_service)
             self._db.update_inference_job(inference_job, predictor_service_id=predictor_service.id)
             self._db.commit()
 
-            # Create a worker service for each best trial of associated train job
-            worker_services = []
-            for (trial, replicas) in trial_to_replicas.items():
-                service = self._create_inference_job_worker(inference_job, trial, replicas)
-                worker_services.append(service)
+            # Create a worker service for each group of best trials of associated train job
+            for (trials, replicas) in zip(trial_groups, group_to_replicas):
+                service = self._create_inference_job_worker(inference_job, trials, replicas)
+                services.append(service)
                 self._db.commit()
 
-            # Ensure that all services are running
-            self._wait_until_services_running([predictor_service, *worker_services])
+            # Ensure that all services, deployed concurrently, are running
+            self._wait_until_services_running(services)
 
             # Mark inference job as running
             self._db.mark_inference_job_as_running(inference_job)
@@ -78,7 +108,9 @@ class ServicesManager(object):
             return (inference_job, predictor_service)
 
         except Exception as e:
-            # Mark inference job as errored
+            # Roll back by stopping all services of inference job & marking it as errored
+            logger.error('Error while deploying services of inference job - stopping them...')
+            self._stop_services([self._db.get_service(x.id) for x in services], raise_errors=False)
             self._db.mark_inference_job_as_errored(inference_job)
             self._db.commit()
             raise e
@@ -86,36 +118,127 @@ class ServicesManager(object):
     def stop_inference_services(self, inference_job_id):
         inference_job = self._db.get_inference_job(inference_job_id)
         
-        # Stop predictor
-        service = self._db.get_service(inference_job.predictor_service_id)
-        self._stop_service(service)
-
-        # Stop all workers for inference job
+        # Stop predictor & all workers for inference job (a worker service can host multiple trials)
         workers = self._db.get_workers_of_inference_job(inference_job_id)
-        for worker in workers:
-            service = self._db.get_service(worker.service_id)
-            self._stop_service(service)
+        service_ids = set([inference_job.predictor_service_id, *[x.service_id for x in workers]])
+        self._stop_services([self._db.get_service(x) for x in service_ids])
 
         self._db.mark_inference_job_as_stopped(inference_job)
         self._db.commit()
 
         return inference_job
 
+    # Swaps the inference job's workers for workers of the current best trials of its train job,
+    # without stopping its predictor. New workers are deployed on standby, then switched in 
+    # for the old workers once they are ready, after which the old workers are drained & stopped.
+    def update_inference_services(self, inference_job_id):
+        inference_job = self._db.get_inference_job(inference_job_id)
+        old_workers = self._db.get_workers_of_inference_job(inference_job_id)
+
+        best_trials = self._get_best_trials_for_inference(inference_job)
+        if set([x.id for x in best_trials]) == set([x.trial_id for x in old_workers]):
+            logger.info('Best trials of inference job are unchanged - skipping update of workers')
+            return inference_job
+
+        trial_groups = self._group_trials_for_inference_workers(best_trials)
+        group_to_replicas = self._compute_inference_worker_replicas_for_trial_groups(trial_groups)
+
+        # Deploy new workers on standby & wait for them to be ready
+        new_worker_services = []
+        try:
+            for (trials, replicas) in zip(trial_groups, group_to_replicas):
+                service = self._create_inference_job_worker(inference_job, trials, replicas, is_standby=True)
+                new_worker_services.append(service)
+
+            self._wait_until_services_running(new_worker_services)
+            self._wait_until_inference_workers_ready(new_worker_services)
+        except Exception as e:
+            logger.error('Error while deploying new workers for inference job - stopping them...')
+            for worker in self._db.get_workers_of_inference_job(inference_job_id):
+                if worker.is_standby:
+                    self._db.delete_inference_job_worker(worker)
+            self._db.commit()
+
+            self._stop_services([self._db.get_service(x.id) for x in new_worker_services], raise_errors=False)
+            raise e
+
+        # Switch old workers for new workers in the cache at once
+        new_workers = [x for x in self._db.get_workers_of_inference_job(inference_job_id) if x.is_standby]
+        self._cache.switch_workers_of_inference_job(
+            self._get_worker_ids_of_inference_job_workers(old_workers),
+            self._get_worker_ids_of_inference_job_workers(new_workers),
+            inference_job_id
+        )
+        for worker in new_workers:
+            self._db.mark_inference_job_worker_as_active(worker)
+        self._db.commit()
+
+        # Drain & stop old workers, then stop tracking them
+        # Old workers whose services fail to stop are still tracked, so that they are stopped with the inference job
+        old_service_ids = set([x.service_id for x in old_workers])
+        try:
+            self._stop_services([self._db.get_service(x) for x in old_service_ids])
+        finally:
+            for worker in old_workers:
+                service = self._db.get_service(worker.service_id)
+                if service is None or service.status == ServiceStatus.STOPPED:
+                    self._db.delete_inference_job_worker(worker)
+            self._db.commit()
+
+        return inference_job
+
     def create_train_services(self, train_job_id):
         train_job = self._db.get_train_job(train_job_id)
         sub_train_jobs = self._db.get_sub_train_jobs_of_train_job(train_job_id)
         
-        # Create a worker service for each sub train job, wait for them to be running, then mark them as running
-        sub_train_job_to_replicas = self._compute_train_worker_replicas_for_sub_train_jobs(sub_train_jobs)
-        for (sub_train_job, replicas) in sub_train_job_to_replicas.items():
-            try:
+        # Schedule trials of sub train jobs on shared pools of train workers instead, if enabled
+        if TRAIN_WORKER_POOL_SIZE > 0:
+            for sub_train_job in sub_train_jobs:
+                try:
+                    self._schedule_sub_train_job_on_pool(train_job, sub_train_job)
+                    self._db.mark_sub_train_job_as_running(sub_train_job)
+                    self._db.commit()
+                except InvalidServiceRequest:
+                    self._db.mark_sub_train_job_as_stopped(sub_train_job)
+                    self._db.commit()
+
+            return train_job
+
+        # Create a worker service for each sub train job, deployed concurrently
+        sub_train_job_to_replicas = self._compute_train_worker_replicas_for_sub_train_jobs(train_job, sub_train_jobs)
+        sub_train_job_to_service = {}
+        try:
+            for (sub_train_job, replicas) in sub_train_job_to_replicas.items():
                 service = self._create_train_job_worker(train_job, sub_train_job, replicas)
-                self._wait_until_services_running([service])
-                self._db.mark_sub_train_job_as_running(sub_train_job)
-                self._db.commit()
-            except InvalidServiceRequest:
+                sub_train_job_to_service[sub_train_job] = service
+
+            # Sub train jobs whose services can't be deployed on the cluster (e.g. without GPU) are stopped
+            service_to_error = self._finish_service_deployments(list(sub_train_job_to_service.values()))
+            for (sub_train_job, service) in list(sub_train_job_to_service.items()):
+                error = service_to_error.get(service.id)
+                if isinstance(error, InvalidServiceRequest):
+                    self._db.mark_sub_train_job_as_stopped(sub_train_job)
+                    self._db.commit()
+                    del sub_train_job_to_service[sub_train_job]
+                elif error is not None:
+                    raise error
+
+            # Wait for all of them to be running, then mark them as running
+            self._wait_until_services_running(list(sub_train_job_to_service.values()))
+
+        except Exception as e:
+            # Roll back by stopping all services & sub train jobs of train job
+            logger.error('Error while deploying services of train job - stopping them...')
+            self._stop_services([self._db.get_service(x.id) for x in sub_train_job_to_service.values()], 
+                                raise_errors=False)
+            for sub_train_job in sub_train_jobs:
                 self._db.mark_sub_train_job_as_stopped(sub_train_job)
-                self._db.commit()
+            self._db.commit()
+            raise e
+
+        for sub_train_job in sub_train_job_to_service.keys():
+            self._db.mark_sub_train_job_as_running(sub_train_job)
+        self._db.commit()
 
         return train_job
 
@@ -123,28 +246,109 @@ class ServicesManager(object):
         train_job = self._db.get_train_job(train_job_id)
 
         # Stop all workers for train job
+        # Sub train jobs scheduled on train worker pools have no workers of their own
+        # Their remaining tasks are skipped by the pools' train workers once they are stopped
         sub_train_jobs = self._db.get_sub_train_jobs_of_train_job(train_job_id)
+        workers = []
+        for sub_train_job in sub_train_jobs:
+            workers += self._db.get_workers_of_sub_train_job(sub_train_job.id)
+
+        self._stop_services([self._db.get_service(x.service_id) for x in workers])
         for sub_train_job in sub_train_jobs:
-            workers = self._db.get_workers_of_sub_train_job(sub_train_job.id)
-            for worker in workers:
-                self._stop_train_job_worker(worker)
+            self._update_sub_train_job_status(sub_train_job)
 
         return train_job
         
+    # Scales a running service towards a number of replicas, returning the replicas it is scaled to
+    # Replicas are only added as far as they fit into the free resources of nodes with their reservations 
+    # (so that no replicas are left pending), or for services run by warm workers, as far as warm workers are idle
+    def scale_service(self, service, replicas, reservations):
+        if replicas == service.replicas:
+            return service.replicas
+
+        if service.container_manager_type == WARM_WORKER_POOL:
+            new_replicas = service.replicas + self._scale_warm_workers_of_service(service, replicas)
+        else:
+            new_replicas = replicas
+            if replicas > service.replicas:
+                new_replicas = service.replicas + \
+                    self._provisioner.count_free_replicas(reservations, replicas - service.replicas)
+            if new_replicas != service.replicas:
+                self._container_manager.update_service(service.container_service_id, new_replicas)
+
+        self._db.update_service(service, replicas=new_replicas)
+        return new_replicas
+
+    # Returns resources reserved for each replica of a worker of the model
+    def get_worker_reservations(self, model):
+        return self._provisioner.get_reservations(model)
+
     def stop_train_job_worker(self, service_id):
         train_job_service = self._db.get_train_job_worker(service_id)
         self._stop_train_job_worker(train_job_service)
         return train_job_service
 
+    # In the background, builds Docker images for workers of the model (with & without GPU) 
+    # with its dependencies pre-installed, or reuses them if they have already been built
+    def build_worker_images(self, model):
+        threading.Thread(
+            target=self._build_worker_images,
+            args=(model.docker_image, model.dependencies),
+            daemon=True
+        ).start()
+
+    # Ensures that there is a pool of warm workers (idle worker containers with dependencies installed) 
+    # for each distinct Docker image & dependencies of the models, so that services of workers 
+    # for these models can be assigned to warm workers instead of deploying new containers 
+    def create_warm_worker_pools(self, models):
+        if WARM_WORKER_POOL_SIZE <= 0:
+            return
+
+        for model in models:
+            install_command = parse_model_install_command(model.dependencies, enable_gpu=False)
+            (docker_image, install_command) = self._get_worker_image(model.docker_image, install_command)
+            pool_id = self._get_worker_pool_id(docker_image, install_command)
+            if self._cache.get_warm_worker_pool(pool_id) is not None:
+                continue
+
+            logger.info('Creating pool of warm workers of ID {} for image {}...'.format(pool_id, docker_image))
+            container_service = self._container_manager.create_service(
+                service_name='rafiki_warm_worker_pool_{}'.format(pool_id),
+                docker_image=docker_image,
+                replicas=WARM_WORKER_POOL_SIZE,
+                args=[],
+                environment_vars={
+                    'POSTGRES_HOST': self._postgres_host,
+                    'POSTGRES_PORT': self._postgres_port,
+                    'POSTGRES_USER': self._postgres_user,
+                    'POSTGRES_DB': self._postgres_db,
+                    'POSTGRES_PASSWORD': self._postgres_password,
+                    'REDIS_HOST': self._redis_host,
+                    'REDIS_PORT': self._redis_port,
+                    'LOGS_DOCKER_WORKDIR_PATH': self._logs_docker_workdir,
+                    'WORKER_INSTALL_COMMAND': install_command,
+                    'PIP_CACHE_DIR': self._get_pip_cache_dir(),
+                    'WORKER_WHEELHOUSE_PATH': self._get_wheelhouse_dir(),
+                    'RAFIKI_WARM_POOL_ID': pool_id,
+                    'CUDA_VISIBLE_DEVICES': -1 # Warm workers are only used for services without GPUs
+                },
+                mounts={
+                    self._data_workdir: self._data_docker_workdir,
+                    self._logs_workdir: self._logs_docker_workdir
+                }
+            )
+            self._cache.add_warm_worker_pool(pool_id, container_service['id'])
+
     ####################################
     # Private
     ####################################
 
-    def _create_inference_job_worker(self, inference_job, trial, replicas):
-        sub_train_job = self._db.get_sub_train_job(trial.sub_train_job_id)
-        model = self._db.get_model(sub_train_job.model_id)
+    # Creates a worker service that hosts a group of trials, whose models share the same Docker image & dependencies
+    def _create_inference_job_worker(self, inference_job, trials, replicas, is_standby=False):
+        model = self._db.get_model(trials[0].model_id)
         service_type = ServiceType.INFERENCE
         install_command = parse_model_install_command(model.dependencies, enable_gpu=False)
+        (docker_image, install_command) = self._get_worker_image(model.docker_image, install_command)
         environment_vars = {
             'POSTGRES_HOST': self._postgres_host,
             'POSTGRES_PORT': self._postgres_port,
@@ -159,16 +363,19 @@ class ServicesManager(object):
 
         service = self._create_service(
             service_type=service_type,
-            docker_image=model.docker_image,
+            docker_image=docker_image,
             replicas=replicas,
-            environment_vars=environment_vars
+            environment_vars=environment_vars,
+            reservations=self._provisioner.get_reservations(model)
         )
 
-        self._db.create_inference_job_worker(
-            service_id=service.id,
-            inference_job_id=inference_job.id,
-            trial_id=trial.id
-        )
+        for trial in trials:
+            self._db.create_inference_job_worker(
+                service_id=service.id,
+                inference_job_id=inference_job.id,
+                trial_id=trial.id,
+                is_standby=is_standby
+            )
         self._db.commit()
 
         return service
@@ -182,7 +389,8 @@ class ServicesManager(object):
             'POSTGRES_DB': self._postgres_db,
             'POSTGRES_PASSWORD': self._postgres_password,
             'REDIS_HOST': self._redis_host,
-            'REDIS_PORT': self._redis_port
+            'REDIS_PORT': self._redis_port,
+            'PREDICTOR_PORT': self._predictor_port
         }
 
         service = self._create_service(
@@ -199,7 +407,9 @@ class ServicesManager(object):
         model = self._db.get_model(sub_train_job.model_id)
         service_type = ServiceType.TRAIN
         enable_gpu = int(train_job.budget.get(BudgetType.ENABLE_GPU, 0)) > 0
+        parallel_trials = int(train_job.budget.get(BudgetType.PARALLEL_TRIALS, 1))
         install_command = parse_model_install_command(model.dependencies, enable_gpu=enable_gpu)
+        (docker_image, install_command) = self._get_worker_image(model.docker_image, install_command)
         environment_vars = {
             'POSTGRES_HOST': self._postgres_host,
             'POSTGRES_PORT': self._postgres_port,
@@ -211,6 +421,7 @@ class ServicesManager(object):
             'ADVISOR_HOST': self._advisor_host,
             'ADVISOR_PORT': self._advisor_port,
             'WORKER_INSTALL_COMMAND': install_command,
+            'WORKER_PARALLEL_TRIALS': parallel_trials,
             **({'CUDA_VISIBLE_DEVICES': -1} if not enable_gpu else {}) # Hide GPU if not enabled
         }
 
@@ -220,10 +431,11 @@ class ServicesManager(object):
 
         service = self._create_service(
             service_type=service_type,
-            docker_image=model.docker_image,
+            docker_image=docker_image,
             replicas=replicas,
             environment_vars=environment_vars,
-            requirements=requirements
+            requirements=requirements,
+            reservations=self._provisioner.get_reservations(model, parallel_trials=parallel_trials)
         )
 
         self._db.create_train_job_worker(
@@ -235,6 +447,65 @@ class ServicesManager(object):
 
         return service
 
+    # Queues a task for each trial of the sub train job in its train worker pool,
+    # creating the pool if it doesn't exist or it has stopped
+    def _schedule_sub_train_job_on_pool(self, train_job, sub_train_job):
+        model = self._db.get_model(sub_train_job.model_id)
+        enable_gpu = int(train_job.budget.get(BudgetType.ENABLE_GPU, 0)) > 0
+        install_command = parse_model_install_command(model.dependencies, enable_gpu=enable_gpu)
+        (docker_image, install_command) = self._get_worker_image(model.docker_image, install_command)
+        pool_id = self._get_worker_pool_id(docker_image, install_command, enable_gpu=enable_gpu)
+
+        service_id = self._cache.get_train_worker_pool(pool_id)
+        service = self._db.get_service(service_id) if service_id is not None else None
+        if service is None or service.status not in \
+                [ServiceStatus.STARTED, ServiceStatus.DEPLOYING, ServiceStatus.RUNNING]:
+            service = self._create_train_worker_pool(pool_id, docker_image, install_command, enable_gpu,
+                                                    reservations=self._provisioner.get_reservations(model))
+            self._wait_until_services_running([service])
+            self._cache.add_train_worker_pool(pool_id, service.id)
+
+        # By default, budget is model trial count of 2
+        trial_count = train_job.budget.get(BudgetType.MODEL_TRIAL_COUNT, 2)
+        logger.info('Scheduling {} trials of sub train job of ID {} on train worker pool of ID {}...' \
+            .format(trial_count, sub_train_job.id, pool_id))
+        tasks = [{ 'sub_train_job_id': sub_train_job.id } for _ in range(trial_count)]
+        self._cache.add_train_tasks_of_pool(tasks, pool_id)
+
+    def _create_train_worker_pool(self, pool_id, docker_image, install_command, enable_gpu, reservations=None):
+        logger.info('Creating train worker pool of ID {} for image {}...'.format(pool_id, docker_image))
+        environment_vars = {
+            'POSTGRES_HOST': self._postgres_host,
+            'POSTGRES_PORT': self._postgres_port,
+            'POSTGRES_USER': self._postgres_user,
+            'POSTGRES_DB': self._postgres_db,
+            'POSTGRES_PASSWORD': self._postgres_password,
+            'REDIS_HOST': self._redis_host,
+            'REDIS_PORT': self._redis_port,
+            'ADMIN_HOST': self._admin_host,
+            'ADMIN_PORT': self._admin_port,
+            'ADVISOR_HOST': self._advisor_host,
+            'ADVISOR_PORT': self._advisor_port,
+            'WORKER_INSTALL_COMMAND': install_command,
+            'RAFIKI_TRAIN_POOL_ID': pool_id,
+            **({'CUDA_VISIBLE_DEVICES': -1} if not enable_gpu else {}) # Hide GPU if not enabled
+        }
+
+        requirements = []
+        if enable_gpu:
+            requirements.append(ServiceRequirement.GPU)
+
+        service = self._create_service(
+            service_type=ServiceType.TRAIN,
+            docker_image=docker_image,
+            replicas=TRAIN_WORKER_POOL_SIZE,
+            environment_vars=environment_vars,
+            requirements=requirements,
+            reservations=reservations
+        )
+
+        return service
+
     def _stop_train_job_worker(self, worker):
         service = self._db.get_service(worker.service_id)
         self._stop_service(service)
@@ -254,31 +525,113 @@ class ServicesManager(object):
             self._db.commit()
 
     def _stop_service(self, service):
-        if service.container_service_id is not None:
-            self._container_manager.destroy_service(service.container_service_id)
+        self._stop_services([service])
+
+    # Stops services, destroying their container services concurrently
+    # Unless `raise_errors` is false, raises the first error after stopping the other services
+    def _stop_services(self, services, raise_errors=True):
+        services = [x for x in services if x is not None]
+
+        # Container services that are still being deployed have to be deployed before they can be destroyed
+        self._finish_service_deployments(services)
+
+        service_to_future = {}
+        for service in services:
+            if service.container_manager_type == WARM_WORKER_POOL:
+                self._cache.stop_warm_workers_of_service(service.id)
+            elif service.container_service_id is not None:
+                service_to_future[service] = \
+                    _executor.submit(self._container_manager.destroy_service, service.container_service_id)
+
+        first_error = None
+        for service in services:
+            future = service_to_future.get(service)
+            try:
+                if future is not None:
+                    future.result()
+                self._db.mark_service_as_stopped(service)
+            except Exception as e:
+                logger.error('Error while stopping service with ID {}'.format(service.id))
+                logger.error(traceback.format_exc())
+                first_error = first_error or e
 
-        self._db.mark_service_as_stopped(service)
         self._db.commit()
 
+        if first_error is not None and raise_errors:
+            raise first_error
+
     # Returns when all services have status of `RUNNING`
     # Throws an exception if any of the services have a status of `ERRORED` or `STOPPED`
+    # Waits for services to notify that they are running, instead of polling DB for their statuses
+    # Throws an exception if any of them errors, stops, or is not running within `SERVICE_DEPLOYMENT_TIMEOUT`
     def _wait_until_services_running(self, services):
+        service_to_error = self._finish_service_deployments(services)
+        if len(service_to_error) > 0:
+            raise next(iter(service_to_error.values()))
+
+        deadline = time.time() + SERVICE_DEPLOYMENT_TIMEOUT
+        pending_service_ids = set([x.id for x in services])
+
+        # Start listening before checking statuses, so that no change in status is missed 
+        with self._db.listen_for_service_status() as listener:
+            changed_service_ids = set(pending_service_ids)
+            while True:
+                self._db.expire()
+                for service_id in pending_service_ids & changed_service_ids:
+                    service = self._db.get_service(service_id)
+                    if service.status in [ServiceStatus.ERRORED, ServiceStatus.STOPPED]:
+                        raise ServiceDeploymentException('Service of ID {} is of status {}' \
+                            .format(service.id, service.status))
+                    elif service.status == ServiceStatus.RUNNING:
+                        pending_service_ids.remove(service_id)
+
+                if len(pending_service_ids) == 0:
+                    return
+
+                if time.time() > deadline:
+                    raise ServiceDeploymentException('Services of IDs {} are not running' \
+                        .format(list(pending_service_ids)))
+
+                changed_service_ids = listener.wait(deadline - time.time())
+
+    # Returns when all inference worker services have at least 1 replica that has loaded its models
+    # Throws an exception if that doesn't happen within `INFERENCE_WORKER_READY_TIMEOUT`
+    def _wait_until_inference_workers_ready(self, services):
+        deadline = time.time() + INFERENCE_WORKER_READY_TIMEOUT
         for service in services:
-            while service.status not in \
-                    [ServiceStatus.RUNNING, ServiceStatus.ERRORED, ServiceStatus.STOPPED]:
+            while self._cache.get_replica_count_of_worker(service.id) == 0:
+                if time.time() > deadline:
+                    raise ServiceDeploymentException('Inference worker of service ID {} is not ready'.format(service.id))
+                
                 time.sleep(SERVICE_STATUS_WAIT)
-                self._db.expire()
-                service = self._db.get_service(service.id)
 
-            if service.status in [ServiceStatus.ERRORED, ServiceStatus.STOPPED]:
-                raise ServiceDeploymentException('Service of ID {} is of status {}'.format(service.id, service.status))
+    def _get_worker_ids_of_inference_job_workers(self, workers):
+        service_to_trial_ids = {}
+        for worker in workers:
+            service_to_trial_ids[worker.service_id] = service_to_trial_ids.get(worker.service_id, []) + [worker.trial_id]
+
+        worker_ids = []
+        for (service_id, trial_ids) in service_to_trial_ids.items():
+            worker_ids += list(make_worker_ids(service_id, trial_ids).values())
+
+        return worker_ids
 
     def _create_service(self, service_type, docker_image,
                         replicas, environment_vars={}, args=[], 
-                        container_port=None, requirements=[]):
+                        container_port=None, requirements=[], reservations=None):
         
+        # Try to take warm workers from a pool for the service, instead of deploying new containers
+        warm_worker_ids = None
+        warm_worker_pool_id = self._get_worker_pool_id(docker_image, environment_vars.get('WORKER_INSTALL_COMMAND', ''))
+        if service_type in [ServiceType.TRAIN, ServiceType.INFERENCE] and \
+                container_port is None and len(requirements) == 0:
+            warm_worker_ids = self._take_warm_workers(warm_worker_pool_id, replicas)
+
         # Create service in DB
         container_manager_type = type(self._container_manager).__name__
+        if warm_worker_ids is not None:
+            container_manager_type = WARM_WORKER_POOL
+
         service = self._db.create_service(
             container_manager_type=container_manager_type,
             service_type=service_type,
@@ -288,6 +641,19 @@ class ServicesManager(object):
         self._db.commit()
 
         # Pass service details as environment variables 
+        # Workers that still have to install dependencies share a PIP cache & a wheelhouse of built packages 
+        # to avoid repeated downloads & builds
+        if environment_vars.get('WORKER_INSTALL_COMMAND'):
+            environment_vars = { 
+                **environment_vars, 
+                'PIP_CACHE_DIR': self._get_pip_cache_dir(),
+                'WORKER_WHEELHOUSE_PATH': self._get_wheelhouse_dir()
+            }
+
+        # Workers store & load parameters of trials in the artifact store
+        if service_type in [ServiceType.TRAIN, ServiceType.INFERENCE]:
+            environment_vars = { **environment_vars, **self._get_artifact_store_environment_vars() }
+
         environment_vars = {
             **environment_vars,
             'LOGS_DOCKER_WORKDIR_PATH': self._logs_docker_workdir,
@@ -295,6 +661,26 @@ class ServicesManager(object):
             'RAFIKI_SERVICE_TYPE': service_type
         }
 
+        # Assign service to the warm workers taken
+        if warm_worker_ids is not None:
+            logger.info('Assigning service of ID {} to {} warm workers'.format(service.id, replicas))
+            self._cache.add_warm_worker_service(service.id, warm_worker_pool_id, environment_vars)
+            for replica_id in warm_worker_ids:
+                self._cache.assign_warm_worker(replica_id, service.id, environment_vars)
+
+            self._db.mark_service_as_deploying(
+                service,
+                container_service_name=None,
+                container_service_id=None,
+                replicas=replicas,
+                hostname=None,
+                port=None,
+                ext_hostname=None,
+                ext_port=None
+            )
+            self._db.commit()
+            return service
+
         # Mount data and logs folders to containers' work directories
         mounts = {
             self._data_workdir: self._data_docker_workdir,
@@ -310,43 +696,163 @@ class ServicesManager(object):
             ext_port = self._get_available_ext_port()
             publish_port = (ext_port, container_port)
 
-        try:
-            container_service_name = 'rafiki_service_{}'.format(service.id)
-            container_service = self._container_manager.create_service(
-                service_name=container_service_name,
-                docker_image=docker_image, 
-                replicas=replicas, 
-                args=args,
-                environment_vars=environment_vars,
-                mounts=mounts,
-                publish_port=publish_port,
-                requirements=requirements
-            )
-            
-            container_service_id = container_service['id']
-            hostname = container_service['hostname']
-            port = container_service.get('port', None)
+        # Deploy container service in the background
+        # Its deployment is completed in DB when waiting for the service to be running
+        container_service_name = 'rafiki_service_{}'.format(service.id)
+        self._service_deployments[service.id] = _executor.submit(
+            self._deploy_container_service,
+            container_service_name=container_service_name,
+            docker_image=docker_image, 
+            replicas=replicas, 
+            args=args,
+            environment_vars=environment_vars,
+            mounts=mounts,
+            publish_port=publish_port,
+            requirements=requirements,
+            reservations=reservations,
+            ext_hostname=ext_hostname,
+            ext_port=ext_port
+        )
 
-            self._db.mark_service_as_deploying(
-                service,
-                container_service_name=container_service_name,
-                container_service_id=container_service_id,
-                replicas=replicas,
-                hostname=hostname,
-                port=port,
-                ext_hostname=ext_hostname,
-                ext_port=ext_port
-            )
-            self._db.commit()
+        return service
 
-        except Exception as e:
-            logger.error('Error while creating service with ID {}'.format(service.id))
-            logger.error(traceback.format_exc())
-            self._db.mark_service_as_errored(service)
-            self._db.commit()
-            raise e
+    # Runs in a thread of the shared executor without access to DB
+    def _deploy_container_service(self, container_service_name, docker_image, replicas, args, 
+                                environment_vars, mounts, publish_port, requirements, reservations,
+                                ext_hostname, ext_port):
+        container_service = self._container_manager.create_service(
+            service_name=container_service_name,
+            docker_image=docker_image, 
+            replicas=replicas, 
+            args=args,
+            environment_vars=environment_vars,
+            mounts=mounts,
+            publish_port=publish_port,
+            requirements=requirements,
+            reservations=reservations
+        )
 
-        return service
+        return {
+            'container_service_name': container_service_name,
+            'container_service_id': container_service['id'],
+            'replicas': replicas,
+            'hostname': container_service['hostname'],
+            'port': container_service.get('port', None),
+            'ext_hostname': ext_hostname,
+            'ext_port': ext_port
+        }
+
+    # Waits for pending deployments of container services of the services, then marks them as deploying in DB,
+    # or as errored if their deployments failed
+    # Returns { <service_id>: <error> } for services whose deployments failed
+    def _finish_service_deployments(self, services):
+        service_to_error = {}
+        for service in services:
+            future = self._service_deployments.pop(service.id, None)
+            if future is None:
+                continue
+
+            try:
+                deployment = future.result()
+                self._db.mark_service_as_deploying(service, **deployment)
+            except Exception as e:
+                logger.error('Error while creating service with ID {}'.format(service.id))
+                logger.error(traceback.format_exc())
+                self._db.mark_service_as_errored(service)
+                service_to_error[service.id] = e
+
+        self._db.commit()
+        return service_to_error
+
+    # Returns IDs of warm workers taken from the pool, 
+    # or `None` if there is no such pool or not enough of its warm workers are idle
+    def _take_warm_workers(self, pool_id, replicas):
+        if WARM_WORKER_POOL_SIZE <= 0:
+            return None
+
+        return self._cache.pop_idle_warm_workers(pool_id, replicas)
+
+    # Scales a service run by warm workers by assigning it more idle warm workers from its pool, as many as are idle,
+    # or by signalling some of its warm workers to stop. Returns the no. of replicas that the service was scaled by
+    def _scale_warm_workers_of_service(self, service, replicas):
+        if replicas < service.replicas:
+            return -self._cache.stop_some_warm_workers_of_service(service.id, service.replicas - replicas)
+
+        warm_worker_service = self._cache.get_warm_worker_service(service.id)
+        if warm_worker_service is None:
+            return 0
+
+        (pool_id, environment_vars) = warm_worker_service
+        for count in range(replicas - service.replicas, 0, -1):
+            warm_worker_ids = self._cache.pop_idle_warm_workers(pool_id, count)
+            if warm_worker_ids is not None:
+                for replica_id in warm_worker_ids:
+                    self._cache.assign_warm_worker(replica_id, service.id, environment_vars)
+                return count
+
+        return 0
+
+    def _build_worker_images(self, base_docker_image, dependencies):
+        for enable_gpu in [False, True]:
+            install_command = parse_model_install_command(dependencies, enable_gpu=enable_gpu)
+            if install_command == '':
+                continue
+
+            image_id = self._get_worker_image_id(base_docker_image, install_command)
+            if self._cache.get_worker_image(image_id) is not None:
+                continue
+
+            try:
+                docker_image = self._container_manager.build_image(
+                    image_name='rafiki_worker_deps:{}'.format(image_id),
+                    base_docker_image=base_docker_image,
+                    commands=install_command
+                )
+                self._cache.add_worker_image(image_id, docker_image)
+            except Exception:
+                # Workers will fall back to installing dependencies when they start
+                logger.error('Error while building worker image for {}:'.format(base_docker_image))
+                logger.error(traceback.format_exc())
+
+    # Returns (<docker image>, <install command>) for a worker, preferring a built image 
+    # with the dependencies pre-installed, in which case there is nothing to install
+    def _get_worker_image(self, base_docker_image, install_command):
+        if install_command == '':
+            return (base_docker_image, install_command)
+
+        image_id = self._get_worker_image_id(base_docker_image, install_command)
+        docker_image = self._cache.get_worker_image(image_id)
+        if docker_image is None:
+            return (base_docker_image, install_command)
+
+        # Built image might have since been removed (e.g. pruned), in which case it is rebuilt with `build_worker_images`
+        if not self._container_manager.has_image(docker_image):
+            logger.warning('Worker image "{}" no longer exists'.format(docker_image))
+            self._cache.delete_worker_image(image_id)
+            return (base_docker_image, install_command)
+
+        return (docker_image, '')
+
+    def _get_worker_image_id(self, base_docker_image, install_command):
+        image_key = '{}\n{}'.format(base_docker_image, install_command)
+        return hashlib.sha1(image_key.encode('utf-8')).hexdigest()[:16]
+
+    def _get_pip_cache_dir(self):
+        return os.path.join(self._data_docker_workdir, '.pip_cache')
+
+    def _get_wheelhouse_dir(self):
+        return os.path.join(self._data_docker_workdir, '.wheelhouse')
+
+    # Workers share admin's configuration of the artifact store, including the data folder it is in by default
+    def _get_artifact_store_environment_vars(self):
+        return {
+            'DATA_DOCKER_WORKDIR_PATH': self._data_docker_workdir,
+            **{ k: os.environ[k] for k in ARTIFACT_STORE_ENVIRONMENT_VARS if os.environ.get(k) }
+        }
+
+    def _get_worker_pool_id(self, docker_image, install_command, enable_gpu=False):
+        pool_key = '{}\n{}\n{}'.format(docker_image, install_command, 'GPU' if enable_gpu else 'CPU')
+        return hashlib.sha1(pool_key.encode('utf-8')).hexdigest()[:16]
 
     def _get_available_ext_port(self):
         # Credits to https://stackoverflow.com/questions/1365265/on-localhost-how-do-i-pick-a-free-port-number
@@ -359,18 +865,77 @@ class ServicesManager(object):
         best_trials = self._db.get_best_trials_of_train_job(inference_job.train_job_id)
         return best_trials
 
-    def _compute_train_worker_replicas_for_sub_train_jobs(self, sub_train_jobs):
-        # TODO: Improve provisioning algorithm
-        return {
-            sub_train_job : TRAIN_WORKER_REPLICAS_PER_SUB_TRAIN_JOB
-            for sub_train_job in sub_train_jobs
-        }
-
-    def _compute_inference_worker_replicas_for_trials(self, trials):
-        # TODO: Improve provisioning algorithm
-        return {
-            trial : INFERENCE_WORKER_REPLICAS_PER_TRIAL
-            for trial in trials
-        }
+    # Packs replicas of train workers of sub train jobs onto nodes by their free resources,
+    # up to `TRAIN_WORKER_REPLICAS_PER_SUB_TRAIN_JOB` replicas per sub train job
+    def _compute_train_worker_replicas_for_sub_train_jobs(self, train_job, sub_train_jobs):
+        enable_gpu = int(train_job.budget.get(BudgetType.ENABLE_GPU, 0)) > 0
+        parallel_trials = int(train_job.budget.get(BudgetType.PARALLEL_TRIALS, 1))
+        sub_train_job_to_request = {}
+        for sub_train_job in sub_train_jobs:
+            model = self._db.get_model(sub_train_job.model_id)
+            reservations = self._provisioner.get_reservations(model, parallel_trials=parallel_trials)
+            sub_train_job_to_request[sub_train_job] = \
+                (reservations, TRAIN_WORKER_REPLICAS_PER_SUB_TRAIN_JOB, enable_gpu)
+
+        return self._provisioner.compute_replicas(sub_train_job_to_request)
+
+    # Groups trials to be co-hosted by inference workers, up to `INFERENCE_WORKER_MAX_TRIALS` trials per worker
+    # Only trials whose models share the same Docker image & dependencies can be grouped together
+    def _group_trials_for_inference_workers(self, trials):
+        env_to_trials = {}
+        for trial in trials:
+            model = self._db.get_model(trial.model_id)
+            env = (model.docker_image, json.dumps(model.dependencies, sort_keys=True))
+            env_to_trials[env] = env_to_trials.get(env, []) + [trial]
+
+        trial_groups = []
+        for env_trials in env_to_trials.values():
+            for i in range(0, len(env_trials), INFERENCE_WORKER_MAX_TRIALS):
+                trial_groups.append(env_trials[i:i + INFERENCE_WORKER_MAX_TRIALS])
+
+        return trial_groups
+
+    # Packs replicas of inference workers of groups of trials onto nodes by their free resources,
+    # up to the replicas each group needs to serve the target throughput
+    # Returns a list of replicas, in the order of the groups
+    def _compute_inference_worker_replicas_for_trial_groups(self, trial_groups):
+        group_to_request = {}
+        for (i, trials) in enumerate(trial_groups):
+            model = self._db.get_model(trials[0].model_id)
+            reservations = self._provisioner.get_reservations(model)
+            max_replicas = self._compute_inference_worker_replicas_for_throughput(trials)
+            group_to_request[i] = (reservations, max_replicas, False)
+
+        group_to_replicas = self._provisioner.compute_replicas(group_to_request)
+        return [group_to_replicas[i] for i in range(len(trial_groups))]
+
+    # Returns the replicas an inference worker needs for all ensemble members to serve
+    # `INFERENCE_WORKER_TARGET_THROUGHPUT` queries per second, from the measured latencies of its trials' models
+    # As a replica makes predictions with each of its trials in turn, their times per query add up
+    # Falls back to `INFERENCE_WORKER_REPLICAS_PER_TRIAL` if any of its trials hasn't been profiled
+    # Inference workers are deployed with these replicas, after which the autoscaler owns their replicas 
+    # and never scales them below these replicas
+    def get_inference_worker_min_replicas(self, trials):
+        return self._compute_inference_worker_replicas_for_throughput(trials)
+
+    def _compute_inference_worker_replicas_for_throughput(self, trials):
+        times_per_query = [self._get_predict_time_per_query(x.profile) for x in trials]
+        if None in times_per_query:
+            return INFERENCE_WORKER_REPLICAS_PER_TRIAL
+
+        replicas = math.ceil(INFERENCE_WORKER_TARGET_THROUGHPUT * sum(times_per_query))
+        return min(max(replicas, 1), INFERENCE_WORKER_MAX_REPLICAS)
+
+    # Returns the time in seconds for a replica to make predictions for a query with a trial's model,
+    # from its profiled latency at the largest batch size up to `INFERENCE_WORKER_PREDICT_BATCH_SIZE`,
+    # or `None` if the trial hasn't been profiled
+    def _get_predict_time_per_query(self, profile):
+        latencies = (profile or {}).get('predict_latencies', {})
+        batch_sizes = [int(x) for x in latencies.keys() if int(x) <= INFERENCE_WORKER_PREDICT_BATCH_SIZE]
+        if len(batch_sizes) == 0:
+            return None
+
+        batch_size = max(batch_sizes)
+        return latencies[str(batch_size)] / batch_size
 
     
\ No newline at end of file
@@ -3,6 +3,8 @@ import numpy as np
 
 from rafiki.constants import AdvisorType
 
+from .early_stopping import make_early_stopper
+
 class InvalidAdvisorTypeException(Exception): pass
 
 class BaseAdvisor(abc.ABC):
@@ -24,8 +26,9 @@ class BaseAdvisor(abc.ABC):
 
 # Generalized Advisor class that wraps & hides implementation-specific advisor class
 class Advisor():
-    def __init__(self, knob_config, advisor_type=AdvisorType.BTB_GP):
+    def __init__(self, knob_config, advisor_type=AdvisorType.BTB_GP, early_stopping=None):
         self._advisor = self._make_advisor(knob_config, advisor_type)
+        self._early_stopper = make_early_stopper(early_stopping) if early_stopping else None
         self._knob_config = knob_config
 
     @property
@@ -47,6 +50,13 @@ class Advisor():
     def feedback(self, knobs, score):
         self._advisor.feedback(knobs, score)
 
+    # Records an intermediate score of a trial, returning whether the trial should stop early
+    def report(self, trial_id, score, step):
+        if self._early_stopper is None:
+            return False
+
+        return self._early_stopper.report(trial_id, score, step)
+
     def _make_advisor(self, knob_config, advisor_type):
         if advisor_type == AdvisorType.BTB_GP:
             from .btb_gp_advisor import BtbGpAdvisor
@@ -62,6 +62,12 @@ def feedback(auth, advisor_id):
     params = get_request_params()
     return jsonify(service.feedback(advisor_id, **params))
 
+@app.route('/advisors/<advisor_id>/report', methods=['POST'])
+@auth([UserType.ADMIN, UserType.APP_DEVELOPER])
+def report(auth, advisor_id):
+    params = get_request_params()
+    return jsonify(service.report(advisor_id, **params))
+
 @app.route('/advisors/<advisor_id>', methods=['DELETE'])
 @auth([UserType.ADMIN, UserType.APP_DEVELOPER])
 def delete_advisor(auth, advisor_id):
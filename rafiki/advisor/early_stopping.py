@@ -0,0 +1,86 @@
+import abc
+import math
+import numpy as np
+
+from rafiki.constants import EarlyStoppingType
+from rafiki.config import ADVISOR_EARLY_STOPPING_MIN_TRIALS, ADVISOR_EARLY_STOPPING_GRACE_STEPS, \
+    ADVISOR_SUCCESSIVE_HALVING_REDUCTION_FACTOR
+
+class InvalidEarlyStoppingTypeException(Exception): pass
+
+class BaseEarlyStopper(abc.ABC):
+    '''
+    Decides whether trials should stop early, from the intermediate scores that they report
+    at increasing steps (e.g. epochs) while training. Higher scores are better.
+    '''
+
+    @abc.abstractmethod
+    def report(self, trial_id, score, step):
+        '''
+            Records a trial's score at a step.
+
+            Returns whether the trial should stop
+        '''
+        raise NotImplementedError()
+
+# Stops a trial if its best score so far is worse than the median of other trials' scores at the same step
+class MedianEarlyStopper(BaseEarlyStopper):
+    def __init__(self):
+        self._trial_to_step_scores = {} # { <trial_id>: { <step>: <score> } }
+
+    def report(self, trial_id, score, step):
+        step_scores = self._trial_to_step_scores.setdefault(trial_id, {})
+        step_scores[step] = score
+
+        if step < ADVISOR_EARLY_STOPPING_GRACE_STEPS:
+            return False
+
+        # Compare against scores of other trials at the same step
+        other_scores = [
+            x[step] for (other_trial_id, x) in self._trial_to_step_scores.items()
+            if other_trial_id != trial_id and step in x
+        ]
+        if len(other_scores) < ADVISOR_EARLY_STOPPING_MIN_TRIALS:
+            return False
+
+        best_score = max([x for (s, x) in step_scores.items() if s <= step])
+        return bool(best_score < np.median(other_scores))
+
+# Asynchronous successive halving (ASHA): trials reaching a rung (at steps growing geometrically by
+# the reduction factor) only continue if they are within the top (1 / <reduction factor>) of scores at the rung
+class SuccessiveHalvingEarlyStopper(BaseEarlyStopper):
+    def __init__(self, reduction_factor=ADVISOR_SUCCESSIVE_HALVING_REDUCTION_FACTOR):
+        self._reduction_factor = reduction_factor
+        self._rung_to_scores = {} # { <rung step>: [<score of each trial that reached the rung>] }
+        self._trial_to_rung = {} # { <trial_id>: <highest rung step that the trial has reached> }
+
+    def report(self, trial_id, score, step):
+        rung = self._get_rung(step)
+        if rung is None or self._trial_to_rung.get(trial_id, -1) >= rung:
+            return False
+
+        self._trial_to_rung[trial_id] = rung
+        scores = self._rung_to_scores.setdefault(rung, [])
+        scores.append(score)
+        if len(scores) <= ADVISOR_EARLY_STOPPING_MIN_TRIALS:
+            return False
+
+        cutoff = np.percentile(scores, (1 - 1 / self._reduction_factor) * 100)
+        return bool(score < cutoff)
+
+    # Returns the highest rung at or below the step, or `None` if the step is below the first rung
+    def _get_rung(self, step):
+        min_step = max(ADVISOR_EARLY_STOPPING_GRACE_STEPS, 1)
+        if step < min_step:
+            return None
+
+        k = math.floor(math.log(step / min_step, self._reduction_factor) + 1e-9)
+        return min_step * (self._reduction_factor ** k)
+
+def make_early_stopper(early_stopping_type):
+    if early_stopping_type == EarlyStoppingType.MEDIAN:
+        return MedianEarlyStopper()
+    elif early_stopping_type == EarlyStoppingType.SUCCESSIVE_HALVING:
+        return SuccessiveHalvingEarlyStopper()
+    else:
+        raise InvalidEarlyStoppingTypeException()
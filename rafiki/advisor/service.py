@@ -16,7 +16,7 @@ class AdvisorService(object):
     def __init__(self):
         self._advisors = {}
 
-    def create_advisor(self, knob_config, advisor_id=None):
+    def create_advisor(self, knob_config, advisor_id=None, early_stopping=None):
         is_created = False
         advisor = None
 
@@ -24,7 +24,7 @@ class AdvisorService(object):
             advisor = self._get_advisor(advisor_id)
             
         if advisor is None:
-            advisor = Advisor(knob_config)
+            advisor = Advisor(knob_config, early_stopping=early_stopping)
             advisor_id = str(uuid.uuid4()) if advisor_id is None else advisor_id
             self._advisors[advisor_id] = advisor
             is_created = True
@@ -72,6 +72,20 @@ class AdvisorService(object):
             'knobs': knobs
         }
 
+    # Reports an intermediate score of a trial at a step (e.g. an epoch) to the advisor
+    # Returns whether the trial should stop early
+    def report(self, advisor_id, trial_id, score, step):
+        advisor = self._get_advisor(advisor_id)
+
+        if advisor is None:
+            raise InvalidAdvisorException()
+
+        should_stop = advisor.report(trial_id, float(score), int(step))
+
+        return {
+            'should_stop': should_stop
+        }
+
     def _get_advisor(self, advisor_id):
         if advisor_id not in self._advisors:
             return None
@@ -0,0 +1,4 @@
+from .artifact_store import ArtifactStore, ArtifactStoreType, InvalidArtifactException
+from .file_system import FileSystemArtifactStore
+from .s3 import S3ArtifactStore
+from .utils import make_artifact_store
@@ -0,0 +1,154 @@
+import abc
+import io
+import gzip
+import hashlib
+import tempfile
+
+from rafiki.config import ARTIFACT_STORE_COMPRESSION_LEVEL
+
+# Size in bytes of chunks that artifacts are streamed in
+CHUNK_SIZE = 1024 * 1024
+
+# Suffix of IDs of artifacts that are stored compressed
+COMPRESSED_SUFFIX = '.gz'
+
+class InvalidArtifactException(Exception): pass
+
+class ArtifactStoreType():
+    FILE_SYSTEM = 'FILE_SYSTEM'
+    S3 = 'S3'
+
+class ArtifactStore(abc.ABC):
+    '''
+    Stores immutable blobs (e.g. trained models' parameters) outside of the DB, content-addressed
+    by the SHA-256 digests of their contents, so that identical blobs are only stored once.
+
+    Artifacts are streamed in & out in chunks, and optionally stored gzip-compressed. Whether an
+    artifact is compressed is part of its ID, so artifacts stay readable if compression is reconfigured.
+
+    Subclasses only have to store & retrieve objects by keys.
+    '''
+    def __init__(self, compression_level=ARTIFACT_STORE_COMPRESSION_LEVEL):
+        self._compression_level = compression_level
+
+    def put_artifact(self, file):
+        '''
+            Stores the contents of a readable binary file object as an artifact.
+
+            Args
+                file: File object to read the artifact's contents from until EOF
+            Returns
+                ID of the artifact
+        '''
+        # Stage the artifact in a temporary file, as its key is only known after it has been read
+        with tempfile.TemporaryFile() as temp_file:
+            hasher = hashlib.sha256()
+            is_compressed = self._compression_level > 0
+            out = gzip.GzipFile(fileobj=temp_file, mode='wb', compresslevel=self._compression_level, mtime=0) \
+                if is_compressed else temp_file
+
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+                out.write(chunk)
+
+            if is_compressed:
+                out.close() # Flushes the gzip trailer without closing the temporary file
+
+            artifact_id = hasher.hexdigest() + (COMPRESSED_SUFFIX if is_compressed else '')
+            if not self._has_object(artifact_id):
+                temp_file.seek(0)
+                self._write_object(artifact_id, temp_file)
+
+        return artifact_id
+
+    def open_artifact(self, artifact_id):
+        '''
+            Opens an artifact for reading.
+
+            Args
+                artifact_id: ID of the artifact
+            Returns
+                Readable & buffered binary file object of the artifact's (decompressed) contents,
+                to be closed after use, whose `tell()` is the no. of bytes read so far
+        '''
+        if not self._has_object(artifact_id):
+            raise InvalidArtifactException('Artifact of ID "{}" does not exist'.format(artifact_id))
+
+        file = self._open_object(artifact_id)
+        if artifact_id.endswith(COMPRESSED_SUFFIX):
+            file = _ClosingGzipFile(fileobj=file, mode='rb')
+
+        return io.BufferedReader(_RawReader(file), buffer_size=CHUNK_SIZE)
+
+    def get_artifact(self, artifact_id):
+        '''
+            Reads an artifact's contents fully into memory.
+
+            Args
+                artifact_id: ID of the artifact
+            Returns
+                Bytes of the artifact's (decompressed) contents
+        '''
+        with self.open_artifact(artifact_id) as f:
+            return f.read()
+
+    def delete_artifact(self, artifact_id):
+        '''
+            Deletes an artifact, if it exists.
+            As identical artifacts are only stored once, callers should ensure that the artifact isn't referenced elsewhere.
+
+            Args
+                artifact_id: ID of the artifact
+        '''
+        self._delete_object(artifact_id)
+
+    @abc.abstractmethod
+    def _has_object(self, key):
+        raise NotImplementedError()
+
+    # Stores an object, reading it from a binary file object until EOF
+    @abc.abstractmethod
+    def _write_object(self, key, file):
+        raise NotImplementedError()
+
+    # Returns a readable binary file object of an object
+    @abc.abstractmethod
+    def _open_object(self, key):
+        raise NotImplementedError()
+
+    # Deletes an object, if it exists
+    @abc.abstractmethod
+    def _delete_object(self, key):
+        raise NotImplementedError()
+
+# `GzipFile` doesn't close the file object it wraps
+class _ClosingGzipFile(gzip.GzipFile):
+    def close(self):
+        fileobj = self.fileobj
+        super().close()
+        if fileobj is not None:
+            fileobj.close()
+
+# Adapts any file object with `read()` (e.g. streamed HTTP bodies) for `io.BufferedReader`,
+# tracking the position read up to
+class _RawReader(io.RawIOBase):
+    def __init__(self, file):
+        self._file = file
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._file.read(len(b))
+        b[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
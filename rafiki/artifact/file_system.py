@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+
+from .artifact_store import ArtifactStore
+
+class FileSystemArtifactStore(ArtifactStore):
+    '''
+    Stores artifacts as files in a directory, typically on the data folder shared with containers.
+    Files are sharded into sub-directories by the first 2 characters of their keys.
+    '''
+    def __init__(self, root_dir, **kwargs):
+        super().__init__(**kwargs)
+        self._root_dir = root_dir
+
+    def _has_object(self, key):
+        return os.path.exists(self._get_path(key))
+
+    def _write_object(self, key, file):
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file in the same directory, then rename it,
+        # so that concurrent readers never see a partially written file
+        (fd, temp_path) = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(file, f)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def _open_object(self, key):
+        return open(self._get_path(key), 'rb')
+
+    def _delete_object(self, key):
+        try:
+            os.remove(self._get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _get_path(self, key):
+        return os.path.join(self._root_dir, key[:2], key)
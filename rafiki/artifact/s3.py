@@ -0,0 +1,41 @@
+from .artifact_store import ArtifactStore
+
+class S3ArtifactStore(ArtifactStore):
+    '''
+    Stores artifacts as objects in a bucket of Amazon S3, or of any S3-compatible object storage
+    (e.g. a local MinIO server) given its endpoint URL.
+
+    Credentials are read by `boto3` from the standard AWS environment variables.
+    '''
+    def __init__(self, bucket, endpoint_url=None, prefix='artifacts/', **kwargs):
+        super().__init__(**kwargs)
+
+        # Only required if artifacts are stored in S3
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self._client = boto3.client('s3', endpoint_url=endpoint_url)
+        self._client_error = ClientError
+        self._bucket = bucket
+        self._prefix = prefix
+
+    def _has_object(self, key):
+        try:
+            self._client.head_object(Bucket=self._bucket, Key=self._prefix + key)
+            return True
+        except self._client_error as e:
+            if e.response.get('Error', {}).get('Code') in ['404', 'NoSuchKey']:
+                return False
+            raise
+
+    def _write_object(self, key, file):
+        # Uploads in parts for large objects
+        self._client.upload_fileobj(file, self._bucket, self._prefix + key)
+
+    def _open_object(self, key):
+        res = self._client.get_object(Bucket=self._bucket, Key=self._prefix + key)
+        return res['Body']
+
+    def _delete_object(self, key):
+        # Deleting an object that doesn't exist succeeds
+        self._client.delete_object(Bucket=self._bucket, Key=self._prefix + key)
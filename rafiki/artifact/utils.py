@@ -0,0 +1,24 @@
+import os
+
+from .artifact_store import ArtifactStoreType
+from .file_system import FileSystemArtifactStore
+from .s3 import S3ArtifactStore
+
+# Makes the artifact store of the type configured by the `ARTIFACT_STORE` environment variable
+# By default, artifacts are stored in the data folder shared with containers
+# Environment variables that are set to empty strings are treated as unset
+def make_artifact_store():
+    artifact_store_type = os.environ.get('ARTIFACT_STORE') or ArtifactStoreType.FILE_SYSTEM
+    if artifact_store_type == ArtifactStoreType.S3:
+        bucket = os.environ.get('ARTIFACT_STORE_S3_BUCKET')
+        if not bucket:
+            raise ValueError('`ARTIFACT_STORE_S3_BUCKET` must be set for the S3 artifact store')
+
+        return S3ArtifactStore(
+            bucket=bucket,
+            endpoint_url=os.environ.get('ARTIFACT_STORE_S3_ENDPOINT_URL') or None
+        )
+
+    root_dir = os.environ.get('ARTIFACT_STORE_PATH') or \
+        os.path.join(os.environ['DATA_DOCKER_WORKDIR_PATH'], 'artifacts')
+    return FileSystemArtifactStore(root_dir)
@@ -1 +1 @@
-from .cache import Cache
\ No newline at end of file
+from .cache import Cache, make_worker_ids
\ No newline at end of file
@@ -2,10 +2,70 @@ import redis
 import os
 import json
 import uuid
+import time
 
 RUNNING_INFERENCE_WORKERS = 'INFERENCE_WORKERS'
+RUNNING_INFERENCE_WORKER_REPLICAS = 'INFERENCE_WORKER_REPLICAS'
 QUERIES_QUEUE = 'QUERIES'
 PREDICTIONS_QUEUE = 'PREDICTIONS'
+PREDICTION_LATENCIES = 'PREDICTION_LATENCIES'
+WARM_WORKER_POOLS = 'WARM_WORKER_POOLS'
+IDLE_WARM_WORKERS = 'IDLE_WARM_WORKERS'
+TAKEN_WARM_WORKER = 'TAKEN_WARM_WORKER'
+WARM_WORKER_ASSIGNMENTS = 'WARM_WORKER_ASSIGNMENTS'
+WARM_WORKER_SIGNALS = 'WARM_WORKER_SIGNALS'
+WARM_WORKERS_OF_SERVICE = 'WARM_WORKERS_OF_SERVICE'
+WARM_WORKER_SERVICES = 'WARM_WORKER_SERVICES'
+WARM_WORKER_STOP_SIGNAL = 'STOP'
+TRAIN_WORKER_POOLS = 'TRAIN_WORKER_POOLS'
+WORKER_IMAGES = 'WORKER_IMAGES'
+TRAIN_TASKS_QUEUE = 'TRAIN_TASKS'
+
+# Number of most recent prediction latencies kept for each worker
+PREDICTION_LATENCIES_SAMPLE_SIZE = 100
+
+# Time in seconds after their last heartbeat that replicas of workers are considered dead
+# e.g. when they have been killed without deregistering themselves
+WORKER_HEARTBEAT_TTL = 30
+
+# Time in seconds that a warm worker taken out of its pool is kept out of the pool, until it is assigned a service
+TAKEN_WARM_WORKER_TTL = 600
+
+# Adds (or refreshes the heartbeat of) an idle warm worker in its pool, unless it has been taken out of the pool
+# KEYS: <idle warm workers key>, <taken warm worker key>; ARGV: <time>, <replica_id>
+ADD_IDLE_WARM_WORKER_SCRIPT = '''
+if redis.call('exists', KEYS[2]) == 0 then
+    redis.call('zadd', KEYS[1], ARGV[1], ARGV[2])
+end
+'''
+
+# Prunes idle warm workers without recent heartbeats from a pool, then takes a number of them out of the pool, 
+# marking them as taken, or takes none if there aren't enough of them
+# KEYS: <idle warm workers key>; ARGV: <count>, <min heartbeat time>, <taken warm worker key prefix>, <taken TTL>
+POP_IDLE_WARM_WORKERS_SCRIPT = '''
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[2])
+local count = tonumber(ARGV[1])
+if redis.call('zcard', KEYS[1]) < count then
+    return {}
+end
+local replica_ids = redis.call('zrange', KEYS[1], 0, count - 1)
+for _, replica_id in ipairs(replica_ids) do
+    redis.call('zrem', KEYS[1], replica_id)
+    redis.call('setex', ARGV[3] .. replica_id, ARGV[4], 1)
+end
+return replica_ids
+'''
+
+# Returns { <trial_id>: <worker_id> }, the IDs that queries & predictions of a worker service are routed by
+# A worker service that hosts multiple trials has a separate worker ID for each of its trials
+def make_worker_ids(service_id, trial_ids):
+    if len(trial_ids) == 1:
+        return { trial_ids[0]: service_id }
+
+    return {
+        trial_id: '{}_{}'.format(service_id, trial_id)
+        for trial_id in trial_ids
+    }
 
 class Cache(object):
     def __init__(self,
@@ -19,6 +79,8 @@ class Cache(object):
 
         self._connection_pool = redis.ConnectionPool.from_url(cache_connection_url)
         self._redis = redis.StrictRedis(connection_pool=self._connection_pool, decode_responses=True)
+        self._add_idle_warm_worker_script = self._redis.register_script(ADD_IDLE_WARM_WORKER_SCRIPT)
+        self._pop_idle_warm_workers_script = self._redis.register_script(POP_IDLE_WARM_WORKERS_SCRIPT)
         
     def add_worker_of_inference_job(self, worker_id, inference_job_id):
         inference_workers_key = '{}_{}'.format(RUNNING_INFERENCE_WORKERS, inference_job_id)
@@ -33,6 +95,44 @@ class Cache(object):
         worker_ids = self._redis.smembers(inference_workers_key)
         return [x.decode() for x in worker_ids]
 
+    # Atomically replaces a set of workers of an inference job with another set of workers
+    def switch_workers_of_inference_job(self, old_worker_ids, new_worker_ids, inference_job_id):
+        inference_workers_key = '{}_{}'.format(RUNNING_INFERENCE_WORKERS, inference_job_id)
+        pipe = self._redis.pipeline()
+        if len(old_worker_ids) > 0:
+            pipe.srem(inference_workers_key, *old_worker_ids)
+        if len(new_worker_ids) > 0:
+            pipe.sadd(inference_workers_key, *new_worker_ids)
+        pipe.execute()
+
+    # Replicas of a worker are kept in a sorted set scored by the times of their last heartbeats,
+    # where replicas without a recent heartbeat are pruned as dead
+    def get_replica_count_of_worker(self, worker_id):
+        worker_replicas_key = '{}_{}'.format(RUNNING_INFERENCE_WORKER_REPLICAS, worker_id)
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(worker_replicas_key, '-inf', time.time() - WORKER_HEARTBEAT_TTL)
+        pipe.zcard(worker_replicas_key)
+        (_, replica_count) = pipe.execute()
+        return replica_count
+
+    # Adds a replica of a worker, or refreshes its heartbeat if it has been added
+    def add_replica_of_worker(self, replica_id, worker_id):
+        worker_replicas_key = '{}_{}'.format(RUNNING_INFERENCE_WORKER_REPLICAS, worker_id)
+        pipe = self._redis.pipeline()
+        pipe.zadd(worker_replicas_key, time.time(), replica_id) # As `<score>, <member>` in redis 2.x
+        pipe.expire(worker_replicas_key, WORKER_HEARTBEAT_TTL)
+        pipe.execute()
+
+    # Returns the number of replicas of the worker that remain running
+    def delete_replica_of_worker(self, replica_id, worker_id):
+        worker_replicas_key = '{}_{}'.format(RUNNING_INFERENCE_WORKER_REPLICAS, worker_id)
+        pipe = self._redis.pipeline()
+        pipe.zrem(worker_replicas_key, replica_id)
+        pipe.zremrangebyscore(worker_replicas_key, '-inf', time.time() - WORKER_HEARTBEAT_TTL)
+        pipe.zcard(worker_replicas_key)
+        (_, _, replica_count) = pipe.execute()
+        return replica_count
+
     def add_query_of_worker(self, worker_id, query):
         query_id = str(uuid.uuid4())
         query = json.dumps({
@@ -46,36 +146,210 @@ class Cache(object):
 
     def pop_queries_of_worker(self, worker_id, batch_size):
         worker_queries_key = '{}_{}'.format(QUERIES_QUEUE, worker_id)
-        queries = self._redis.lrange(worker_queries_key, 0, batch_size - 1)
-        self._redis.ltrim(worker_queries_key, len(queries), -1)
+
+        # Pop queries atomically, as replicas of a worker share its queue of queries
+        pipe = self._redis.pipeline()
+        pipe.lrange(worker_queries_key, 0, batch_size - 1)
+        pipe.ltrim(worker_queries_key, batch_size, -1)
+        (queries, _) = pipe.execute()
+
         queries = [json.loads(x) for x in queries]
         query_ids = [x['id'] for x in queries]
         queries = [x['query'] for x in queries]
         return (query_ids, queries)
 
-    def add_prediction_of_worker(self, worker_id, query_id, prediction):
+    # Adds the prediction for a worker's query
+    # If the query errored, `prediction` should be `None` and `error` should describe the error
+    def add_prediction_of_worker(self, worker_id, query_id, prediction, error=None):
         prediction = json.dumps({
             'id': query_id,
-            'prediction': prediction
+            'prediction': prediction,
+            'error': error
         })
 
         worker_predictions_key = '{}_{}'.format(PREDICTIONS_QUEUE, worker_id)
         self._redis.rpush(worker_predictions_key, prediction)
 
+    # Returns (prediction, error) for a worker's query, or `None` if it is not found
     def pop_prediction_of_worker(self, worker_id, query_id):
         # Search through worker's list of predictions
         worker_predictions_key = '{}_{}'.format(PREDICTIONS_QUEUE, worker_id)
         predictions = self._redis.lrange(worker_predictions_key, 0, -1)
 
-        for (i, prediction) in enumerate(predictions):
-            prediction = json.loads(prediction)
+        for raw_prediction in predictions:
+            prediction = json.loads(raw_prediction)
             # If prediction for query found, remove prediction from list and return it
             if prediction['id'] == query_id:
-                self._redis.ltrim(worker_predictions_key, i + 1, i)
-                return prediction['prediction']
+                self._redis.lrem(worker_predictions_key, 1, raw_prediction)
+                return (prediction['prediction'], prediction.get('error'))
 
         # Return None if prediction is not found
         return None
 
+    def get_queue_depth_of_worker(self, worker_id):
+        worker_queries_key = '{}_{}'.format(QUERIES_QUEUE, worker_id)
+        return self._redis.llen(worker_queries_key)
+
+    def add_prediction_latency_of_worker(self, worker_id, latency):
+        worker_latencies_key = '{}_{}'.format(PREDICTION_LATENCIES, worker_id)
+        pipe = self._redis.pipeline()
+        pipe.lpush(worker_latencies_key, latency)
+        pipe.ltrim(worker_latencies_key, 0, PREDICTION_LATENCIES_SAMPLE_SIZE - 1)
+        pipe.execute()
+
+    # Returns the worker's mean prediction latency over its recent predictions, or `None` if there are none
+    def get_prediction_latency_of_worker(self, worker_id):
+        worker_latencies_key = '{}_{}'.format(PREDICTION_LATENCIES, worker_id)
+        latencies = [float(x) for x in self._redis.lrange(worker_latencies_key, 0, -1)]
+        if len(latencies) == 0:
+            return None
+
+        return sum(latencies) / len(latencies)
+
+    def clear_prediction_latencies_of_worker(self, worker_id):
+        worker_latencies_key = '{}_{}'.format(PREDICTION_LATENCIES, worker_id)
+        self._redis.delete(worker_latencies_key)
+
+    def add_warm_worker_pool(self, pool_id, container_service_id):
+        self._redis.hset(WARM_WORKER_POOLS, pool_id, container_service_id)
+
+    # Returns the ID of the container service of the warm worker pool, or `None` if the pool doesn't exist
+    def get_warm_worker_pool(self, pool_id):
+        container_service_id = self._redis.hget(WARM_WORKER_POOLS, pool_id)
+        return container_service_id.decode() if container_service_id is not None else None
+
+    # Idle warm workers of a pool are kept in a sorted set scored by the times of their last heartbeats,
+    # where warm workers without a recent heartbeat (e.g. whose containers have died) are pruned as dead
+    # Idle warm workers should call this periodically as their heartbeat
+    def add_idle_warm_worker(self, replica_id, pool_id):
+        idle_warm_workers_key = '{}_{}'.format(IDLE_WARM_WORKERS, pool_id)
+        taken_warm_worker_key = '{}_{}'.format(TAKEN_WARM_WORKER, replica_id)
+        self._add_idle_warm_worker_script(keys=[idle_warm_workers_key, taken_warm_worker_key], 
+                                        args=[time.time(), replica_id])
+
+    # Atomically takes a number of live idle warm workers out of a pool
+    # Returns the IDs of the warm workers, or `None` if there aren't enough live idle warm workers
+    def pop_idle_warm_workers(self, pool_id, count):
+        idle_warm_workers_key = '{}_{}'.format(IDLE_WARM_WORKERS, pool_id)
+        replica_ids = self._pop_idle_warm_workers_script(
+            keys=[idle_warm_workers_key], 
+            args=[count, time.time() - WORKER_HEARTBEAT_TTL, '{}_'.format(TAKEN_WARM_WORKER), TAKEN_WARM_WORKER_TTL]
+        )
+
+        if len(replica_ids) < count:
+            return None
+
+        return [x.decode() for x in replica_ids]
+
+    def assign_warm_worker(self, replica_id, service_id, environment_vars):
+        assignment = json.dumps({
+            'service_id': service_id,
+            'environment_vars': environment_vars
+        })
+
+        warm_worker_assignments_key = '{}_{}'.format(WARM_WORKER_ASSIGNMENTS, replica_id)
+        warm_workers_of_service_key = '{}_{}'.format(WARM_WORKERS_OF_SERVICE, service_id)
+        pipe = self._redis.pipeline()
+        pipe.sadd(warm_workers_of_service_key, replica_id)
+        pipe.rpush(warm_worker_assignments_key, assignment)
+        pipe.execute()
+
+    # Blocks until the warm worker is assigned a service, then returns the assignment
+    def wait_for_warm_worker_assignment(self, replica_id):
+        warm_worker_assignments_key = '{}_{}'.format(WARM_WORKER_ASSIGNMENTS, replica_id)
+        (_, assignment) = self._redis.blpop(warm_worker_assignments_key)
+        return json.loads(assignment)
+
+    # Records the pool & environment variables of a service run by warm workers, 
+    # so that more warm workers can be assigned to the service later
+    def add_warm_worker_service(self, service_id, pool_id, environment_vars):
+        self._redis.hset(WARM_WORKER_SERVICES, service_id, json.dumps({
+            'pool_id': pool_id,
+            'environment_vars': environment_vars
+        }))
+
+    # Returns (<pool ID>, <environment variables>) of a service run by warm workers, or `None` if there is no such service
+    def get_warm_worker_service(self, service_id):
+        warm_worker_service = self._redis.hget(WARM_WORKER_SERVICES, service_id)
+        if warm_worker_service is None:
+            return None
+
+        warm_worker_service = json.loads(warm_worker_service)
+        return (warm_worker_service['pool_id'], warm_worker_service['environment_vars'])
+
+    # Signals all warm workers assigned to a service to stop the service
+    def stop_warm_workers_of_service(self, service_id):
+        warm_workers_of_service_key = '{}_{}'.format(WARM_WORKERS_OF_SERVICE, service_id)
+        replica_ids = [x.decode() for x in self._redis.smembers(warm_workers_of_service_key)]
+        pipe = self._redis.pipeline()
+        for replica_id in replica_ids:
+            warm_worker_signals_key = '{}_{}'.format(WARM_WORKER_SIGNALS, replica_id)
+            pipe.rpush(warm_worker_signals_key, WARM_WORKER_STOP_SIGNAL)
+        pipe.delete(warm_workers_of_service_key)
+        pipe.hdel(WARM_WORKER_SERVICES, service_id)
+        pipe.execute()
+
+    # Signals a number of the warm workers assigned to a service to stop the service (e.g. to scale it down)
+    # Returns the no. of warm workers signalled
+    def stop_some_warm_workers_of_service(self, service_id, count):
+        warm_workers_of_service_key = '{}_{}'.format(WARM_WORKERS_OF_SERVICE, service_id)
+        replica_ids = []
+        for _ in range(count):
+            replica_id = self._redis.spop(warm_workers_of_service_key)
+            if replica_id is None:
+                break
+
+            replica_ids.append(replica_id.decode())
+            warm_worker_signals_key = '{}_{}'.format(WARM_WORKER_SIGNALS, replica_ids[-1])
+            self._redis.rpush(warm_worker_signals_key, WARM_WORKER_STOP_SIGNAL)
+
+        return len(replica_ids)
+
+    # Blocks until the warm worker is signalled to stop its service
+    def wait_for_warm_worker_stop(self, replica_id):
+        warm_worker_signals_key = '{}_{}'.format(WARM_WORKER_SIGNALS, replica_id)
+        self._redis.blpop(warm_worker_signals_key)
+
+    def add_train_worker_pool(self, pool_id, service_id):
+        self._redis.hset(TRAIN_WORKER_POOLS, pool_id, service_id)
+
+    # Returns the ID of the service of the train worker pool, or `None` if the pool doesn't exist
+    def get_train_worker_pool(self, pool_id):
+        service_id = self._redis.hget(TRAIN_WORKER_POOLS, pool_id)
+        return service_id.decode() if service_id is not None else None
+
+    def add_train_tasks_of_pool(self, tasks, pool_id, at_front=False):
+        if len(tasks) == 0:
+            return
+
+        pool_tasks_key = '{}_{}'.format(TRAIN_TASKS_QUEUE, pool_id)
+        tasks = [json.dumps(x) for x in tasks]
+        if at_front:
+            self._redis.lpush(pool_tasks_key, *tasks)
+        else:
+            self._redis.rpush(pool_tasks_key, *tasks)
+
+    # Blocks until there is a task in the train worker pool's queue, then takes it
+    # Returns `None` if there is no task after the timeout (in seconds)
+    def pop_train_task_of_pool(self, pool_id, timeout):
+        pool_tasks_key = '{}_{}'.format(TRAIN_TASKS_QUEUE, pool_id)
+        res = self._redis.blpop(pool_tasks_key, timeout=timeout)
+        if res is None:
+            return None
+
+        (_, task) = res
+        return json.loads(task)
+
+    def add_worker_image(self, image_id, docker_image):
+        self._redis.hset(WORKER_IMAGES, image_id, docker_image)
+
+    # Returns the name of the built worker image, or `None` if it hasn't been built
+    def get_worker_image(self, image_id):
+        docker_image = self._redis.hget(WORKER_IMAGES, image_id)
+        return docker_image.decode() if docker_image is not None else None
+
+    def delete_worker_image(self, image_id):
+        self._redis.hdel(WORKER_IMAGES, image_id)
+
     def _make_connection_url(self, host, port):
         return 'redis://{}:{}'.format(host, port)
@@ -3,12 +3,19 @@ import json
 import pprint
 import pickle
 import os
+import time
 
-from rafiki.constants import BudgetType, ModelAccessRight
+from rafiki.constants import BudgetType, ModelAccessRight, OperationStatus
 
 class RafikiConnectionError(ConnectionError):
     pass
 
+class RafikiOperationError(Exception):
+    pass
+
+# Max time in seconds that each request long-polls an operation for
+OPERATION_POLL_TIMEOUT = 20
+
 class Client(object):
 
     '''
@@ -124,7 +131,7 @@ class Client(object):
     ####################################
 
     def create_model(self, name, task, model_file_path, model_class, docker_image=None, \
-                    dependencies={}, access_right=ModelAccessRight.PRIVATE):
+                    dependencies={}, access_right=ModelAccessRight.PRIVATE, resources=None):
         '''
         Creates a model on Rafiki.
 
@@ -139,6 +146,8 @@ class Client(object):
         :param str docker_image: A custom Docker image name that extends ``rafikiai/rafiki_worker``
         :param access_right: Model access right
         :type access_right: :class:`rafiki.constants.ModelAccessRight`
+        :param resources: Resources that each worker of the model needs
+        :type resources: dict[str, float]
         :returns: Created model as dictionary
         :rtype: dict[str, any]
 
@@ -173,6 +182,17 @@ class Client(object):
         ``torch``                   ``pip install torch==${ver}``
         =====================       =====================
 
+        ``resources`` should be a dictionary of ``{ <resource>: <amount> }``, where ``<resource>`` is one of 
+        :class:`rafiki.constants.ModelResource`. Rafiki reserves these resources for each worker of the model,
+        and sizes the number of workers to fit the cluster. Unspecified resources take default amounts.
+
+        =====================       =====================
+        **Resource**                **Amount**
+        ---------------------       ---------------------        
+        ``CPU``                     Number of CPU cores (e.g. ``0.5``)
+        ``MEMORY``                  Memory in MB
+        =====================       =====================
+
         '''
         f = open(model_file_path, 'rb')
         model_file_bytes = f.read()
@@ -189,7 +209,8 @@ class Client(object):
                 'dependencies': json.dumps(dependencies),
                 'docker_image': docker_image,
                 'model_class':  model_class,
-                'access_right': access_right
+                'access_right': access_right,
+                **({ 'resources': json.dumps(resources) } if resources is not None else {})
             }
         )
         return data
@@ -260,7 +281,7 @@ class Client(object):
     # Train Jobs
     ####################################
     
-    def create_train_job(self, app, task, train_dataset_uri, test_dataset_uri, budget, models=None):
+    def create_train_job(self, app, task, train_dataset_uri, test_dataset_uri, budget, models=None, wait=True):
         '''
         Creates and starts a train job on Rafiki. 
         A train job is uniquely identified by its associated app and the app version (returned in output).
@@ -274,9 +295,13 @@ class Client(object):
         :param str test_dataset_uri: URI of the test (development) dataset in a format specified by the task
         :param str budget: Budget for each model
         :param str[] models: list of model names to use for train job
+        :param bool wait: Whether to wait for the train job's services to be deployed
         :returns: Created train job as dictionary
         :rtype: dict[str, any]
 
+        If ``wait`` is ``False``, this method returns once the train job is created, before its services are deployed.
+        The response then includes an ``operation_id`` to track the deployment with :meth:`get_operation`.
+
         If ``models`` is unspecified, all models accessible to the user for the specified task will be used.
 
         ``budget`` should be a dictionary of ``{ <budget_type>: <budget_amount> }``, where 
@@ -290,6 +315,10 @@ class Client(object):
         ---------------------       ---------------------        
         ``MODEL_TRIAL_COUNT``       Target number of trials to run
         ``ENABLE_GPU``              Whether model training should run on GPU (0 or 1), if supported
+        ``PARALLEL_TRIALS``         Number of trials each train worker runs in parallel processes (defaults to 1), 
+                                    for models whose training doesn't use all CPU cores
+        ``EARLY_STOPPING``          Rule for stopping trials early from scores that models report with 
+                                    :meth:`rafiki.model.ModelLogger.report`, one of :class:`rafiki.constants.EarlyStoppingType`
         =====================       =====================
         '''
 
@@ -299,7 +328,8 @@ class Client(object):
             'train_dataset_uri': train_dataset_uri,
             'test_dataset_uri': test_dataset_uri,
             'budget': budget,
-            'models': models
+            'models': models,
+            'wait': wait
         })
         return data
 
@@ -396,6 +426,12 @@ class Client(object):
         '''
         Gets a specific trial.
 
+        For completed trials, ``metrics`` of the trial accounts for where it spent its resources, as
+        ``{ 'phases': { <phase>: { 'wall_time', 'cpu_time', 'peak_memory' } }, 'parameters_size': <bytes> }``,
+        with times in seconds & peak memory (RSS) in bytes. Phases include ``download``, ``unzip`` & ``decode`` of datasets,
+        which are nested in ``train`` & ``evaluate`` of the model, ``predict`` of the model when profiling its inference,
+        and ``dump_parameters``, ``pickle_parameters`` & ``store_parameters`` after training.
+
         :param str trial_id: ID of trial
         :returns: Details of trial as dictionary
         :rtype: dict[str, any]
@@ -451,7 +487,7 @@ class Client(object):
     # Inference Jobs
     ####################################
 
-    def create_inference_job(self, app, app_version=-1):
+    def create_inference_job(self, app, app_version=-1, output_policy=None, wait=True):
         '''
         Creates and starts a inference job on Rafiki with the 2 best trials of an associated train job of the app. 
         The train job must have the status of ``STOPPED``.The inference job would be tagged with the train job's app and app version. 
@@ -463,12 +499,37 @@ class Client(object):
 
         :param str app: Name of the app identifying the train job to use
         :param str app_version: Version of the app identifying the train job to use
+        :param dict[str, int] output_policy: How workers should compact predictions that are lists of probabilities
+        :param bool wait: Whether to wait for the inference job's services to be deployed
         :returns: Created inference job as dictionary
         :rtype: dict[str, any]
+
+        If ``wait`` is ``False``, this method returns once the inference job is created, before its services are deployed, 
+        without `predictor_host`. The response then includes an ``operation_id`` to track the deployment with 
+        :meth:`get_operation`, whose result includes `predictor_host`.
+
+        ``output_policy`` should be a dictionary of ``{ <output_policy_type>: <value> }``, where 
+        ``<output_policy_type>`` is one of :class:`rafiki.constants.OutputPolicyType`.
+        By default, predictions are returned in full.
+
+        The following describes the output policy types available:
+
+        ======================      =====================
+        **Output Policy Type**      **Description**
+        ----------------------      ---------------------        
+        ``TOP_K``                   Only return the top ``k`` classes as ``{ 'indices': [...], 'probs': [...] }``
+        ``FLOAT16``                 Send probabilities from workers to the predictor packed as float16 (0 or 1)
+        ``ARGMAX``                  Only return the index of the most probable class (0 or 1)
+        ======================      =====================
+
+        Values should be non-negative integers. Invalid output policies are rejected by Rafiki Admin, 
+        raising :class:`RafikiConnectionError` with the reason.
         '''
         data = self._post('/inference_jobs', json={
             'app': app,
-            'app_version': app_version
+            'app_version': app_version,
+            'output_policy': output_policy,
+            'wait': wait
         })
         return data
 
@@ -509,6 +570,27 @@ class Client(object):
         data = self._get('/inference_jobs/{}/{}'.format(app, app_version))
         return data
 
+    def update_inference_job(self, app, app_version=-1, wait=True):
+        '''
+        Updates the running inference job identified by an app and an app version to use the current best trials
+        of its train job, without stopping the inference job's predictor. 
+        Workers for the new trials are started, switched in for the old workers once ready, 
+        then the old workers are stopped.
+
+        :param str app: Name of the app
+        :param int app_version: Version of the app (-1 for latest version)
+        :param bool wait: Whether to wait for the workers of the inference job to be switched
+        :returns: Updated inference job as dictionary
+        :rtype: dict[str, any]
+
+        If ``wait`` is ``False``, this method returns before the workers are switched, with an ``operation_id`` 
+        to track the update with :meth:`get_operation`.
+        '''
+        data = self._post('/inference_jobs/{}/{}/update'.format(app, app_version), json={
+            'wait': wait
+        })
+        return data
+
     def stop_inference_job(self, app, app_version=-1):
         '''
         Stops the inference job identified by an app and an app version.
@@ -521,24 +603,72 @@ class Client(object):
         data = self._post('/inference_jobs/{}/{}/stop'.format(app, app_version))
         return data
 
+    ####################################
+    # Operations
+    ####################################
+
+    def get_operation(self, operation_id, timeout=0):
+        '''
+        Gets an operation running in the background on Rafiki, e.g. a deployment of a job's services.
+
+        :param str operation_id: ID of the operation
+        :param float timeout: Max time in seconds to wait for the operation to stop running before returning
+        :returns: Operation as dictionary, with ``status`` as one of :class:`rafiki.constants.OperationStatus`,
+            and its ``result`` or ``error`` once it has stopped running
+        :rtype: dict[str, any]
+        '''
+        data = self._get('/operations/{}'.format(operation_id), params={
+            'timeout': timeout
+        })
+        return data
+
+    def wait_for_operation(self, operation_id, timeout=None):
+        '''
+        Waits for an operation running in the background on Rafiki to complete.
+
+        :param str operation_id: ID of the operation
+        :param float timeout: Max time in seconds to wait for the operation, or ``None`` to wait indefinitely
+        :returns: Result of the operation
+        :rtype: dict[str, any]
+        :raises RafikiOperationError: If the operation errored, or is still running after ``timeout``
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            poll_timeout = OPERATION_POLL_TIMEOUT
+            if deadline is not None:
+                poll_timeout = max(min(poll_timeout, deadline - time.time()), 0)
+
+            operation = self.get_operation(operation_id, timeout=poll_timeout)
+
+            if operation['status'] == OperationStatus.COMPLETED:
+                return operation['result']
+            elif operation['status'] == OperationStatus.ERRORED:
+                raise RafikiOperationError(operation['error'])
+            elif deadline is not None and time.time() >= deadline:
+                raise RafikiOperationError('Timed out after {}s waiting for operation of ID {}' \
+                                        .format(timeout, operation_id))
+
     ####################################
     # Advisors
     ####################################
 
-    def create_advisor(self, knob_config_str, advisor_id=None):
+    def create_advisor(self, knob_config_str, advisor_id=None, early_stopping=None):
         '''
         Creates a Rafiki advisor. If `advisor_id` is passed, it will create an advisor
         of that ID, or do nothing if an advisor of that ID has already been created.
 
         :param str knob_config_str: Serialized knob configuration for advisor session
         :param str advisor_id: ID of advisor to create
+        :param str early_stopping: Rule that the advisor stops trials early with, one of :class:`rafiki.constants.EarlyStoppingType`
         :returns: Created advisor as dictionary
         :rtype: dict[str, any]
         '''
         data = self._post('/advisors', target='advisor',
                             json={
                                 'advisor_id': advisor_id,
-                                'knob_config_str': knob_config_str
+                                'knob_config_str': knob_config_str,
+                                'early_stopping': early_stopping
                             })
         return data
 
@@ -571,6 +701,25 @@ class Client(object):
                         })
         return data
 
+    def report_to_advisor(self, advisor_id, trial_id, score, step):
+        '''
+        Reports an intermediate score of a trial at a step (e.g. an epoch) to the advisor.
+
+        :param str advisor_id: ID of target advisor
+        :param str trial_id: ID of trial
+        :param float score: Intermediate score of the trial, the higher the number, the better
+        :param int step: Step of training that the score is at
+        :returns: ``{ 'should_stop': <whether the trial should stop early> }``
+        :rtype: dict[str, any]
+        '''
+        data = self._post('/advisors/{}/report'.format(advisor_id), 
+                        target='advisor', json={
+                            'trial_id': trial_id,
+                            'score': score,
+                            'step': step
+                        })
+        return data
+
     def delete_advisor(self, advisor_id):
         '''
         Deletes a Rafiki advisor.
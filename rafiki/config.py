@@ -7,13 +7,64 @@ SUPERADMIN_PASSWORD = 'rafiki'
 
 # Admin
 SERVICE_STATUS_WAIT = 1
-TRAIN_WORKER_REPLICAS_PER_SUB_TRAIN_JOB = 2
-INFERENCE_WORKER_REPLICAS_PER_TRIAL = 2
+SERVICE_DEPLOYMENT_THREADS = 8 # Max no. of services deployed or destroyed concurrently
+SERVICE_DEPLOYMENT_TIMEOUT = 3600 # Max time in seconds for services of a job to be running
+INFERENCE_WORKER_READY_TIMEOUT = 600
+WARM_WORKER_POOL_SIZE = 0 # No. of idle worker containers kept per Docker image & dependencies (0 to disable)
+WARM_WORKER_HEARTBEAT_INTERVAL = 5 # Time in seconds between heartbeats of idle warm workers, which are considered dead without them
+TRAIN_WORKER_REPLICAS_PER_SUB_TRAIN_JOB = 2 # Max no. of replicas, if resources of nodes allow
+TRAIN_WORKER_POOL_SIZE = 0 # No. of train workers in each pool shared across train jobs (0 to deploy train workers per sub train job)
+INFERENCE_WORKER_REPLICAS_PER_TRIAL = 2 # Max no. of replicas, if resources of nodes allow, for trials that haven't been profiled
+INFERENCE_WORKER_TARGET_THROUGHPUT = 50 # Queries per second that inference workers of profiled trials are sized to serve
+INFERENCE_WORKER_MAX_TRIALS = 1 # Max no. of trials co-hosted by each inference worker
 INFERENCE_MAX_BEST_TRIALS = 2
+WORKER_DEFAULT_CPUS = 1 # CPU cores reserved for each worker replica if its model doesn't declare resources
+WORKER_DEFAULT_MEMORY = 2048 # Memory in MB reserved for each worker replica if its model doesn't declare resources
+
+ADMIN_OPERATION_THREADS = 8 # Max no. of operations (e.g. deployments of jobs) run concurrently in the background
+ADMIN_OPERATION_MAX_WAIT = 30 # Max time in seconds that a request waits for an operation to stop running
+ADMIN_OPERATION_TTL = 86400 # Time in seconds that stopped operations are kept
+
+# Advisor
+ADVISOR_EARLY_STOPPING_MIN_TRIALS = 3 # Min no. of other trials' scores at a step before trials can be stopped early at the step
+ADVISOR_EARLY_STOPPING_GRACE_STEPS = 1 # Steps before which trials are never stopped early
+ADVISOR_SUCCESSIVE_HALVING_REDUCTION_FACTOR = 3 # Only the top 1/N of trials reaching each rung continue
+
+# Autoscaler
+AUTOSCALER_ENABLED = False # Whether replicas of inference workers are autoscaled
+AUTOSCALER_SLEEP = 10
+AUTOSCALER_SCALE_UP_COOLDOWN = 30
+AUTOSCALER_SCALE_DOWN_COOLDOWN = 120
+AUTOSCALER_MAX_QUEUE_DEPTH_PER_REPLICA = 32
+AUTOSCALER_MAX_PREDICT_LATENCY = 2
+INFERENCE_WORKER_MIN_REPLICAS = 1
+INFERENCE_WORKER_MAX_REPLICAS = 8
+
+# Artifact store
+ARTIFACT_STORE_COMPRESSION_LEVEL = 1 # gzip level that artifacts (e.g. trials' parameters) are stored compressed at (0 to disable)
 
 # Predictor
 PREDICTOR_PREDICT_SLEEP = 0.25
+PREDICTOR_PREDICT_TIMEOUT = 60 # Max time in seconds that the predictor waits for predictions of a query from workers
+PREDICTOR_STOPPED_WORKER_GRACE = 10 # Time in seconds that workers removed from the inference job are still waited for (> drain timeout of workers)
+
+# Train worker
+TRAIN_WORKER_POOL_TASK_WAIT = 5
+TRAIN_WORKER_LOG_FLUSH_SIZE = 100 # Max no. of trial log lines buffered before they are inserted into DB
+TRAIN_WORKER_LOG_FLUSH_INTERVAL = 1 # Max time in seconds that trial log lines are buffered
+TRAIN_WORKER_LOG_MAX_RATE = 50 # Max no. of log lines per second per trial, beyond which lines are dropped
+TRAIN_WORKER_LOG_IGNORED_LOGGERS = ['urllib3', 'requests', 'matplotlib', 'PIL', 'h5py', 'tensorflow', 
+                                    'sqlalchemy', 'docker', 'rafiki.worker'] # Loggers (and their children) whose logs are not trial logs
+TRAIN_WORKER_TRIAL_SLOT_WAIT = 5 # Time in seconds a train worker waits for trials of other replicas before claiming a trial again
+TRAIN_WORKER_TRIAL_HEARTBEAT_INTERVAL = 10 # Time in seconds between updates of a running trial in DB by its train worker
+TRAIN_WORKER_TRIAL_STALE_TIMEOUT = 120 # Time in seconds without updates after which a trial in progress is reclaimed as terminated
+TRAIN_WORKER_PROFILE_BATCH_SIZES = [1, 8, 32] # Batch sizes of queries that trained models' predictions are profiled at
+TRAIN_WORKER_PROFILE_RUNS = 3 # No. of times predictions are timed per batch size
+TRAIN_WORKER_CHECKPOINT_INTERVAL = 600 # Min time in seconds between checkpoints of a trial's model
 
 # Inference worker
 INFERENCE_WORKER_SLEEP = 0.25
-INFERENCE_WORKER_PREDICT_BATCH_SIZE = 32
\ No newline at end of file
+INFERENCE_WORKER_PREDICT_BATCH_SIZE = 32
+INFERENCE_WORKER_DRAIN_TIMEOUT = 5
+INFERENCE_WORKER_MODELS_MEMORY_BUDGET = 1024 * 1024 * 1024 # Max total size of loaded models' parameters in bytes
+INFERENCE_WORKER_HEARTBEAT_INTERVAL = 5 # Time in seconds between heartbeats of replicas, which are considered dead without them
\ No newline at end of file
@@ -1,6 +1,21 @@
 class BudgetType():
     MODEL_TRIAL_COUNT = 'MODEL_TRIAL_COUNT'
     ENABLE_GPU = 'ENABLE_GPU'
+    PARALLEL_TRIALS = 'PARALLEL_TRIALS'
+    EARLY_STOPPING = 'EARLY_STOPPING'
+
+class EarlyStoppingType():
+    MEDIAN = 'MEDIAN'
+    SUCCESSIVE_HALVING = 'SUCCESSIVE_HALVING'
+
+class OutputPolicyType():
+    TOP_K = 'TOP_K'
+    FLOAT16 = 'FLOAT16'
+    ARGMAX = 'ARGMAX'
+
+class ModelResource():
+    CPU = 'CPU'
+    MEMORY = 'MEMORY'
 
 class ModelDependency():
     TENSORFLOW = 'tensorflow'
@@ -48,6 +63,11 @@ class ServiceStatus():
     ERRORED = 'ERRORED'
     STOPPED = 'STOPPED'
 
+class OperationStatus():
+    RUNNING = 'RUNNING'
+    COMPLETED = 'COMPLETED'
+    ERRORED = 'ERRORED'
+
 class ServiceType():
     TRAIN = 'TRAIN'
     PREDICT = 'PREDICT'
@@ -65,6 +85,7 @@ class AdvisorType():
 
 class DatasetType():
     IMAGE_FILES = 'IMAGE_FILES'
+    CORPUS = 'CORPUS'
 
 class TaskType():
     IMAGE_CLASSIFICATION = 'IMAGE_CLASSIFICATION'
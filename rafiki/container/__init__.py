@@ -1,2 +1,4 @@
-from .container_manager import ContainerManager
-from .docker_swarm import DockerSwarmContainerManager, ServiceRequirement, InvalidServiceRequest
\ No newline at end of file
+from .container_manager import ContainerManager, ContainerManagerType
+from .docker_swarm import DockerSwarmContainerManager, ServiceRequirement, InvalidServiceRequest
+from .process import ProcessContainerManager
+from .utils import make_container_manager
\ No newline at end of file
@@ -7,6 +7,10 @@ class InvalidServiceRequest(Exception):
 class ServiceRequirement():
     GPU = 'gpu'
 
+class ContainerManagerType():
+    DOCKER_SWARM = 'DOCKER_SWARM'
+    PROCESS = 'PROCESS'
+
 class ContainerManager(abc.ABC):
     def __init__(self, **kwargs):
         raise NotImplementedError()
@@ -14,7 +18,7 @@ class ContainerManager(abc.ABC):
     @abc.abstractmethod
     def create_service(self, service_name, docker_image, replicas, 
                         args, environment_vars, mounts={}, publish_port=None,
-                        requirements=[]):
+                        requirements=[], reservations=None):
         '''
             Creates a service with a set number of replicas.
 
@@ -31,6 +35,9 @@ class ContainerManager(abc.ABC):
                 publish_port: (<host_port>, <container_port>) - host port (port to be published) to container port 
                     The service should then be reachable at the host port on the host
                 requirements: [ServiceRequirement] - List of requirements for the service
+                reservations: {String: Number} - Resources to reserve for each replica, where
+                    cpus: Number - Number of CPU cores
+                    memory: Int - Memory in bytes
                 
             Returns {String: String} where
                 id: String - ID for the service created
@@ -40,6 +47,48 @@ class ContainerManager(abc.ABC):
         '''
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def build_image(self, image_name, base_docker_image, commands):
+        '''
+            Builds a Docker image by running shell commands on top of a base Docker image,
+            or reuses the image if it has already been built
+
+            Args
+                image_name: String - Name of the Docker image to build
+                base_docker_image: String - Name of the base Docker image
+                commands: String - Shell commands to run to build the image e.g. to install dependencies
+
+            Returns String - Name of the Docker image built, which services should be created with
+        '''
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def has_image(self, image_name):
+        '''
+            Checks whether a Docker image is available to create services with
+
+            Args
+                image_name: String - Name of the Docker image
+
+            Returns Boolean - Whether the Docker image is available
+        '''
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def get_nodes(self):
+        '''
+            Gets the nodes that services can be deployed on, with their resources
+
+            Returns [{String: any}] where each node has
+                id: String - ID of the node
+                cpus: Number - Number of CPU cores of the node
+                memory: Int - Memory of the node in bytes
+                gpus: Int - Number of GPUs of the node
+                reserved_cpus: Number - Number of CPU cores reserved by replicas running on the node
+                reserved_memory: Int - Memory in bytes reserved by replicas running on the node
+        '''
+        raise NotImplementedError()
+
     @abc.abstractmethod
     def update_service(self, service_id, replicas):
         '''
@@ -1,5 +1,6 @@
 import abc
 import os
+import io
 import time
 import docker
 import logging
@@ -8,15 +9,27 @@ from .container_manager import ContainerManager, ServiceRequirement, InvalidServ
 
 logger = logging.getLogger(__name__)
 
+# Time in seconds that the inventory of nodes & their capacities is cached for
+NODES_CACHE_TTL = 60
+
+# Label of images built by the container manager that only exist on the local node
+LOCAL_IMAGE_LABEL = 'rafiki.local_image'
+
 class DockerSwarmContainerManager(ContainerManager):
+    # Inventory of nodes, shared by all instances
+    _nodes = None
+    _nodes_datetime = 0
+
     def __init__(self,
-        network=os.environ.get('DOCKER_NETWORK', 'rafiki')):
+        network=os.environ.get('DOCKER_NETWORK', 'rafiki'),
+        registry=os.environ.get('DOCKER_REGISTRY') or None):
         self._network = network
+        self._registry = registry # Registry that built images are pushed to, for nodes to pull them from
         self._client = docker.from_env()
 
     def create_service(self, service_name, docker_image, replicas, 
                         args, environment_vars, mounts={}, publish_port=None,
-                        requirements=[]):
+                        requirements=[], reservations=None):
             
         env = [
             '{}={}'.format(k, v)
@@ -50,6 +63,17 @@ class DockerSwarmContainerManager(ContainerManager):
                 raise InvalidServiceRequest('There are no nodes with GPU to deploy the service on')
 
             constraints.append('node.labels.gpu!=0')
+
+        # Images that were built without a registry can only be run on the node they were built on
+        if self._is_local_image(docker_image):
+            constraints.append('node.id=={}'.format(self._get_local_node_id()))
+
+        resources = None
+        if reservations is not None:
+            resources = docker.types.Resources(
+                cpu_reservation=int(reservations.get('cpus', 0) * 1e9),
+                mem_reservation=int(reservations.get('memory', 0))
+            )
         
         service = self._client.services.create(
             image=docker_image,
@@ -63,6 +87,7 @@ class DockerSwarmContainerManager(ContainerManager):
                 'Condition': 'on-failure'
             },
             constraints=constraints,
+            resources=resources,
             endpoint_spec={
                 'Ports': ports_list
             },
@@ -85,6 +110,78 @@ class DockerSwarmContainerManager(ContainerManager):
             'port': container_port
         }
 
+    def build_image(self, image_name, base_docker_image, commands):
+        # Without a registry, other nodes of the swarm would be unable to pull the image
+        if self._registry is None:
+            if len(self._client.nodes.list()) > 1:
+                raise InvalidServiceRequest('Images can only be built for a swarm of multiple nodes ' \
+                                            'if a registry is configured with `DOCKER_REGISTRY`')
+        else:
+            image_name = '{}/{}'.format(self._registry, image_name)
+
+        if self.has_image(image_name):
+            logger.info('Reusing existing image "{}"'.format(image_name))
+            return image_name
+
+        # Mark dependencies as installed so that workers skip their install command
+        dockerfile = '\n'.join([
+            'FROM {}'.format(base_docker_image),
+            'RUN {}'.format(commands),
+            'ENV WORKER_INSTALLED 1'
+        ])
+
+        logger.info('Building image "{}" from {}...'.format(image_name, base_docker_image))
+        self._client.images.build(
+            fileobj=io.BytesIO(dockerfile.encode('utf-8')),
+            tag=image_name,
+            labels={ LOCAL_IMAGE_LABEL: '1' if self._registry is None else '0' },
+            rm=True
+        )
+
+        if self._registry is not None:
+            logger.info('Pushing image "{}" to registry...'.format(image_name))
+            (repository, tag) = image_name.rsplit(':', 1)
+            for line in self._client.images.push(repository, tag=tag, stream=True, decode=True):
+                if 'error' in line:
+                    raise Exception('Error while pushing image "{}": {}'.format(image_name, line['error']))
+
+        logger.info('Built image "{}"'.format(image_name))
+        return image_name
+
+    def has_image(self, image_name):
+        try:
+            self._client.images.get(image_name)
+            return True
+        except docker.errors.ImageNotFound:
+            pass
+
+        # Images pushed to the registry can still be pulled by nodes
+        if self._registry is not None and image_name.startswith('{}/'.format(self._registry)):
+            try:
+                self._client.images.get_registry_data(image_name)
+                return True
+            except docker.errors.APIError:
+                pass
+
+        return False
+
+    def get_nodes(self):
+        nodes = [dict(x) for x in self._get_node_inventory()]
+        node_id_to_node = { x['id']: x for x in nodes }
+
+        # Sum up reservations of running tasks on each node
+        tasks = self._client.api.tasks(filters={ 'desired-state': 'running' })
+        for task in tasks:
+            node = node_id_to_node.get(task.get('NodeID'))
+            if node is None:
+                continue
+
+            task_reservations = task.get('Spec', {}).get('Resources', {}).get('Reservations', {})
+            node['reserved_cpus'] += task_reservations.get('NanoCPUs', 0) / 1e9
+            node['reserved_memory'] += task_reservations.get('MemoryBytes', 0)
+
+        return nodes
+
     def update_service(self, service_id, replicas):
         service = self._client.services.get(service_id)
         service.scale(replicas)
@@ -98,12 +195,42 @@ class DockerSwarmContainerManager(ContainerManager):
 
         logger.info('Deleted service of ID {}'.format(service_id))
                 
+    def _is_local_image(self, docker_image):
+        try:
+            image = self._client.images.get(docker_image)
+        except docker.errors.ImageNotFound:
+            return False
+
+        labels = image.attrs.get('Config', {}).get('Labels') or {}
+        return labels.get(LOCAL_IMAGE_LABEL) == '1'
+
+    def _get_local_node_id(self):
+        return self._client.info()['Swarm']['NodeID']
+
     def _if_any_node_has_gpu(self):
-        nodes = self._client.nodes.list()
-        has_gpu = False
-        for node in nodes:
-            gpu = int(node.attrs.get('Spec', {}).get('Labels', {}).get('gpu', 0))
-            if gpu > 0:
-                has_gpu = True
-
-        return has_gpu
\ No newline at end of file
+        return any([x['gpus'] > 0 for x in self._get_node_inventory()])
+
+    # Returns capacities of ready nodes, refreshing them periodically
+    def _get_node_inventory(self):
+        cls = DockerSwarmContainerManager
+        if cls._nodes is None or time.time() - cls._nodes_datetime > NODES_CACHE_TTL:
+            nodes = []
+            for node in self._client.nodes.list():
+                if node.attrs.get('Status', {}).get('State') != 'ready' or \
+                        node.attrs.get('Spec', {}).get('Availability') != 'active':
+                    continue
+
+                resources = node.attrs.get('Description', {}).get('Resources', {})
+                nodes.append({
+                    'id': node.id,
+                    'cpus': resources.get('NanoCPUs', 0) / 1e9,
+                    'memory': resources.get('MemoryBytes', 0),
+                    'gpus': int(node.attrs.get('Spec', {}).get('Labels', {}).get('gpu', 0)),
+                    'reserved_cpus': 0,
+                    'reserved_memory': 0
+                })
+
+            cls._nodes = nodes
+            cls._nodes_datetime = time.time()
+
+        return cls._nodes
\ No newline at end of file
@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import uuid
+import signal
+import logging
+import threading
+import subprocess
+
+from rafiki.constants import ServiceType
+
+from .container_manager import ContainerManager, ServiceRequirement, InvalidServiceRequest
+
+logger = logging.getLogger(__name__)
+
+PREDICTOR_SCRIPT = 'scripts/start_predictor.py'
+WORKER_SCRIPT = 'scripts/start_worker.py'
+
+# Environment variable of the port that the predictor listens on
+PREDICTOR_PORT_ENVIRONMENT_VAR = 'PREDICTOR_PORT'
+
+# Interval in seconds between checks for exited replicas
+MONITOR_SLEEP = 1
+
+# Time in seconds that replicas are given to exit after being signalled to stop
+STOP_TIMEOUT = 10
+
+class ProcessContainerManager(ContainerManager):
+    '''
+    Runs each replica of a service as a local process of Rafiki's start-up script for the service,
+    instead of as a container, for single-node deployments.
+
+    Docker images are ignored - services run on the local Python environment, which should have
+    Rafiki's & models' dependencies installed. Processes share the host's network & file system,
+    so container ports are published as-is & mounted container directories map to host directories.
+
+    Processes of services are tracked in memory & shared by all instances in the process.
+    '''
+    _services = {} # { <service_id>: <service> }
+    _lock = threading.RLock()
+    _monitor = None
+
+    def __init__(self, workdir=os.environ.get('RAFIKI_WORKDIR_PATH', os.getcwd())):
+        self._workdir = workdir
+
+        # Start monitoring replicas of services to restart them on failure
+        with self._lock:
+            if ProcessContainerManager._monitor is None:
+                ProcessContainerManager._monitor = threading.Thread(target=self._monitor_services, daemon=True)
+                ProcessContainerManager._monitor.start()
+
+    def create_service(self, service_name, docker_image, replicas,
+                        args, environment_vars, mounts={}, publish_port=None,
+                        requirements=[], reservations=None):
+
+        if ServiceRequirement.GPU in requirements:
+            raise InvalidServiceRequest('GPUs are not supported for services run as local processes')
+
+        script = PREDICTOR_SCRIPT \
+            if environment_vars.get('RAFIKI_SERVICE_TYPE') == ServiceType.PREDICT else WORKER_SCRIPT
+        env = {
+            **os.environ,
+            **{ k: str(v) for (k, v) in self._map_mounts(environment_vars, mounts).items() },
+            'PYTHONPATH': self._workdir,
+            'WORKER_INSTALLED': '1' # Dependencies are expected to be installed locally
+        }
+
+        # Only 1 process can listen on a port
+        port = None
+        if publish_port is not None:
+            if replicas > 1:
+                raise InvalidServiceRequest('Services with published ports can only have 1 replica')
+            port = int(publish_port[0])
+            env = self._publish_port(env, publish_port)
+
+        service_id = str(uuid.uuid4())
+        service = {
+            'name': service_name,
+            'command': [sys.executable, script, *args],
+            'env': env,
+            'reservations': reservations or {},
+            'replicas': [] # Processes of replicas
+        }
+
+        with self._lock:
+            self._services[service_id] = service
+            self._scale_service(service, replicas)
+
+        logger.info('Created service of ID {} (name: "{}") of {} x {} replicas' \
+            .format(service_id, service_name, script, replicas))
+
+        return {
+            'id': service_id,
+            'hostname': 'localhost',
+            'port': port
+        }
+
+    def build_image(self, image_name, base_docker_image, commands):
+        # Nothing to build as dependencies are expected to be installed locally
+        return base_docker_image
+
+    # Docker images are not used to run services
+    def has_image(self, image_name):
+        return True
+
+    # The local machine is the only node, whose resources are reserved by replicas of services only nominally
+    def get_nodes(self):
+        with self._lock:
+            reserved_cpus = 0
+            reserved_memory = 0
+            for service in self._services.values():
+                replicas = len([x for x in service['replicas'] if x.poll() is None])
+                reserved_cpus += service['reservations'].get('cpus', 0) * replicas
+                reserved_memory += service['reservations'].get('memory', 0) * replicas
+
+        return [{
+            'id': 'localhost',
+            'cpus': os.cpu_count(),
+            'memory': os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'),
+            'gpus': 0,
+            'reserved_cpus': reserved_cpus,
+            'reserved_memory': reserved_memory
+        }]
+
+    def update_service(self, service_id, replicas):
+        with self._lock:
+            service = self._services[service_id]
+            self._scale_service(service, replicas)
+
+        logger.info('Updated service of ID {} to {} replicas' \
+            .format(service_id, replicas))
+
+    def destroy_service(self, service_id):
+        with self._lock:
+            service = self._services.pop(service_id)
+            processes = service['replicas']
+            service['replicas'] = []
+
+        self._stop_processes(processes)
+
+        logger.info('Deleted service of ID {}'.format(service_id))
+
+    def _scale_service(self, service, replicas):
+        processes = service['replicas']
+        while len(processes) < replicas:
+            processes.append(self._start_process(service))
+
+        if len(processes) > replicas:
+            service['replicas'] = processes[:replicas]
+            threading.Thread(target=self._stop_processes, args=(processes[replicas:],), daemon=True).start()
+
+    def _start_process(self, service):
+        return subprocess.Popen(service['command'], env=service['env'], cwd=self._workdir)
+
+    # Signals processes to stop, then kills those that haven't exited after a timeout
+    def _stop_processes(self, processes):
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+
+        deadline = time.time() + STOP_TIMEOUT
+        for process in processes:
+            try:
+                process.wait(timeout=max(deadline - time.time(), 0))
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    # Restarts replicas that exit with a non-zero code, but not replicas that exit with code 0
+    def _monitor_services(self):
+        while True:
+            time.sleep(MONITOR_SLEEP)
+            with self._lock:
+                for (service_id, service) in self._services.items():
+                    processes = service['replicas']
+                    for (i, process) in enumerate(processes):
+                        exit_code = process.poll()
+                        if exit_code is not None and exit_code != 0:
+                            logger.warning('Restarting replica of service of ID {} that exited with code {}' \
+                                .format(service_id, exit_code))
+                            processes[i] = self._start_process(service)
+
+    # As processes share the host's network, services listen on their published ports instead
+    # Makes the service listen on the host port instead of the container port,
+    # by substituting only the environment variable of the service's port
+    def _publish_port(self, environment_vars, publish_port):
+        (host_port, container_port) = publish_port
+        return { **environment_vars, PREDICTOR_PORT_ENVIRONMENT_VAR: str(host_port) }
+
+    # Maps values of environment variables that are paths in mounted container directories to host directories
+    def _map_mounts(self, environment_vars, mounts):
+        mapped_environment_vars = {}
+        for (k, v) in environment_vars.items():
+            for (host_dir, container_dir) in mounts.items():
+                if isinstance(v, str) and (v == container_dir or v.startswith(container_dir.rstrip('/') + '/')):
+                    v = host_dir + v[len(container_dir):]
+                    break
+            mapped_environment_vars[k] = v
+
+        return mapped_environment_vars
@@ -0,0 +1,13 @@
+import os
+
+from .container_manager import ContainerManagerType
+from .docker_swarm import DockerSwarmContainerManager
+from .process import ProcessContainerManager
+
+# Makes the container manager of the type configured by the `CONTAINER_MANAGER` environment variable
+def make_container_manager():
+    container_manager_type = os.environ.get('CONTAINER_MANAGER', ContainerManagerType.DOCKER_SWARM)
+    if container_manager_type == ContainerManagerType.PROCESS:
+        return ProcessContainerManager()
+
+    return DockerSwarmContainerManager()
@@ -1,6 +1,7 @@
 import datetime
 import os
-from sqlalchemy import create_engine, distinct
+import select
+from sqlalchemy import create_engine, distinct, text, func
 from sqlalchemy.orm import sessionmaker
 
 from rafiki.constants import TrainJobStatus, \
@@ -8,7 +9,10 @@ from rafiki.constants import TrainJobStatus, \
 
 from .schema import Base, TrainJob, SubTrainJob, TrainJobWorker, \
     InferenceJob, Trial, Model, User, Service, InferenceJobWorker, \
-    TrialLog
+    TrialLog, ServiceScalingEvent
+
+# Postgres channel that changes in status of services are notified on, with service IDs as payloads
+SERVICE_STATUS_CHANNEL = 'service_status'
 
 class Database(object):
     def __init__(self, 
@@ -165,10 +169,11 @@ class Database(object):
     # Inference Jobs
     ####################################
     
-    def create_inference_job(self, user_id, train_job_id):
+    def create_inference_job(self, user_id, train_job_id, output_policy=None):
         inference_job = InferenceJob(
             user_id=user_id,
-            train_job_id=train_job_id
+            train_job_id=train_job_id,
+            output_policy=output_policy
         )
         self._session.add(inference_job)
         return inference_job
@@ -234,24 +239,35 @@ class Database(object):
     # Inference Job Workers
     ####################################
 
-    def create_inference_job_worker(self, service_id, inference_job_id, trial_id):
+    def create_inference_job_worker(self, service_id, inference_job_id, trial_id, is_standby=False):
         inference_job_worker = InferenceJobWorker(
             inference_job_id=inference_job_id,
             trial_id=trial_id,
-            service_id=service_id
+            service_id=service_id,
+            is_standby=is_standby
         )
         self._session.add(inference_job_worker)
         return inference_job_worker
 
-    def get_inference_job_worker(self, service_id):
-        inference_job_worker = self._session.query(InferenceJobWorker).get(service_id)
-        return inference_job_worker
+    # An inference job's worker service can host multiple trials, with a worker for each trial
+    def get_inference_job_workers_of_service(self, service_id):
+        workers = self._session.query(InferenceJobWorker) \
+            .filter(InferenceJobWorker.service_id == service_id).all()
+        return workers
 
     def get_workers_of_inference_job(self, inference_job_id):
         workers = self._session.query(InferenceJobWorker) \
             .filter(InferenceJobWorker.inference_job_id == inference_job_id).all()
         return workers
 
+    def mark_inference_job_worker_as_active(self, inference_job_worker):
+        inference_job_worker.is_standby = False
+        self._session.add(inference_job_worker)
+        return inference_job_worker
+
+    def delete_inference_job_worker(self, inference_job_worker):
+        self._session.delete(inference_job_worker)
+
     ####################################
     # Services
     ####################################
@@ -277,23 +293,52 @@ class Database(object):
         service.port = port
         service.ext_hostname = ext_hostname
         service.ext_port = ext_port
-        service.status = ServiceStatus.DEPLOYING
+
+        # Service might have already started running
+        if service.status == ServiceStatus.STARTED:
+            service.status = ServiceStatus.DEPLOYING
+
         self._session.add(service)
 
     def mark_service_as_running(self, service):
         service.status = ServiceStatus.RUNNING
         service.datetime_stopped = None
         self._session.add(service)
+        self._notify_service_status(service)
 
     def mark_service_as_errored(self, service):
         service.status = ServiceStatus.ERRORED
         service.datetime_stopped = datetime.datetime.utcnow()
         self._session.add(service)
+        self._notify_service_status(service)
 
     def mark_service_as_stopped(self, service):
         service.status = ServiceStatus.STOPPED
         service.datetime_stopped = datetime.datetime.utcnow()
         self._session.add(service)
+        self._notify_service_status(service)
+
+    # Starts listening for changes in status of services, returning a `ServiceStatusListener`
+    # Changes are only notified after the transactions that made them are committed
+    def listen_for_service_status(self):
+        return ServiceStatusListener(self._engine.raw_connection())
+
+    def update_service(self, service, replicas):
+        service.replicas = replicas
+        self._session.add(service)
+        return service
+
+    def create_service_scaling_event(self, service_id, replicas_from, replicas_to, 
+                                    queue_depth, predict_latency):
+        event = ServiceScalingEvent(
+            service_id=service_id,
+            replicas_from=replicas_from,
+            replicas_to=replicas_to,
+            queue_depth=queue_depth,
+            predict_latency=predict_latency
+        )
+        self._session.add(event)
+        return event
 
     def get_service(self, service_id):
         service = self._session.query(Service).get(service_id)
@@ -315,7 +360,7 @@ class Database(object):
     ####################################
 
     def create_model(self, user_id, name, task, model_file_bytes, 
-                    model_class, docker_image, dependencies, access_right):
+                    model_class, docker_image, dependencies, access_right, resources=None):
         model = Model(
             user_id=user_id,
             name=name,
@@ -324,6 +369,7 @@ class Database(object):
             model_class=model_class,
             docker_image=docker_image,
             dependencies=dependencies,
+            resources=resources,
             access_right=access_right
         )
         self._session.add(model)
@@ -347,6 +393,10 @@ class Database(object):
         models = public_models + private_models
         return models
 
+    def get_all_models(self):
+        models = self._session.query(Model).all()
+        return models
+
     def get_model_by_name(self, name):
         model = self._session.query(Model) \
             .filter(Model.name == name).first()
@@ -357,6 +407,14 @@ class Database(object):
         model = self._session.query(Model).get(id)
         return model
 
+    # Returns the bytes of the model's file, or `None` if the model doesn't exist
+    def get_model_file(self, id):
+        model_file_bytes = self._session.query(Model.model_file_bytes) \
+            .filter(Model.id == id) \
+            .scalar()
+
+        return model_file_bytes
+
     ####################################
     # Trials
     ####################################
@@ -369,6 +427,44 @@ class Database(object):
         self._session.add(trial)
         return trial
 
+    # Creates a trial for the sub train job only if it has less than `max_trials` trials that are
+    # in progress or finished, returning the trial, or `None` if all trial slots have been claimed
+    # Concurrent claims for the sub train job wait for each other until the session is committed
+    # Trials in progress that haven't been updated for `stale_timeout` seconds are first reclaimed (see `_lock_trial_slot()`)
+    def create_trial_within_budget(self, sub_train_job_id, model_id, max_trials, stale_timeout=None):
+        if not self._lock_trial_slot(sub_train_job_id, max_trials, stale_timeout):
+            return None
+
+        return self.create_trial(sub_train_job_id, model_id)
+
+    # Like `create_trial_within_budget()`, but instead claims a terminated trial of the sub train job that 
+    # has a checkpoint, marking it as started again, or returns `None` if there is no such trial
+    def resume_trial_within_budget(self, sub_train_job_id, max_trials, stale_timeout=None):
+        if not self._lock_trial_slot(sub_train_job_id, max_trials, stale_timeout):
+            return None
+
+        trial = self._session.query(Trial) \
+            .filter(Trial.sub_train_job_id == sub_train_job_id) \
+            .filter(Trial.status == TrialStatus.TERMINATED) \
+            .filter(Trial.checkpoint_artifact_id.isnot(None)) \
+            .order_by(Trial.datetime_started.asc()) \
+            .first()
+
+        if trial is None:
+            return None
+
+        trial.status = TrialStatus.STARTED
+        trial.datetime_stopped = None
+        trial.datetime_updated = datetime.datetime.utcnow()
+        self._session.add(trial)
+        return trial
+
+    # Records that the trial's worker is still running the trial
+    def update_trial_heartbeat(self, id):
+        self._session.query(Trial) \
+            .filter(Trial.id == id) \
+            .update({ Trial.datetime_updated: datetime.datetime.utcnow() }, synchronize_session=False)
+
     def get_trial(self, id):
         trial = self._session.query(Trial) \
             .join(SubTrainJob, Trial.sub_train_job_id == SubTrainJob.id) \
@@ -377,6 +473,15 @@ class Database(object):
 
         return trial
 
+    # Returns the trial's pickled model parameters stored in the DB, or `None` if the trial doesn't exist or has none
+    # Parameters of trials with `parameters_artifact_id` are instead in the artifact store
+    def get_trial_parameters(self, id):
+        parameters = self._session.query(Trial.parameters) \
+            .filter(Trial.id == id) \
+            .scalar()
+
+        return parameters
+
     def get_trial_logs(self, id):
         trial_logs = self._session.query(TrialLog) \
             .filter(TrialLog.trial_id == id) \
@@ -401,6 +506,23 @@ class Database(object):
 
         return trials
 
+    # Returns the no. of trials whose parameters or checkpoint is the artifact
+    def count_trials_with_artifact(self, artifact_id):
+        count = self._session.query(func.count(Trial.id)) \
+            .filter((Trial.parameters_artifact_id == artifact_id) | (Trial.checkpoint_artifact_id == artifact_id)) \
+            .scalar()
+
+        return count
+
+    def count_trials_of_sub_train_job(self, sub_train_job_id, statuses=None):
+        query = self._session.query(func.count(Trial.id)) \
+            .filter(Trial.sub_train_job_id == sub_train_job_id)
+
+        if statuses is not None:
+            query = query.filter(Trial.status.in_(statuses))
+
+        return query.scalar()
+
     def get_trials_of_app(self, app):
         trials = self._session.query(Trial) \
             .join(SubTrainJob, Trial.sub_train_job_id == SubTrainJob.id) \
@@ -419,14 +541,23 @@ class Database(object):
     def mark_trial_as_errored(self, trial):
         trial.status = TrialStatus.ERRORED
         trial.datetime_stopped = datetime.datetime.utcnow()
+        trial.checkpoint_artifact_id = None # Only trials that are terminated are resumed from their checkpoints
         self._session.add(trial)
         return trial
 
-    def mark_trial_as_complete(self, trial, score, parameters):
+    def mark_trial_as_complete(self, trial, score, parameters_artifact_id, profile=None, metrics=None):
         trial.status = TrialStatus.COMPLETED
         trial.score = score
         trial.datetime_stopped = datetime.datetime.utcnow()
-        trial.parameters = parameters
+        trial.parameters_artifact_id = parameters_artifact_id
+        trial.profile = profile
+        trial.metrics = metrics
+        trial.checkpoint_artifact_id = None
+        self._session.add(trial)
+        return trial
+
+    def mark_trial_as_checkpointed(self, trial, checkpoint_artifact_id):
+        trial.checkpoint_artifact_id = checkpoint_artifact_id
         self._session.add(trial)
         return trial
 
@@ -435,12 +566,49 @@ class Database(object):
         self._session.add(trial_log)
         return trial_log
 
+    # Bulk-inserts logs of trials, given as [(<trial_id>, <datetime>, <line>, <level>)]
+    def add_trial_logs(self, logs):
+        trial_logs = [
+            TrialLog(trial_id=trial_id, datetime=datetime, line=line, level=level)
+            for (trial_id, datetime, line, level) in logs
+        ]
+        self._session.bulk_save_objects(trial_logs)
+        return trial_logs
+
     def mark_trial_as_terminated(self, trial):
         trial.status = TrialStatus.TERMINATED
         trial.datetime_stopped = datetime.datetime.utcnow()
         self._session.add(trial)
         return trial
 
+    # Locks the trial slots of the sub train job until the session is committed, then returns whether 
+    # it has less than `max_trials` trials that are in progress or finished
+    # Trials in progress that haven't been updated for `stale_timeout` seconds (e.g. as their workers were killed
+    # without being able to mark them as terminated) are first marked as terminated, releasing their slots
+    def _lock_trial_slot(self, sub_train_job_id, max_trials, stale_timeout=None):
+        self._session.query(SubTrainJob) \
+            .filter(SubTrainJob.id == sub_train_job_id) \
+            .with_for_update() \
+            .one()
+
+        if stale_timeout is not None:
+            stale_datetime = datetime.datetime.utcnow() - datetime.timedelta(seconds=stale_timeout)
+            stale_trials = self._session.query(Trial) \
+                .filter(Trial.sub_train_job_id == sub_train_job_id) \
+                .filter(Trial.status.in_([TrialStatus.STARTED, TrialStatus.RUNNING])) \
+                .filter(func.coalesce(Trial.datetime_updated, Trial.datetime_started) < stale_datetime) \
+                .all()
+
+            for trial in stale_trials:
+                self.mark_trial_as_terminated(trial)
+
+            self._session.flush()
+
+        trial_count = self.count_trials_of_sub_train_job(sub_train_job_id, statuses=[
+            TrialStatus.STARTED, TrialStatus.RUNNING, TrialStatus.COMPLETED, TrialStatus.ERRORED
+        ])
+        return trial_count < max_trials
+
     ####################################
     # Others
     ####################################
@@ -466,11 +634,22 @@ class Database(object):
             self._session.commit()
             self._session.close()
             self._session = None
+
+    # Closes pooled connections to the database, e.g. before forking, so that child processes don't share them
+    # New connections are opened on the next session
+    def dispose(self):
+        self._engine.dispose()
             
     def clear_all_data(self):
         for table in reversed(Base.metadata.sorted_tables):
             self._session.execute(table.delete())
 
+    def _notify_service_status(self, service):
+        self._session.execute(text('SELECT pg_notify(:channel, :payload)'), {
+            'channel': SERVICE_STATUS_CHANNEL, 
+            'payload': service.id
+        })
+
     def _make_connection_url(self, host, port, db, user, password):
         return 'postgresql://{}:{}@{}:{}/{}'.format(
             user, password, host, port, db
@@ -485,3 +664,39 @@ class Database(object):
     def _filter_private_models(self, models, user_id):
         return list(filter(lambda model: model.access_right == ModelAccessRight.PRIVATE and \
                             model.user_id == user_id, models))
+
+class ServiceStatusListener(object):
+    '''
+    Listens for changes in status of services on its own DB connection, outside of any session.
+    '''
+    def __init__(self, connection):
+        self._connection = connection
+        self._connection.set_session(autocommit=True)
+        cursor = self._connection.cursor()
+        cursor.execute('LISTEN {};'.format(SERVICE_STATUS_CHANNEL))
+        cursor.close()
+
+    # Blocks until there are changes in status of services, or until the timeout (in seconds)
+    # Returns IDs of services whose statuses have changed, which is empty on timeout
+    def wait(self, timeout):
+        dbapi_connection = self._connection.connection
+        if len(dbapi_connection.notifies) == 0:
+            select.select([dbapi_connection], [], [], max(timeout, 0))
+            dbapi_connection.poll()
+
+        service_ids = set([x.payload for x in dbapi_connection.notifies])
+        dbapi_connection.notifies.clear()
+        return service_ids
+
+    def close(self):
+        cursor = self._connection.cursor()
+        cursor.execute('UNLISTEN {};'.format(SERVICE_STATUS_CHANNEL))
+        cursor.close()
+        self._connection.set_session(autocommit=False)
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
@@ -1,6 +1,7 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, String, Float, ForeignKey, Integer, Binary, DateTime
+from sqlalchemy import Column, String, Float, ForeignKey, Integer, Binary, DateTime, Boolean
 from sqlalchemy.dialects.postgresql import JSON, ARRAY
+from sqlalchemy.orm import deferred
 import uuid
 import datetime
 
@@ -24,6 +25,7 @@ class InferenceJob(Base):
     status = Column(String, nullable=False, default=InferenceJobStatus.STARTED)
     user_id = Column(String, ForeignKey('user.id'), nullable=False)
     predictor_service_id = Column(String, ForeignKey('service.id'))
+    output_policy = Column(JSON, default=None)
     datetime_stopped = Column(DateTime, default=None)
 
 class InferenceJobWorker(Base):
@@ -31,7 +33,8 @@ class InferenceJobWorker(Base):
 
     service_id = Column(String, ForeignKey('service.id'), primary_key=True)
     inference_job_id = Column(String, ForeignKey('inference_job.id'))
-    trial_id = Column(String, ForeignKey('trial.id'), nullable=False)
+    trial_id = Column(String, ForeignKey('trial.id'), primary_key=True)
+    is_standby = Column(Boolean, nullable=False, default=False)
 
 class Model(Base):
     __tablename__ = 'model'
@@ -40,11 +43,12 @@ class Model(Base):
     datetime_created = Column(DateTime, nullable=False, default=generate_datetime)
     name = Column(String, unique=True, nullable=False)
     task = Column(String, nullable=False)
-    model_file_bytes = Column(Binary, nullable=False)
+    model_file_bytes = deferred(Column(Binary, nullable=False)) # Only loaded on access, or with `Database.get_model_file()`
     model_class = Column(String, nullable=False)
     user_id = Column(String, ForeignKey('user.id'), nullable=False)
     docker_image = Column(String, nullable=False)
     dependencies = Column(JSON, nullable=False)
+    resources = Column(JSON, default=None)
     access_right = Column(String, nullable=False, default=ModelAccessRight.PRIVATE)
 
 class Service(Base):
@@ -66,6 +70,17 @@ class Service(Base):
     container_service_id = Column(String)
     requirements = Column(ARRAY(String))
 
+class ServiceScalingEvent(Base):
+    __tablename__ = 'service_scaling_event'
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    datetime = Column(DateTime, nullable=False, default=generate_datetime)
+    service_id = Column(String, ForeignKey('service.id'), nullable=False, index=True)
+    replicas_from = Column(Integer, nullable=False)
+    replicas_to = Column(Integer, nullable=False)
+    queue_depth = Column(Integer)
+    predict_latency = Column(Float)
+
 class TrainJob(Base):
     __tablename__ = 'train_job'
 
@@ -106,8 +121,13 @@ class Trial(Base):
     status = Column(String, nullable=False, default=TrialStatus.STARTED)
     knobs = Column(JSON, default=None)
     score = Column(Float, default=0)
-    parameters = Column(Binary, default=None)
+    parameters = deferred(Column(Binary, default=None)) # Only loaded on access, or with `Database.get_trial_parameters()`
+    parameters_artifact_id = Column(String, default=None) # ID of pickled parameters in artifact store, in place of `parameters`
+    profile = Column(JSON, default=None)
+    checkpoint_artifact_id = Column(String, default=None) # ID of pickled latest checkpoint of model in artifact store
+    metrics = Column(JSON, default=None) # Wall time, CPU time & peak memory of each phase of trial, and size of its parameters
     datetime_stopped = Column(DateTime, default=None)
+    datetime_updated = Column(DateTime, default=generate_datetime) # Last time that the trial's worker was known to be running it
 
 class TrialLog(Base):
     __tablename__ = 'trial_log'
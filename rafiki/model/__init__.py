@@ -1,5 +1,5 @@
 from .model import BaseModel, test_model_class, load_model_class, \
-    parse_model_install_command, InvalidModelClassException, InvalidModelParamsException
+    parse_model_install_command, make_wheelhouse_install_command, InvalidModelClassException, InvalidModelParamsException
 from .knob import BaseKnob, CategoricalKnob, IntegerKnob, FloatKnob, FixedKnob, \
                     serialize_knob_config, deserialize_knob_config
 from .dataset import dataset_utils, ModelDatasetUtils, CorpusDataset, ImageFilesDataset
@@ -13,11 +13,24 @@ import io
 import abc
 import tempfile
 import csv
+import json
+import shutil
+import hashlib
+import atexit
+import contextlib
 
 from rafiki.constants import DatasetType
 
+from .phase import phase_recorder
+
 logger = logging.getLogger(__name__)
 
+# Name of folder in the data folder that decoded datasets are cached in, shared by workers on the node
+DATASET_CACHE_DIR_NAME = '.dataset_cache'
+
+# Default max total size in bytes of decoded datasets in the cache, beyond which least recently used ones are evicted
+DATASET_CACHE_MAX_SIZE = 20 * 1024 * 1024 * 1024
+
 class InvalidDatasetProtocolException(Exception): pass 
 class InvalidDatasetTypeException(Exception): pass 
 class InvalidDatasetFormatException(Exception): pass 
@@ -38,12 +51,34 @@ class ModelDatasetUtils():
             ...
             dataset_utils.load_dataset_of_image_files(dataset_uri)
             ...
+
+    Decoded datasets are cached on disk (in the data folder shared by workers, or at ``DATASET_CACHE_PATH``),
+    keyed by their URIs, the versions of their files & the parameters they are loaded with,
+    so that later loads of the same dataset are memory-mapped instead of downloaded & decoded again.
+    A file over HTTP/HTTPS is versioned by its ETag or size from the server, and a local file by its checksum.
+    Least recently used datasets are evicted once the cache exceeds ``DATASET_CACHE_MAX_SIZE`` bytes.
     '''   
     
-    def __init__(self):
+    def __init__(self, cache_dir=None, cache_max_size=None):
         # Caches downloaded datasets
         self._dataset_uri_to_path = {}
 
+        # Caches checksums of dataset files
+        self._dataset_file_to_checksum = {} # { (<path>, <size>, <mtime>): <checksum> }
+
+        # Decoded datasets are persisted in the data folder shared with containers, if available
+        if cache_dir is None:
+            cache_dir = os.environ.get('DATASET_CACHE_PATH')
+        if cache_dir is None and 'DATA_DOCKER_WORKDIR_PATH' in os.environ:
+            cache_dir = os.path.join(os.environ['DATA_DOCKER_WORKDIR_PATH'], DATASET_CACHE_DIR_NAME)
+        if cache_max_size is None:
+            cache_max_size = int(os.environ.get('DATASET_CACHE_MAX_SIZE', DATASET_CACHE_MAX_SIZE))
+        self._cache_dir = cache_dir
+        self._cache_max_size = cache_max_size
+
+        # Downloaded datasets are deleted on exit
+        atexit.register(self._delete_downloaded_datasets)
+
     def load_dataset_of_corpus(self, dataset_uri, tags=['tag'], split_by='\\n'):
         '''
             Loads dataset with type `CORPUS`.
@@ -51,8 +86,9 @@ class ModelDatasetUtils():
             :param str dataset_uri: URI of the dataset file
             :returns: An instance of ``CorpusDataset``.
         '''
-        dataset_path = self.download_dataset_from_uri(dataset_uri)
-        return CorpusDataset(dataset_path, tags, split_by)
+        with self._load_dataset(dataset_uri, DatasetType.CORPUS, tags=tags, split_by=split_by) \
+                as (dataset_path, cache_path):
+            return CorpusDataset(dataset_path, tags, split_by, cache_path=cache_path)
 
     def load_dataset_of_image_files(self, dataset_uri, image_size=None):
         '''
@@ -62,8 +98,9 @@ class ModelDatasetUtils():
             :param str image_size: dimensions to resize all images to (None for no resizing)
             :returns: An instance of ``ImageFilesDataset``.
         '''
-        dataset_path = self.download_dataset_from_uri(dataset_uri)
-        return ImageFilesDataset(dataset_path, image_size)
+        with self._load_dataset(dataset_uri, DatasetType.IMAGE_FILES, image_size=image_size) \
+                as (dataset_path, cache_path):
+            return ImageFilesDataset(dataset_path, image_size, cache_path=cache_path)
 
     def resize_as_images(self, images, image_size):
         '''
@@ -87,6 +124,71 @@ class ModelDatasetUtils():
         if dataset_uri in self._dataset_uri_to_path:
             return self._dataset_uri_to_path[dataset_uri]
 
+        dataset_path = self._download_dataset(dataset_uri)
+
+        # Cache dataset path to possibly prevent re-downloading
+        self._dataset_uri_to_path[dataset_uri] = dataset_path
+        return dataset_path
+
+    # Yields (<path of dataset file>, <cache path of decoded dataset>)
+    # A dataset over HTTP/HTTPS that is already cached isn't downloaded, in which case its path is `None`,
+    # and one that is downloaded is deleted once the dataset is loaded
+    @contextlib.contextmanager
+    def _load_dataset(self, dataset_uri, dataset_type, **params):
+        if self._is_remote_dataset(dataset_uri) and dataset_uri not in self._dataset_uri_to_path:
+            version = self._get_remote_dataset_version(dataset_uri)
+            cache_path = self._get_dataset_cache_path(dataset_uri, version, dataset_type, **params) \
+                        if version is not None else None
+            if cache_path is not None and os.path.exists(cache_path):
+                self._touch_cache(cache_path)
+                yield (None, cache_path)
+                return
+
+            with phase_recorder.phase('download'):
+                dataset_path = self._download_dataset(dataset_uri)
+            try:
+                if version is None:
+                    version = self._get_dataset_file_checksum(dataset_path)
+                    cache_path = self._get_dataset_cache_path(dataset_uri, version, dataset_type, **params)
+                yield (dataset_path, cache_path)
+            finally:
+                os.remove(dataset_path)
+        else:
+            with phase_recorder.phase('download'):
+                dataset_path = self.download_dataset_from_uri(dataset_uri)
+            version = self._get_dataset_file_checksum(dataset_path)
+            cache_path = self._get_dataset_cache_path(dataset_uri, version, dataset_type, **params)
+            yield (dataset_path, cache_path)
+
+        if cache_path is not None:
+            self._touch_cache(cache_path)
+            self._evict_from_cache(cache_path)
+
+    def _is_remote_dataset(self, dataset_uri):
+        protocol = '{uri.scheme}'.format(uri=urlparse(dataset_uri)).lower().strip()
+        return protocol == 'http' or protocol == 'https'
+
+    # Returns the ETag or size of the file at the HTTP/HTTPS URI from the server, 
+    # or `None` if the server returns neither
+    def _get_remote_dataset_version(self, dataset_uri):
+        try:
+            r = requests.head(dataset_uri, allow_redirects=True)
+            r.raise_for_status()
+        except Exception:
+            logger.warning('Error while getting headers of dataset at "{}":'.format(dataset_uri))
+            logger.warning(traceback.format_exc())
+            return None
+
+        etag = r.headers.get('etag')
+        content_length = r.headers.get('content-length')
+        if etag is None and content_length is None:
+            return None
+
+        return json.dumps({ 'etag': etag, 'content_length': content_length }, sort_keys=True)
+
+    # Returns the path of the dataset file in the local filesystem, downloading it to a temporary file if it is 
+    # over HTTP/HTTPS
+    def _download_dataset(self, dataset_uri):
         dataset_path = None
 
         parsed_uri = urlparse(dataset_uri)
@@ -115,10 +217,80 @@ class ModelDatasetUtils():
         else:
             raise InvalidDatasetProtocolException()
 
-        # Cache dataset path to possibly prevent re-downloading
-        self._dataset_uri_to_path[dataset_uri] = dataset_path
         return dataset_path
 
+    def _delete_downloaded_datasets(self):
+        for (dataset_uri, dataset_path) in self._dataset_uri_to_path.items():
+            if self._is_remote_dataset(dataset_uri) and os.path.exists(dataset_path):
+                os.remove(dataset_path)
+        self._dataset_uri_to_path = {}
+
+    # Returns the path that the decoded dataset is cached at, keyed by the dataset's URI, 
+    # the version of its file & the parameters it is loaded with, or `None` if caching is disabled
+    def _get_dataset_cache_path(self, dataset_uri, version, dataset_type, **params):
+        if self._cache_dir is None:
+            return None
+
+        cache_key = json.dumps({
+            'uri': dataset_uri,
+            'version': version,
+            'type': dataset_type,
+            'params': params
+        }, sort_keys=True)
+        cache_key = hashlib.sha256(cache_key.encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_dir, cache_key)
+
+    # Marks the cached dataset as recently used
+    def _touch_cache(self, cache_path):
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+
+    # Evicts least recently used datasets from the cache until it is within its max size, except the dataset in use
+    # Datasets already memory-mapped by workers remain readable after they are evicted
+    def _evict_from_cache(self, cache_path_in_use):
+        cache_path_to_size = {}
+        cache_path_to_mtime = {}
+        for name in os.listdir(self._cache_dir):
+            # Skip temporary folders of datasets that are still being cached
+            if name.startswith(tempfile.gettempprefix()):
+                continue
+
+            cache_path = os.path.join(self._cache_dir, name)
+            try:
+                cache_path_to_mtime[cache_path] = os.stat(cache_path).st_mtime
+                cache_path_to_size[cache_path] = sum([os.path.getsize(os.path.join(cache_path, x)) 
+                                                    for x in os.listdir(cache_path)])
+            except OSError:
+                # Likely that another worker has evicted the dataset or is still caching it 
+                cache_path_to_size.pop(cache_path, None)
+                cache_path_to_mtime.pop(cache_path, None)
+
+        total_size = sum(cache_path_to_size.values())
+        for cache_path in sorted(cache_path_to_mtime.keys(), key=lambda x: cache_path_to_mtime[x]):
+            if total_size <= self._cache_max_size:
+                break
+
+            if cache_path == cache_path_in_use:
+                continue
+
+            logger.info('Evicting dataset at "{}" from cache...'.format(cache_path))
+            shutil.rmtree(cache_path, ignore_errors=True)
+            total_size -= cache_path_to_size[cache_path]
+
+    def _get_dataset_file_checksum(self, dataset_path):
+        stat = os.stat(dataset_path)
+        file_key = (dataset_path, stat.st_size, stat.st_mtime)
+        if file_key not in self._dataset_file_to_checksum:
+            hasher = hashlib.sha256()
+            with open(dataset_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+            self._dataset_file_to_checksum[file_key] = hasher.hexdigest()
+
+        return self._dataset_file_to_checksum[file_key]
+
 class ModelDataset():
     '''
     Abstract that helps loading of dataset of a specific type
@@ -137,6 +309,46 @@ class ModelDataset():
     def __len__(self):
         return self.size
 
+    # Persists a decoded dataset as arrays, which are memory-mapped when loaded, together with JSON metadata
+    # Written to a temporary folder that is then renamed, so that workers concurrently caching the same dataset
+    # never see a partially written cache
+    # Large arrays can instead be streamed into the cache as { <name>: (<shape>, <dtype>, <function that fills the array>) },
+    # where the array is memory-mapped from its file, so that it is never fully in memory
+    def _save_to_cache(self, cache_path, arrays, meta, streamed_arrays={}):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = tempfile.mkdtemp(dir=os.path.dirname(cache_path))
+        try:
+            for (name, arr) in arrays.items():
+                np.save(os.path.join(temp_path, '{}.npy'.format(name)), arr)
+            for (name, (shape, dtype, fill_array)) in streamed_arrays.items():
+                arr = np.lib.format.open_memmap(os.path.join(temp_path, '{}.npy'.format(name)), 
+                                                mode='w+', dtype=dtype, shape=shape)
+                fill_array(arr)
+                arr.flush()
+                del arr
+            with open(os.path.join(temp_path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            os.rename(temp_path, cache_path)
+        except Exception:
+            # Likely that another worker has cached the dataset first, or that the dataset can't be cached
+            logger.warning('Error while caching dataset at "{}":'.format(cache_path))
+            logger.warning(traceback.format_exc())
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    # Returns (<arrays as memory maps>, <metadata>), or `None` if the dataset hasn't been cached
+    def _load_from_cache(self, cache_path, array_names):
+        if cache_path is None or not os.path.exists(cache_path):
+            return None
+
+        arrays = {
+            name: np.load(os.path.join(cache_path, '{}.npy'.format(name)), mmap_mode='r')
+            for name in array_names
+        }
+        with open(os.path.join(cache_path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        return (arrays, meta)
+
 class CorpusDataset(ModelDataset):
     '''
     Class that helps loading of dataset with type `CORPUS`
@@ -150,14 +362,54 @@ class CorpusDataset(ModelDataset):
     with tags appearing in the same order as ``tags``. 
     '''   
 
-    def __init__(self, dataset_path, tags, split_by):
+    def __init__(self, dataset_path, tags, split_by, cache_path=None):
         super().__init__(dataset_path)
         self.tags = tags
-        (self.size, self.tag_num_classes, self.max_token_len, self.max_sent_len, self._sents) = \
-            self._load(self.path, self.tags, split_by)
+        self._sents = None
+        self._tokens = None
+
+        cached = self._load_from_cache(cache_path, ['tokens', 'token_tags', 'sent_offsets'])
+        if cached is None:
+            with phase_recorder.phase('decode'):
+                (self.size, self.tag_num_classes, self.max_token_len, self.max_sent_len, self._sents) = \
+                    self._load(self.path, self.tags, split_by)
+                if cache_path is not None:
+                    self._cache_sents(cache_path)
+        else:
+            (arrays, meta) = cached
+            (self.size, self.tag_num_classes, self.max_token_len, self.max_sent_len) = \
+                (meta['size'], meta['tag_num_classes'], meta['max_token_len'], meta['max_sent_len'])
+            (self._tokens, self._token_tags, self._sent_offsets) = \
+                (arrays['tokens'], arrays['token_tags'], arrays['sent_offsets'])
 
     def __getitem__(self, index):
-        return self._sents[index]
+        if self._sents is not None:
+            return self._sents[index]
+
+        # Rebuild sentence from cached arrays
+        (start, end) = (self._sent_offsets[index], self._sent_offsets[index + 1])
+        return [
+            [str(token), *[int(x) for x in token_tags]] 
+            for (token, token_tags) in zip(self._tokens[start:end], self._token_tags[start:end])
+        ]
+
+    # Caches sentences as arrays of all tokens, all tokens' tags & offsets of sentences in tokens
+    def _cache_sents(self, cache_path):
+        tokens = [token[0] for sent in self._sents for token in sent]
+        token_tags = [token[1:] for sent in self._sents for token in sent]
+        sent_offsets = np.cumsum([0] + [len(sent) for sent in self._sents])
+        arrays = {
+            'tokens': np.asarray(tokens, dtype='<U{}'.format(max(self.max_token_len, 1))),
+            'token_tags': np.asarray(token_tags, dtype=np.int32).reshape((len(tokens), len(self.tags))),
+            'sent_offsets': sent_offsets.astype(np.int64)
+        }
+        meta = {
+            'size': self.size,
+            'tag_num_classes': self.tag_num_classes,
+            'max_token_len': self.max_token_len,
+            'max_sent_len': self.max_sent_len
+        }
+        self._save_to_cache(cache_path, arrays, meta)
 
     def _load(self, dataset_path, tags, split_by):
         sents = []
@@ -166,9 +418,10 @@ class CorpusDataset(ModelDataset):
         max_sent_len = 0
         
         with tempfile.TemporaryDirectory() as d:
-            dataset_zipfile = zipfile.ZipFile(dataset_path, 'r')
-            dataset_zipfile.extractall(path=d)
-            dataset_zipfile.close()
+            with phase_recorder.phase('unzip'):
+                dataset_zipfile = zipfile.ZipFile(dataset_path, 'r')
+                dataset_zipfile.extractall(path=d)
+                dataset_zipfile.close()
 
             # Read corpus.tsv, read token by token, and merge them into sentences
             corpus_tsv_path = os.path.join(d, 'corpus.tsv') 
@@ -217,19 +470,90 @@ class ImageFilesDataset(ModelDataset):
     of integers (0, 255) as grayscale, each class is an integer from 0 to (k - 1).
     '''   
 
-    def __init__(self, dataset_path, image_size):
+    def __init__(self, dataset_path, image_size, cache_path=None):
         super().__init__(dataset_path)
         self.image_size = image_size
-        (self.size, self.classes, self._image_paths, 
-            self._image_classes, self._dataset_dir) = self._load(self.path)
+        self._images = None
+
+        cache_array_names = ['images', 'image_offsets', 'image_shapes', 'image_classes']
+        cached = self._load_from_cache(cache_path, cache_array_names)
+        if cached is None:
+            (self.size, self.classes, self._image_paths, 
+                self._image_classes, self._dataset_dir) = self._load(self.path)
+
+            # Decode images once to cache them, then read images from the cache instead
+            if cache_path is not None:
+                with phase_recorder.phase('decode'):
+                    self._cache_images(cache_path)
+                cached = self._load_from_cache(cache_path, cache_array_names)
+                if cached is not None:
+                    self._dataset_dir.cleanup()
+
+        if cached is not None:
+            (arrays, meta) = cached
+            (self.size, self.classes) = (meta['size'], meta['classes'])
+            (self._images, self._image_offsets, self._image_shapes, self._image_classes) = \
+                (arrays['images'], arrays['image_offsets'], arrays['image_shapes'], arrays['image_classes'])
 
     def __getitem__(self, index):
-        image_path = self._image_paths[index]
+        if self._images is not None:
+            (start, end) = (self._image_offsets[index], self._image_offsets[index + 1])
+            image_shape = [x for x in self._image_shapes[index] if x > 0]
+            image = np.array(self._images[start:end]).reshape(image_shape)
+            return (image, int(self._image_classes[index]))
+
+        return self._read_image_file(index)
+
+    # Caches images as an array of all images' flattened pixels, together with offsets & shapes of images
+    # Shapes of images are first read from their headers, then images are decoded one at a time into the cache
+    # Images of different types of pixels are not cached
+    def _cache_images(self, cache_path):
+        image_shapes = []
+        image_modes = set()
+        for i in range(self.size):
+            with Image.open(self._get_image_file_path(i)) as image:
+                (width, height) = self.image_size if self.image_size is not None else image.size
+                bands = len(image.getbands())
+                image_shapes.append([height, width, bands if bands > 1 else 0]) # Padded with 0s
+                image_modes.add(image.mode)
+
+        if len(image_modes) > 1:
+            logger.warning('Not caching dataset with images of different types')
+            return
+
+        image_offsets = np.cumsum([0] + [int(np.prod([x for x in shape if x > 0])) for shape in image_shapes])
+        dtype = self._read_image_file(0)[0].dtype if self.size > 0 else np.float64
+
+        def fill_images(images):
+            for i in range(self.size):
+                image = self._read_image_file(i)[0]
+                (start, end) = (image_offsets[i], image_offsets[i + 1])
+                if image.size != end - start:
+                    raise ValueError('Image at index {} has an unexpected shape {}'.format(i, image.shape))
+                images[start:end] = image.ravel()
+
+        arrays = {
+            'image_offsets': image_offsets.astype(np.int64),
+            'image_shapes': np.asarray(image_shapes, dtype=np.int64).reshape((self.size, 3)),
+            'image_classes': np.asarray(self._image_classes, dtype=np.int64)
+        }
+        streamed_arrays = {
+            'images': ((int(image_offsets[-1]),), dtype, fill_images)
+        }
+        meta = {
+            'size': self.size,
+            'classes': self.classes
+        }
+        self._save_to_cache(cache_path, arrays, meta, streamed_arrays=streamed_arrays)
+
+    def _get_image_file_path(self, index):
+        return os.path.join(self._dataset_dir.name, self._image_paths[index])
+
+    def _read_image_file(self, index):
         image_class = self._image_classes[index]
-        dataset_dir = self._dataset_dir
         image_size = self.image_size
 
-        full_image_path = os.path.join(dataset_dir.name, image_path)
+        full_image_path = self._get_image_file_path(index)
         with open(full_image_path, 'rb') as f:
             encoded = io.BytesIO(f.read())
             image = Image.open(encoded)
@@ -248,9 +572,10 @@ class ImageFilesDataset(ModelDataset):
         # Create temp directory to unzip to
         dataset_dir = tempfile.TemporaryDirectory()
 
-        dataset_zipfile = zipfile.ZipFile(dataset_path, 'r')
-        dataset_zipfile.extractall(path=dataset_dir.name)
-        dataset_zipfile.close()
+        with phase_recorder.phase('unzip'):
+            dataset_zipfile = zipfile.ZipFile(dataset_path, 'r')
+            dataset_zipfile.extractall(path=dataset_dir.name)
+            dataset_zipfile.close()
 
         # Read images.csv, and read image paths & classes
         images_csv_path = os.path.join(dataset_dir.name, 'images.csv') 
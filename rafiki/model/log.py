@@ -36,6 +36,16 @@ class ModelLogger():
                 logger.log('Ending model training...')
                 ...
 
+    Models that train iteratively can also report intermediate scores with :meth:`rafiki.model.ModelLogger.report`,
+    so that Rafiki can stop unpromising trials early:
+
+    ::
+
+        for epoch in range(epochs):
+            ...
+            if logger.report(val_accuracy, epoch):
+                break
+
     '''
     
     def __init__(self):        
@@ -44,6 +54,7 @@ class ModelLogger():
         logger.setLevel(level=logging.INFO)
         logger.addHandler(ModelLoggerDebugHandler())
         self._logger = logger
+        self._handle_report = None
 
     def define_loss_plot(self):
         '''
@@ -98,12 +109,40 @@ class ModelLogger():
         if metrics:
             self._log(LogType.METRICS, metrics)
     
+    def report(self, score, step):
+        '''
+        Reports an intermediate score of the model at a step of training (e.g. its validation accuracy at an epoch),
+        which is also logged as the metrics ``score`` & ``step``.
+
+        If the train job has early stopping enabled, Rafiki compares the score against those of other trials
+        at the same step, and returns whether the model should stop training early. Models should then
+        end :meth:`rafiki.model.BaseModel.train` as soon as possible. Otherwise, this always returns ``False``.
+
+        Only call this method in :meth:`rafiki.model.BaseModel.train`.
+
+        :param float score: Intermediate score of the model, the higher the number, the better
+        :param int step: Step of training that the score is at, increasing over training
+        :returns: Whether the model should stop training early
+        :rtype: bool
+        '''
+        self.log(score=score, step=step)
+
+        if self._handle_report is None:
+            return False
+
+        return bool(self._handle_report(score, step))
+
     # Set the Python logger internally used.
     # During model training, this method will be called by Rafiki to inject a Python logger 
     # to generate logs for an instance of model training.
     def set_logger(self, logger):
         self._logger = logger
 
+    # Set the handler of reported intermediate scores as `handle_report(score, step)`, returning whether to stop early.
+    # During model training, this method will be called by Rafiki to decide whether the trial should stop early.
+    def set_report_handler(self, handle_report):
+        self._handle_report = handle_report
+
     def _log(self, log_type, log_dict={}):
         log_dict['type'] = log_type
         log_dict['time'] = datetime.datetime.now().strftime(MODEL_LOG_DATETIME_FORMAT)
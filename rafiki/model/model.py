@@ -1,10 +1,15 @@
 import os
+import sys
 import json
+import shlex
 import abc
 import traceback
 import pickle
-import uuid
-from importlib import import_module
+import hashlib
+import threading
+import linecache
+import importlib.abc
+import importlib.util
 import inspect
 
 from rafiki.advisor import Advisor, AdvisorType
@@ -17,6 +22,10 @@ from .knob import BaseKnob, serialize_knob_config, deserialize_knob_config
 class InvalidModelClassException(Exception): pass
 class InvalidModelParamsException(Exception): pass
 
+# Modules imported from model files, keyed by SHA-256 digests of the files
+_model_file_modules = {}
+_model_file_modules_lock = threading.Lock()
+
 class BaseModel(abc.ABC):
     '''
     Rafiki's base model class that Rafiki models should extend. 
@@ -118,6 +127,32 @@ class BaseModel(abc.ABC):
         '''
         raise NotImplementedError()
 
+    def save_checkpoint(self):
+        '''
+        Optionally, return a checkpoint of this model instance's progress in training (e.g. its weights, 
+        its optimizer's state & its current epoch), so that an interrupted trial can resume from it. 
+        This should be serializable by the Python's ``pickle`` module.
+
+        This will be called during :meth:`rafiki.model.BaseModel.train`, periodically when the model reports 
+        an intermediate score with :meth:`rafiki.model.ModelLogger.report`.
+        By default, it returns ``None``, meaning that the model doesn't support checkpointing.
+
+        :returns: Checkpoint of model, or ``None``
+        :rtype: any
+        '''
+        return None
+
+    def load_checkpoint(self, checkpoint):
+        '''
+        Optionally, load a checkpoint from :meth:`rafiki.model.BaseModel.save_checkpoint` into this model instance,
+        when the trial is resumed after being interrupted. :meth:`rafiki.model.BaseModel.train` will be called
+        subsequently, which should continue training from the checkpoint.
+
+        :param checkpoint: Checkpoint of model
+        :type checkpoint: any
+        '''
+        pass
+
     @abc.abstractmethod
     def destroy(self):
         '''
@@ -160,7 +195,7 @@ def test_model_class(model_file_path, model_class, task, dependencies, \
         f = open(model_file_path, 'rb')
         model_file_bytes = f.read()
         f.close()
-        py_model_class = load_model_class(model_file_bytes, model_class, temp_mod_name='your-model-file-temp')
+        py_model_class = load_model_class(model_file_bytes, model_class)
         _check_model_class(py_model_class)
 
         _print_header('Checking model knob configuration...')
@@ -224,28 +259,55 @@ def test_model_class(model_file_path, model_class, task, dependencies, \
     except Exception as e:
         raise InvalidModelClassException(e)
 
-def load_model_class(model_file_bytes, model_class, temp_mod_name=None):
-    if temp_mod_name is None:
-        temp_mod_name = str(uuid.uuid4())
+# Imports a model file in memory & returns its model class
+# Each distinct model file is only imported once per process, as a module named after the file's SHA-256 digest,
+# so that modules of different model files never replace each other in `sys.modules`
+def load_model_class(model_file_bytes, model_class):
+    digest = hashlib.sha256(model_file_bytes).hexdigest()
+
+    with _model_file_modules_lock:
+        mod = _model_file_modules.get(digest)
+        if mod is None:
+            mod = _import_model_file(model_file_bytes, 'rafiki_model_{}'.format(digest))
+            _model_file_modules[digest] = mod
 
-    temp_model_file_name ='{}.py'.format(temp_mod_name)
+    # Extract model class from module
+    clazz = getattr(mod, model_class)
+    return clazz
 
-    # Temporarily save the model file to disk
-    with open(temp_model_file_name, 'wb') as f:
-        f.write(model_file_bytes)
+def _import_model_file(model_file_bytes, mod_name):
+    file_name = '{}.py'.format(mod_name)
+    spec = importlib.util.spec_from_loader(mod_name, _ModelFileLoader(model_file_bytes, file_name), origin=file_name)
+    mod = importlib.util.module_from_spec(spec)
 
+    # Register module so that objects of its classes can be pickled
+    sys.modules[mod_name] = mod
     try:
-        # Import model file as module
-        mod = import_module(temp_mod_name)
-        # Extract model class from module
-        clazz = getattr(mod, model_class)
-    except Exception as e:
-        raise e
-    finally:
-        # Ensure that temp model file is removed upon model loading error
-        os.remove(temp_model_file_name)
+        spec.loader.exec_module(mod)
+    except Exception:
+        del sys.modules[mod_name]
+        raise
 
-    return clazz
+    return mod
+
+class _ModelFileLoader(importlib.abc.Loader):
+    '''
+    Loads a module from the bytes of a model file, without writing it to disk
+    '''
+    def __init__(self, model_file_bytes, file_name):
+        self._model_file_bytes = model_file_bytes
+        self._file_name = file_name
+
+    def create_module(self, spec):
+        return None # Default module creation
+
+    def exec_module(self, module):
+        # Make source of model file available to tracebacks
+        source = self._model_file_bytes.decode('utf-8')
+        linecache.cache[self._file_name] = (len(source), None, source.splitlines(True), self._file_name)
+
+        code = compile(self._model_file_bytes, self._file_name, 'exec')
+        exec(code, module.__dict__)
 
 def parse_model_install_command(dependencies, enable_gpu=False):
     conda_env = os.environ.get('CONDA_ENVIORNMENT')
@@ -278,6 +340,23 @@ def parse_model_install_command(dependencies, enable_gpu=False):
 
     return '; '.join(commands)
 
+# Rewrites PIP commands of an install command to install packages from wheels in a wheelhouse shared by workers,
+# building wheels of the packages & their dependencies into the wheelhouse first (reusing wheels already there),
+# so that packages are only downloaded & built once across workers. Falls back to the original PIP command on errors
+def make_wheelhouse_install_command(install_command, wheelhouse_dir):
+    wheelhouse_dir = shlex.quote(wheelhouse_dir)
+    commands = []
+    for command in install_command.split('; '):
+        if not command.startswith('pip install '):
+            commands.append(command)
+            continue
+
+        packages = command[len('pip install '):]
+        commands.append('(pip wheel -q -w {0} -f {0} {1} && pip install --no-index -f {0} {1}) || {2}' \
+                        .format(wheelhouse_dir, packages, command))
+
+    return '; '.join(commands)
+
 def _check_dependencies(dependencies):
     for (dep, ver) in dependencies.items():
         # Warn that Keras models should additionally depend on TF for GPU usage
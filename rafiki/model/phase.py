@@ -0,0 +1,92 @@
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+class PhaseRecorder():
+    '''
+    Records the wall time, CPU time & peak memory (RSS) of the process for named phases of a trial
+    (e.g. downloading of its dataset, training of its model), for accounting of where trials spend their resources.
+
+    Phases can be nested (e.g. decoding of a dataset within training of a model), in which case the outer phase
+    includes the inner phase. Phases of the same name are accumulated, with their max peak memory.
+    Phases are only recorded between ``start()`` & ``stop()``, so that recording is a no-op outside of trials.
+    '''
+    def __init__(self):
+        self._phases = None # { <name>: { 'wall_time', 'cpu_time', 'peak_memory' } }
+        self._stack = [] # Peak memory of each running phase so far
+        self._lock = threading.RLock()
+
+    def start(self):
+        with self._lock:
+            self._phases = {}
+            self._stack = []
+
+    # Returns the recorded phases & stops recording
+    def stop(self):
+        with self._lock:
+            phases = self._phases or {}
+            self._phases = None
+            self._stack = []
+            return phases
+
+    # Yields a dict that is filled with the wall time, CPU time & peak memory of this run of the phase
+    # when it ends, or left empty if phases are not being recorded
+    @contextmanager
+    def phase(self, name):
+        run = {}
+        if self._phases is None:
+            yield run
+            return
+
+        with self._lock:
+            # Fold peak memory so far into the outer phase, before resetting peak memory for this phase
+            if len(self._stack) > 0:
+                self._stack[-1] = max(self._stack[-1], _get_peak_memory())
+            _reset_peak_memory()
+            self._stack.append(0)
+
+        start_wall_time = time.time()
+        start_cpu_time = time.process_time()
+        try:
+            yield run
+        finally:
+            wall_time = time.time() - start_wall_time
+            cpu_time = time.process_time() - start_cpu_time
+
+            with self._lock:
+                if self._phases is not None and len(self._stack) > 0:
+                    peak_memory = max(self._stack.pop(), _get_peak_memory())
+                    if len(self._stack) > 0:
+                        self._stack[-1] = max(self._stack[-1], peak_memory)
+
+                    run.update({ 'wall_time': wall_time, 'cpu_time': cpu_time, 'peak_memory': peak_memory })
+                    phase = self._phases.setdefault(name, { 'wall_time': 0, 'cpu_time': 0, 'peak_memory': 0 })
+                    phase['wall_time'] += wall_time
+                    phase['cpu_time'] += cpu_time
+                    phase['peak_memory'] = max(phase['peak_memory'], peak_memory)
+
+# Returns peak RSS of the process in bytes since it was last reset,
+# from `VmHWM` on Linux, or otherwise peak RSS since the process started
+def _get_peak_memory():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024 # In kilobytes
+    except OSError:
+        pass
+
+    # `ru_maxrss` is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# Resets peak RSS of the process to its current RSS, where supported (Linux 4.0 onwards)
+def _reset_peak_memory():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+# Phases of the trial running in the process, recorded by the train worker
+phase_recorder = PhaseRecorder()
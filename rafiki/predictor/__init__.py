@@ -1 +1,2 @@
-from .ensemble import ensemble_predictions
\ No newline at end of file
+from .ensemble import ensemble_predictions
+from .compaction import compact_predictions, unpack_prediction
\ No newline at end of file
@@ -0,0 +1,73 @@
+import base64
+import numpy as np
+
+from rafiki.constants import OutputPolicyType
+
+PACKED_DTYPE = 'float16'
+
+# Compacts a list of predictions from a model according to an inference job's output policy
+# Only predictions that are lists of probabilities are compacted - other predictions are left as-is
+def compact_predictions(predictions, output_policy=None):
+    if not output_policy:
+        return predictions
+
+    return [_compact_prediction(x, output_policy) for x in predictions]
+
+# Expands a (possibly) float16-packed prediction back into a list of probabilities
+# Other predictions (including top-k predictions) are returned as-is
+def unpack_prediction(prediction):
+    if isinstance(prediction, dict) and prediction.get('dtype') == PACKED_DTYPE:
+        return _unpack_array(prediction).tolist()
+
+    if is_top_k_prediction(prediction) and isinstance(prediction['probs'], dict):
+        return {
+            'indices': prediction['indices'],
+            'probs': _unpack_array(prediction['probs']).tolist()
+        }
+
+    return prediction
+
+def _compact_prediction(prediction, output_policy):
+    if isinstance(prediction, np.ndarray):
+        prediction = prediction.tolist()
+
+    if not _is_probabilities(prediction):
+        return prediction
+
+    probs = np.asarray(prediction, dtype=np.float64)
+    pack_float16 = int(output_policy.get(OutputPolicyType.FLOAT16, 0)) > 0
+
+    if int(output_policy.get(OutputPolicyType.ARGMAX, 0)) > 0:
+        return int(np.argmax(probs))
+
+    k = int(output_policy.get(OutputPolicyType.TOP_K, 0))
+    if k > 0:
+        indices = np.argsort(-probs)[:k]
+        top_probs = probs[indices]
+        return {
+            'indices': indices.tolist(),
+            'probs': _pack_array(top_probs) if pack_float16 else top_probs.tolist()
+        }
+
+    if pack_float16:
+        return _pack_array(probs)
+
+    return prediction
+
+def _pack_array(arr):
+    data = np.asarray(arr, dtype=np.float16).tobytes()
+    return {
+        'dtype': PACKED_DTYPE,
+        'data': base64.b64encode(data).decode('ascii')
+    }
+
+def _unpack_array(packed):
+    data = base64.b64decode(packed['data'])
+    return np.frombuffer(data, dtype=np.float16).astype(np.float32)
+
+def _is_probabilities(prediction):
+    return isinstance(prediction, list) and len(prediction) > 0 and \
+        all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in prediction)
+
+def is_top_k_prediction(prediction):
+    return isinstance(prediction, dict) and 'indices' in prediction and 'probs' in prediction
@@ -1,8 +1,10 @@
 import numpy as np
-from collections import Iterable
+from collections import Iterable, Counter
 
 from rafiki.constants import TaskType
 
+from .compaction import unpack_prediction, is_top_k_prediction
+
 def ensemble_predictions(predictions_list, task):
     if len(predictions_list) == 0 or len(predictions_list[0]) == 0:
         return []
@@ -10,17 +12,53 @@ def ensemble_predictions(predictions_list, task):
     if task == TaskType.IMAGE_CLASSIFICATION:
         # Compute mean of probabilities across predictions 
         predictions = []
-        for preds in np.transpose(predictions_list, axes=[1, 0, 2]):
-            predictions.append(np.mean(preds, axis=0))
+        for preds in zip(*predictions_list):
+            preds = [unpack_prediction(x) for x in preds]
+            predictions.append(_ensemble_probabilities(preds))
     else:
-        # By default, just return some trial's predictions
+        # By default, just return some trial's predictions, unpacking any that have been packed by workers
         index = 0
-        predictions = predictions_list[index]
+        predictions = [unpack_prediction(x) for x in predictions_list[index]]
 
     predictions = _simplify_predictions(predictions)
 
     return predictions
 
+def _ensemble_probabilities(preds):
+    # If any prediction is sparse (top-k), merge all predictions as sparse predictions
+    if any(is_top_k_prediction(x) for x in preds):
+        return _ensemble_top_k([_to_top_k(x) for x in preds])
+
+    # If predictions are class indices (argmax), take the majority vote
+    if all(isinstance(x, int) for x in preds):
+        return Counter(preds).most_common(1)[0][0]
+
+    return np.mean(preds, axis=0)
+
+# Averages sparse top-k predictions, treating classes missing from a prediction as of probability 0
+# Returns the top-k classes of the averaged probabilities, where k is the largest k across predictions
+def _ensemble_top_k(preds):
+    k = max(len(x['indices']) for x in preds)
+    index_to_prob_sum = {}
+    for pred in preds:
+        for (index, prob) in zip(pred['indices'], pred['probs']):
+            index_to_prob_sum[index] = index_to_prob_sum.get(index, 0) + prob
+
+    top = sorted(index_to_prob_sum.items(), key=lambda x: x[1], reverse=True)[:k]
+    return {
+        'indices': [int(index) for (index, _) in top],
+        'probs': [float(prob_sum / len(preds)) for (_, prob_sum) in top]
+    }
+
+def _to_top_k(prediction):
+    if is_top_k_prediction(prediction):
+        return prediction
+
+    return {
+        'indices': list(range(len(prediction))),
+        'probs': list(prediction)
+    }
+
 def _simplify_predictions(predictions):
     # Convert numpy arrays to lists
     if isinstance(predictions, np.ndarray):
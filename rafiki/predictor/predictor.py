@@ -5,7 +5,7 @@ import pickle
 
 from rafiki.cache import Cache
 from rafiki.db import Database
-from rafiki.config import PREDICTOR_PREDICT_SLEEP
+from rafiki.config import PREDICTOR_PREDICT_SLEEP, PREDICTOR_PREDICT_TIMEOUT, PREDICTOR_STOPPED_WORKER_GRACE
 
 from .ensemble import ensemble_predictions
 
@@ -34,41 +34,82 @@ class Predictor(object):
 
         running_worker_ids = self._cache.get_workers_of_inference_job(self._inference_job_id)
         worker_to_prediction = {}
+        worker_to_error = {}
         worker_to_query_id = {}
+        worker_to_stopped_time = {} # { <worker_id>: <time it was first seen removed from the inference job> }
         responded_worker_ids = set() 
+        start_time = time.time()
         for worker_id in running_worker_ids:
             query_id = self._cache.add_query_of_worker(worker_id, query)
             worker_to_query_id[worker_id] = query_id
 
         logger.info('Waiting for predictions from workers...')
 
-        #TODO: add SLO. break loop when timer is out.
         while True:
             for (worker_id, query_id) in worker_to_query_id.items():
                 if worker_id in responded_worker_ids:
                     continue
                     
-                prediction = self._cache.pop_prediction_of_worker(worker_id, query_id)
-                if prediction is not None:
-                    worker_to_prediction[worker_id] = prediction
+                result = self._cache.pop_prediction_of_worker(worker_id, query_id)
+                if result is not None:
+                    (prediction, error) = result
+                    if error is not None:
+                        worker_to_error[worker_id] = error
+                    else:
+                        worker_to_prediction[worker_id] = prediction
                     responded_worker_ids.add(worker_id)
+                    self._cache.add_prediction_latency_of_worker(worker_id, time.time() - start_time)
              
             if len(responded_worker_ids) == len(running_worker_ids): 
                 break
 
+            # Workers that have been removed from the inference job (e.g. as they were drained just after the query
+            # was sent) might never answer, so they are given up on after a grace period, as are all workers on timeout
+            now = time.time()
+            current_worker_ids = set(self._cache.get_workers_of_inference_job(self._inference_job_id))
+            for worker_id in running_worker_ids:
+                if worker_id in responded_worker_ids:
+                    continue
+
+                if worker_id not in current_worker_ids:
+                    worker_to_stopped_time.setdefault(worker_id, now)
+
+                if now - start_time >= PREDICTOR_PREDICT_TIMEOUT:
+                    worker_to_error[worker_id] = 'Timed out waiting for prediction of inference worker'
+                    responded_worker_ids.add(worker_id)
+                elif now - worker_to_stopped_time.get(worker_id, now) >= PREDICTOR_STOPPED_WORKER_GRACE:
+                    worker_to_error[worker_id] = 'Inference worker has stopped'
+                    responded_worker_ids.add(worker_id)
+
+            if len(responded_worker_ids) == len(running_worker_ids): 
+                break
+
             time.sleep(PREDICTOR_PREDICT_SLEEP)
 
         logger.info('Predictions:')
         logger.info(worker_to_prediction)
 
+        if len(worker_to_error) > 0:
+            logger.warning('Errors from workers:')
+            logger.warning(worker_to_error)
+
+        # Only ensemble predictions from workers that didn't error on the query
         predictions_list = [
             [worker_to_prediction[worker_id]]
             for worker_id in running_worker_ids
+            if worker_id in worker_to_prediction
         ]
 
         predictions = ensemble_predictions(predictions_list, self._task)
         prediction = predictions[0] if len(predictions) > 0 else None
 
+        # Surface an error only if every worker errored on the query
+        if prediction is None and len(worker_to_error) > 0:
+            return {
+                'prediction': None,
+                'error': next(iter(worker_to_error.values()))
+            }
+
         return {
             'prediction': prediction
         }
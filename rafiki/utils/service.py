@@ -7,15 +7,29 @@ from rafiki.utils.log import configure_logging
 
 logger = logging.getLogger(__name__)
 
-def run_service(db, start_service, end_service):
+# `drain_service`, if given, is called on a termination signal and returns whether the service will drain, 
+# in which case `start_service` is expected to return once the service has drained
+# Otherwise, or on a second termination signal, the service is ended immediately
+# `start_service` can return `False` when other replicas of the service are still running,
+# in which case the service is not marked as stopped
+def run_service(db, start_service, end_service, drain_service=None):
     service_id = os.environ['RAFIKI_SERVICE_ID']
     service_type = os.environ['RAFIKI_SERVICE_TYPE']
     container_id = os.environ.get('HOSTNAME', 'localhost')
     configure_logging('service-id-{}-c-{}'.format(service_id, container_id))
 
+    is_draining = False
+
     def _sigterm_handler(_signo, _stack_frame):
+        nonlocal is_draining
         logger.warn("Terminal signal received: %s, %s" % (_signo, _stack_frame))
 
+        if drain_service is not None and not is_draining:
+            is_draining = drain_service(service_id, service_type)
+            if is_draining:
+                logger.info('Draining service {}...'.format(service_id))
+                return
+
         # Mark service as stopped in DB
         with db:
             service = db.get_service(service_id)
@@ -35,14 +49,15 @@ def run_service(db, start_service, end_service):
     try:
         logger.info('Starting service {}...'.format(service_id))
 
-        start_service(service_id, service_type)
+        is_service_stopped = start_service(service_id, service_type)
 
         logger.info('Ending service {}...'.format(service_id))
 
         # Mark service as stopped in DB
-        with db:
-            service = db.get_service(service_id)
-            db.mark_service_as_stopped(service)
+        if is_service_stopped is not False:
+            with db:
+                service = db.get_service(service_id)
+                db.mark_service_as_stopped(service)
 
         end_service(service_id, service_type)
 
@@ -1,2 +1,2 @@
 from .inference import InferenceWorker
-from .train import TrainWorker
\ No newline at end of file
+from .train import TrainWorker, PooledTrainWorker
\ No newline at end of file
@@ -6,98 +6,287 @@ import pickle
 import logging
 import traceback
 import json
+import threading
+from collections import OrderedDict
 
 from rafiki.model import load_model_class
 from rafiki.db import Database
-from rafiki.cache import Cache
-from rafiki.config import INFERENCE_WORKER_SLEEP, INFERENCE_WORKER_PREDICT_BATCH_SIZE
+from rafiki.cache import Cache, make_worker_ids
+from rafiki.artifact import make_artifact_store
+from rafiki.predictor import compact_predictions
+from rafiki.config import INFERENCE_WORKER_SLEEP, INFERENCE_WORKER_PREDICT_BATCH_SIZE, \
+    INFERENCE_WORKER_DRAIN_TIMEOUT, INFERENCE_WORKER_MODELS_MEMORY_BUDGET, INFERENCE_WORKER_HEARTBEAT_INTERVAL
 
 logger = logging.getLogger(__name__)
 
 class InvalidWorkerException(Exception): pass
+class InvalidPredictionsException(Exception): pass
 
 class InferenceWorker(object):
-    def __init__(self, service_id, cache=None, db=None):
-        if cache is None: 
+    '''
+    Makes predictions for queries with the models of one or more trials.
+
+    Queries for each trial are routed to a separate queue in the cache. When the worker hosts
+    multiple trials, trained models are loaded lazily and the least recently used models are
+    evicted to keep the total size of loaded models' parameters within a memory budget.
+    '''
+    def __init__(self, service_id, cache=None, db=None, artifact_store=None):
+        if cache is None:
             cache = Cache()
-        if db is None: 
+        if db is None:
             db = Database()
+        if artifact_store is None:
+            artifact_store = make_artifact_store()
 
         self._cache = cache
         self._db = db
+        self._artifact_store = artifact_store
         self._service_id = service_id
-        self._model = None
-        
+        self._replica_id = str(uuid.uuid4())
+        self._trial_to_worker_id = {} # { <trial_id>: <worker_id> }
+        self._trial_to_model = OrderedDict() # { <trial_id>: <model_inst> } from least to most recently used
+        self._trial_to_model_size = {} # { <trial_id>: <size of pickled parameters> }
+        self._output_policy = None
+        self._inference_job_id = None
+        self._is_draining = False
+        self._is_registered = False
+        self._is_last_replica = False
+        self._heartbeat_stop = threading.Event()
+
     def start(self):
         logger.info('Starting inference worker for service of id {}...' \
             .format(self._service_id))
-        
-        with self._db:
-            (inference_job_id, trial_id) = self._read_worker_info()
 
-            # Add to inference job's set of running workers
-            self._cache.add_worker_of_inference_job(self._service_id, inference_job_id)
+        with self._db:
+            (self._inference_job_id, trial_ids, self._output_policy, is_standby) = self._read_worker_info()
+            self._trial_to_worker_id = make_worker_ids(self._service_id, trial_ids)
 
-            self._model = self._load_model(trial_id)
+        # Load models of trials while within memory budget
+        for trial_id in trial_ids:
+            self._get_model(trial_id)
+            if self._get_total_model_size() >= INFERENCE_WORKER_MODELS_MEMORY_BUDGET:
+                break
 
-        while True:
-            (query_ids, queries) = \
-                self._cache.pop_queries_of_worker(self._service_id, INFERENCE_WORKER_PREDICT_BATCH_SIZE)
-            
-            if len(queries) > 0:
-                logger.info('Making predictions for queries...')
-                logger.info(queries)
-
-                predictions = None
-                try:
-                    predictions = self._model.predict(queries)
-                except Exception:
-                    logger.error('Error while making predictions:')
-                    logger.error(traceback.format_exc())
-                    
-                if predictions is not None:
-                    logger.info('Predictions:')
-                    logger.info(predictions)
-
-                    for (query_id, prediction) in zip(query_ids, predictions):
-                        self._cache.add_prediction_of_worker(self._service_id, query_id, prediction)
+        # Add to worker's set of running replicas & inference job's set of running workers
+        # Standby workers are instead added to the inference job by the admin when they are switched in
+        # Replicas keep sending heartbeats, so that a replica that is killed without deregistering is pruned
+        self._cache.add_replica_of_worker(self._replica_id, self._service_id)
+        self._is_registered = True
+        threading.Thread(target=self._send_heartbeats, args=(self._replica_id,), daemon=True).start()
+        if not is_standby:
+            for worker_id in self._trial_to_worker_id.values():
+                self._cache.add_worker_of_inference_job(worker_id, self._inference_job_id)
 
+        # Until draining, make predictions for batches of queries
+        while not self._is_draining:
+            self._predict_next_batches()
             time.sleep(INFERENCE_WORKER_SLEEP)
 
+        self._deregister()
+        self._finish_drain()
+
+        # Other replicas of the worker might still be running e.g. when the worker has been scaled down
+        return self._is_last_replica
+
+    # Starts draining the worker, which ends its `start()` after it finishes its current batch of queries.
+    # Called on termination of the service, so that queries it has accepted are not lost.
+    # As it is called in a signal handler, it only flags the worker, which then deregisters itself in `start()`
+    def drain(self):
+        if self._is_draining:
+            return
+
+        logger.info('Draining inference worker...')
+        self._is_draining = True
+
     def stop(self):
+        self._is_draining = True
+        self._deregister()
+
+        for model_inst in self._trial_to_model.values():
+            model_inst.destroy()
+
+        self._trial_to_model = OrderedDict()
+        self._trial_to_model_size = {}
+
+    # Removes this replica from the worker's set of running replicas.
+    # If it is the last replica, removes the worker from the inference job's set of running workers,
+    # so that predictors stop sending queries to the worker
+    # Replicas that haven't registered themselves have nothing to remove
+    def _deregister(self):
+        self._heartbeat_stop.set()
+        if self._replica_id is None or not self._is_registered:
+            return
+
+        replica_count = self._cache.delete_replica_of_worker(self._replica_id, self._service_id)
+        self._replica_id = None
+        if replica_count == 0:
+            self._is_last_replica = True
+            for worker_id in self._trial_to_worker_id.values():
+                self._cache.delete_worker_of_inference_job(worker_id, self._inference_job_id)
+
+    def _send_heartbeats(self, replica_id):
+        while not self._heartbeat_stop.wait(INFERENCE_WORKER_HEARTBEAT_INTERVAL):
+            try:
+                self._cache.add_replica_of_worker(replica_id, self._service_id)
+            except Exception:
+                logger.warning('Error while sending heartbeat of replica:')
+                logger.warning(traceback.format_exc())
+
+    # Returns whether there were queries to make predictions for
+    def _predict_next_batches(self):
+        has_queries = False
+        for (trial_id, worker_id) in self._trial_to_worker_id.items():
+            (query_ids, queries) = \
+                self._cache.pop_queries_of_worker(worker_id, INFERENCE_WORKER_PREDICT_BATCH_SIZE)
+
+            if len(queries) == 0:
+                continue
+
+            has_queries = True
+            logger.info('Making predictions for queries of trial of ID {}...'.format(trial_id))
+            logger.info(queries)
+
+            try:
+                model_inst = self._get_model(trial_id)
+            except Exception as e:
+                logger.error('Error while loading model of trial of ID {}:'.format(trial_id))
+                logger.error(traceback.format_exc())
+                for query_id in query_ids:
+                    self._cache.add_prediction_of_worker(worker_id, query_id, None,
+                                                        error=str(e) or type(e).__name__)
+                continue
+
+            self._predict_and_push(worker_id, model_inst, query_ids, queries)
+
+        return has_queries
+
+    # Replicas share the worker's queues of queries, so if there are other running replicas,
+    # remaining queries are left in the queues for them. Otherwise, as the last replica,
+    # continue making predictions for remaining queries within the drain timeout, then
+    # fail leftover queries so that predictors don't wait on them
+    def _finish_drain(self):
+        if not self._is_last_replica:
+            logger.info('Leaving remaining queries to other replicas of worker')
+            return
+
+        logger.info('Making predictions for remaining queries as last replica of worker...')
+        deadline = time.time() + INFERENCE_WORKER_DRAIN_TIMEOUT
+        while time.time() < deadline:
+            if not self._predict_next_batches():
+                break
+
+        for worker_id in self._trial_to_worker_id.values():
+            while True:
+                (query_ids, _) = \
+                    self._cache.pop_queries_of_worker(worker_id, INFERENCE_WORKER_PREDICT_BATCH_SIZE)
+
+                if len(query_ids) == 0:
+                    break
+
+                logger.warning('Failing {} queries left after draining worker'.format(len(query_ids)))
+                for query_id in query_ids:
+                    self._cache.add_prediction_of_worker(worker_id, query_id, None,
+                                                        error='Inference worker has stopped')
+
+    # Makes predictions for a batch of queries & pushes them to the cache
+    # If the batch errors, it is bisected to isolate the queries that caused the error,
+    # so that predictions for the other queries in the batch are still pushed
+    def _predict_and_push(self, worker_id, model_inst, query_ids, queries):
+        try:
+            predictions = model_inst.predict(queries)
+
+            if len(predictions) != len(queries):
+                raise InvalidPredictionsException('Model returned {} predictions for {} queries' \
+                    .format(len(predictions), len(queries)))
+
+        except Exception as e:
+            if len(queries) == 1:
+                logger.error('Error while making prediction for query of ID {}:'.format(query_ids[0]))
+                logger.error(traceback.format_exc())
+                self._cache.add_prediction_of_worker(worker_id, query_ids[0], None,
+                                                    error=str(e) or type(e).__name__)
+                return
+
+            logger.warning('Error while making predictions for batch of {} queries, bisecting batch...' \
+                .format(len(queries)))
+            mid = len(queries) // 2
+            self._predict_and_push(worker_id, model_inst, query_ids[:mid], queries[:mid])
+            self._predict_and_push(worker_id, model_inst, query_ids[mid:], queries[mid:])
+            return
+
+        logger.info('Predictions:')
+        logger.info(predictions)
+
+        # Compact predictions according to inference job's output policy
+        predictions = compact_predictions(predictions, self._output_policy)
+
+        for (query_id, prediction) in zip(query_ids, predictions):
+            self._cache.add_prediction_of_worker(worker_id, query_id, prediction)
+
+    # Returns the loaded model of a trial, loading it if necessary
+    # & evicting the least recently used models to stay within the memory budget
+    def _get_model(self, trial_id):
+        if trial_id in self._trial_to_model:
+            self._trial_to_model.move_to_end(trial_id)
+            return self._trial_to_model[trial_id]
+
+        logger.info('Loading model of trial of ID {}...'.format(trial_id))
         with self._db:
-            (inference_job_id, _) = self._read_worker_info()
+            (model_inst, model_size) = self._load_model(trial_id)
+
+        self._trial_to_model[trial_id] = model_inst
+        self._trial_to_model_size[trial_id] = model_size
 
-        # Remove from inference job's set of running workers
-        self._cache.delete_worker_of_inference_job(self._service_id, inference_job_id)
+        # Always keep the model that has just been loaded
+        while self._get_total_model_size() > INFERENCE_WORKER_MODELS_MEMORY_BUDGET and \
+                len(self._trial_to_model) > 1:
+            (evicted_trial_id, evicted_model_inst) = self._trial_to_model.popitem(last=False)
+            del self._trial_to_model_size[evicted_trial_id]
+            logger.info('Evicting model of trial of ID {}...'.format(evicted_trial_id))
+            evicted_model_inst.destroy()
 
-        if self._model is not None:
-            self._model.destroy()
-            self._model = None
+        return model_inst
+
+    def _get_total_model_size(self):
+        return sum(self._trial_to_model_size.values())
 
+    # Returns (<model instance>, <size of model's pickled parameters>)
     def _load_model(self, trial_id):
         trial = self._db.get_trial(trial_id)
         sub_train_job = self._db.get_sub_train_job(trial.sub_train_job_id)
         model = self._db.get_model(sub_train_job.model_id)
 
         # Load model based on trial
-        clazz = load_model_class(model.model_file_bytes, model.model_class)
+        model_file_bytes = self._db.get_model_file(model.id)
+        clazz = load_model_class(model_file_bytes, model.model_class)
         model_inst = clazz(**trial.knobs)
 
         # Unpickle model parameters and load it
-        parameters = pickle.loads(trial.parameters)
+        # Parameters of older trials are stored in the DB instead of the artifact store
+        if trial.parameters_artifact_id is not None:
+            with self._artifact_store.open_artifact(trial.parameters_artifact_id) as f:
+                parameters = pickle.load(f)
+                parameters_size = f.tell()
+        else:
+            parameters_bytes = self._db.get_trial_parameters(trial.id)
+            parameters = pickle.loads(parameters_bytes)
+            parameters_size = len(parameters_bytes)
+
         model_inst.load_parameters(parameters)
 
-        return model_inst
+        return (model_inst, parameters_size)
 
     def _read_worker_info(self):
-        worker = self._db.get_inference_job_worker(self._service_id)
-        inference_job = self._db.get_inference_job(worker.inference_job_id)
+        workers = self._db.get_inference_job_workers_of_service(self._service_id)
 
-        if worker is None:
+        if len(workers) == 0:
             raise InvalidWorkerException()
 
+        inference_job = self._db.get_inference_job(workers[0].inference_job_id)
+
         return (
             inference_job.id,
-            worker.trial_id
+            [x.trial_id for x in workers],
+            inference_job.output_policy,
+            all([x.is_standby for x in workers])
         )
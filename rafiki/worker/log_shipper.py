@@ -0,0 +1,94 @@
+import time
+import logging
+import datetime
+import threading
+import traceback
+
+from rafiki.db import Database
+from rafiki.config import TRAIN_WORKER_LOG_FLUSH_SIZE, TRAIN_WORKER_LOG_FLUSH_INTERVAL, \
+    TRAIN_WORKER_LOG_MAX_RATE
+
+logger = logging.getLogger(__name__)
+
+class TrialLogShipper(object):
+    '''
+    Ships logs of trials to the DB in the background, so that logging never blocks training.
+
+    Log lines are buffered & bulk-inserted every `TRAIN_WORKER_LOG_FLUSH_SIZE` lines or
+    `TRAIN_WORKER_LOG_FLUSH_INTERVAL` seconds. Each trial can log up to `TRAIN_WORKER_LOG_MAX_RATE`
+    rate-limited lines per second - the rest are dropped, with a count of dropped lines logged in their place.
+    '''
+    def __init__(self, db=None):
+        if db is None:
+            db = Database()
+
+        self._db = db
+        self._logs = [] # [(<trial_id>, <datetime>, <line>, <level>)]
+        self._trial_to_rate = {} # { <trial_id>: (<start of current second>, <lines in current second>, <dropped lines>) }
+        self._condition = threading.Condition()
+        self._ship_lock = threading.Lock() # Ensures that batches of logs are shipped in order
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Buffers a log line of a trial without blocking
+    # Lines that are not rate limited (e.g. a model's metrics & plots) are never dropped
+    def add_log(self, trial_id, line, level, is_rate_limited=True):
+        now = datetime.datetime.utcnow()
+        with self._condition:
+            if is_rate_limited and not self._take_rate(trial_id):
+                return
+
+            self._logs.append((trial_id, now, line, level))
+            if len(self._logs) >= TRAIN_WORKER_LOG_FLUSH_SIZE:
+                self._condition.notify_all()
+
+    # Ships all buffered logs, blocking until they are in the DB
+    # Once a trial has ended, its logs should be flushed with its ID, to discard its rate limit
+    def flush(self, ended_trial_id=None):
+        self._ship_logs(ended_trial_id)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._logs) >= TRAIN_WORKER_LOG_FLUSH_SIZE,
+                                        timeout=TRAIN_WORKER_LOG_FLUSH_INTERVAL)
+
+            self._ship_logs()
+
+    def _ship_logs(self, ended_trial_id=None):
+        with self._ship_lock:
+            with self._condition:
+                logs = self._logs
+                self._logs = []
+                for (trial_id, (start, count, dropped_count)) in list(self._trial_to_rate.items()):
+                    if dropped_count > 0:
+                        logs.append((trial_id, datetime.datetime.utcnow(),
+                                    '{} log lines were dropped due to rate limit'.format(dropped_count), 'WARNING'))
+                        self._trial_to_rate[trial_id] = (start, count, 0)
+
+                self._trial_to_rate.pop(ended_trial_id, None)
+
+            if len(logs) == 0:
+                return
+
+            try:
+                with self._db:
+                    self._db.add_trial_logs(logs)
+            except Exception:
+                # Logs to logger of module, which is never shipped
+                logger.warning('Error while shipping {} trial log lines:'.format(len(logs)))
+                logger.warning(traceback.format_exc())
+
+    # Returns whether the trial can log another line within its rate limit
+    def _take_rate(self, trial_id):
+        second = int(time.time())
+        (start, count, dropped_count) = self._trial_to_rate.get(trial_id, (second, 0, 0))
+        if start != second:
+            (start, count) = (second, 0)
+
+        if count >= TRAIN_WORKER_LOG_MAX_RATE:
+            self._trial_to_rate[trial_id] = (start, count, dropped_count + 1)
+            return False
+
+        self._trial_to_rate[trial_id] = (start, count + 1, dropped_count)
+        return True
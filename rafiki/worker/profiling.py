@@ -0,0 +1,52 @@
+import time
+import logging
+
+from rafiki.constants import TaskType
+from rafiki.model import dataset_utils
+from rafiki.model.phase import phase_recorder
+from rafiki.config import TRAIN_WORKER_PROFILE_BATCH_SIZES, TRAIN_WORKER_PROFILE_RUNS
+
+logger = logging.getLogger(__name__)
+
+# Profiles inference of a trained model instance, returning the trial's profile:
+# {
+#   'predict_latencies': { <batch size>: <median time in seconds for `predict` on a batch of that size> },
+#   'peak_memory': <peak memory (RSS) of the process in bytes while making predictions, or None if it wasn't measured>
+# }
+# Latencies & memory are only measured if queries can be made from the test dataset for the task,
+# and memory only while phases of the trial are being recorded
+def profile_model(model_inst, task, test_dataset_uri):
+    predict_latencies = {}
+    peak_memory = None
+    queries = _load_benchmark_queries(task, test_dataset_uri, max(TRAIN_WORKER_PROFILE_BATCH_SIZES))
+    if len(queries) > 0:
+        # Peak memory is reset at the start of the phase, so that it excludes the peak of training
+        with phase_recorder.phase('predict') as predict_phase:
+            for batch_size in TRAIN_WORKER_PROFILE_BATCH_SIZES:
+                batch = [queries[i % len(queries)] for i in range(batch_size)]
+                latencies = []
+                for _ in range(TRAIN_WORKER_PROFILE_RUNS):
+                    start = time.time()
+                    model_inst.predict(batch)
+                    latencies.append(time.time() - start)
+
+                predict_latencies[str(batch_size)] = sorted(latencies)[len(latencies) // 2]
+
+        peak_memory = predict_phase.get('peak_memory')
+
+    return {
+        'predict_latencies': predict_latencies,
+        'peak_memory': peak_memory
+    }
+
+def _load_benchmark_queries(task, dataset_uri, count):
+    if task == TaskType.IMAGE_CLASSIFICATION:
+        dataset = dataset_utils.load_dataset_of_image_files(dataset_uri)
+        return [dataset[i][0].tolist() for i in range(min(count, len(dataset)))]
+
+    if task == TaskType.POS_TAGGING:
+        dataset = dataset_utils.load_dataset_of_corpus(dataset_uri)
+        return [[x[0] for x in dataset[i]] for i in range(min(count, len(dataset)))]
+
+    logger.info('Skipping profiling of predictions for task "{}"'.format(task))
+    return []
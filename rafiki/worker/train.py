@@ -1,15 +1,28 @@
 import time
 import logging
 import os
+import sys
 import traceback
 import pickle
+import tempfile
+import signal
+import multiprocessing
+import threading
 import pprint
 
-from rafiki.config import SUPERADMIN_EMAIL, SUPERADMIN_PASSWORD
+from rafiki.config import SUPERADMIN_EMAIL, SUPERADMIN_PASSWORD, TRAIN_WORKER_POOL_TASK_WAIT, \
+    TRAIN_WORKER_TRIAL_SLOT_WAIT, TRAIN_WORKER_LOG_IGNORED_LOGGERS, TRAIN_WORKER_CHECKPOINT_INTERVAL, \
+    TRAIN_WORKER_TRIAL_HEARTBEAT_INTERVAL, TRAIN_WORKER_TRIAL_STALE_TIMEOUT
 from rafiki.constants import TrainJobStatus, TrialStatus, BudgetType
 from rafiki.model import load_model_class, serialize_knob_config, logger as model_logger
+from rafiki.model.phase import phase_recorder
 from rafiki.db import Database
+from rafiki.cache import Cache
 from rafiki.client import Client
+from rafiki.artifact import make_artifact_store
+
+from .profiling import profile_model
+from .log_shipper import TrialLogShipper
 
 logger = logging.getLogger(__name__)
 
@@ -17,112 +30,110 @@ class InvalidTrainJobException(Exception): pass
 class InvalidModelException(Exception): pass
 class InvalidBudgetTypeException(Exception): pass
 class InvalidWorkerException(Exception): pass
+class TrialProcessException(Exception): pass
+
+# Time in seconds that trial processes are given to exit after being signalled to stop
+TRIAL_PROCESS_STOP_TIMEOUT = 10
 
 class TrainWorker(object):
-    def __init__(self, service_id, db=None):
+    '''
+    Runs trials for a sub train job until its budget is reached.
+
+    With ``parallel_trials`` > 1, the worker instead runs that many trials at a time, each in a child process
+    that runs trials independently, sharing the sub train job's advisor & budget with other workers.
+    '''
+    def __init__(self, service_id, db=None, artifact_store=None, parallel_trials=1):
         if db is None: 
             db = Database()
+        if artifact_store is None:
+            artifact_store = make_artifact_store()
             
         self._service_id = service_id
         self._db = db
+        self._artifact_store = artifact_store
+        self._parallel_trials = parallel_trials
+        self._processes = []
+        self._log_shipper = None
+        self._heartbeat_thread = None
+        self._model_classes = {} # { (<model_id>, <model_class>): <model class> }
         self._trial_id = None
         self._client = self._make_client()
 
     def start(self):
         logger.info('Starting train worker for service of ID "{}"...' \
             .format(self._service_id))
-            
+
+        if self._parallel_trials > 1:
+            self._run_trial_processes()
+            is_budget_reached = True
+            advisor_id = self._service_id # Trial processes share the default advisor of the worker
+        else:
+            (is_budget_reached, advisor_id) = self._run_trials()
+
+        if is_budget_reached:
+            self._stop_worker()
+            if advisor_id is not None:
+                self._delete_advisor(advisor_id)
+
+    # Runs trials until the budget is reached or a trial errors, 
+    # returning (<whether budget is reached>, <ID of advisor, if created>)
+    def _run_trials(self):
         # TODO: Break up crazily long & unreadable method
         advisor_id = None
         while True:
             with self._db:
-                (sub_train_job_id, budget, model_id, model_file_bytes, model_class, \
-                    train_job_id, train_dataset_uri, test_dataset_uri) = self._read_worker_info()
-
-                if self._if_budget_reached(budget, sub_train_job_id):
-                    # If budget reached
-                    logger.info('Budget for train job has reached')
-                    self._stop_worker()
-                    if advisor_id is not None:
-                        self._delete_advisor(advisor_id)
-                    break
-
-                # Create a new trial
-                logger.info('Creating new trial in DB...')
-                trial = self._db.create_trial(
-                    sub_train_job_id=sub_train_job_id,
-                    model_id=model_id
-                )
+                (sub_train_job_id, budget, model_id, model_class, \
+                    train_job_id, task, train_dataset_uri, test_dataset_uri) = self._read_worker_info()
+
+                # Claim a trial slot within budget by resuming a terminated trial or creating a new trial
+                trial = self._claim_trial(sub_train_job_id, model_id, budget)
                 self._db.commit()
-                self._trial_id = trial.id
-                logger.info('Created trial of ID "{}" in DB'.format(self._trial_id))
+                trial_id = trial.id if trial is not None else None
+                is_budget_reached = trial is None and self._if_budget_reached(budget, sub_train_job_id)
                 
+            if is_budget_reached:
+                logger.info('Budget for train job has reached')
+                return (True, advisor_id)
+
+            # All trial slots are claimed, but trials of other replicas are still in progress & might be terminated
+            if trial_id is None:
+                time.sleep(TRAIN_WORKER_TRIAL_SLOT_WAIT)
+                continue
+
+            self._trial_id = trial_id
+            logger.info('Claimed trial of ID "{}" in DB'.format(self._trial_id))
+            phase_recorder.start()
+
             # Don't keep DB connection while training model
 
             # Perform trial & record results
-            score = 0
             try:
                 logger.info('Starting trial...')
 
                 # Load model class from bytes
                 logger.info('Loading model class...')
-                clazz = load_model_class(model_file_bytes, model_class)
+                with phase_recorder.phase('load_model_class'):
+                    clazz = self._load_model_class(model_id, model_class)
 
                 # If not created, create a Rafiki advisor for train worker to propose knobs in trials
                 if advisor_id is None:
                     logger.info('Creating Rafiki advisor...')
-                    advisor_id = self._create_advisor(clazz)
+                    advisor_id = self._create_advisor(clazz, early_stopping=budget.get(BudgetType.EARLY_STOPPING))
                     logger.info('Created advisor of ID "{}"'.format(advisor_id))
 
-                # Generate knobs for trial
-                logger.info('Requesting for knobs proposal from advisor...')
-                knobs = self._get_proposal_from_advisor(advisor_id)
-                logger.info('Received proposal of knobs from advisor:')
-                logger.info(pprint.pformat(knobs))
-
-                # Mark trial as running in DB
-                logger.info('Training & evaluating model...')
-                with self._db:
-                    trial = self._db.get_trial(self._trial_id)
-                    self._db.mark_trial_as_running(trial, knobs)
-
-                def handle_log(log_line, log_lvl):
-                    with self._db:
-                        trial = self._db.get_trial(self._trial_id)
-                        self._db.add_trial_log(trial, log_line, log_lvl)
-
-                (score, parameters) = self._train_and_evaluate_model(clazz, knobs, train_dataset_uri, 
-                                                                    test_dataset_uri, handle_log)
-                logger.info('Trial score: {}'.format(score))
-                
-                with self._db:
-                    logger.info('Marking trial as complete in DB...')
-                    trial = self._db.get_trial(self._trial_id)
-                    self._db.mark_trial_as_complete(trial, score, parameters)
-
-                self._trial_id = None
-
-                # Report results of trial to advisor
-                try:
-                    logger.info('Sending result of trials\' knobs to advisor...')
-                    self._feedback_to_advisor(advisor_id, knobs, score)
-                except Exception:
-                    logger.error('Error while sending result of proposal to advisor:')
-                    logger.error(traceback.format_exc())
+                self._perform_trial(clazz, advisor_id, task, train_dataset_uri, test_dataset_uri)
 
             except Exception:
                 logger.error('Error while running trial:')
                 logger.error(traceback.format_exc())
-                logger.info('Marking trial as errored in DB...')
-
-                with self._db:
-                    trial = self._db.get_trial(self._trial_id)
-                    self._db.mark_trial_as_errored(trial)
-
+                self._mark_trial_as_errored()
                 self._trial_id = None
-                break # Exit worker upon trial error
+                return (False, advisor_id) # Exit worker upon trial error
             
     def stop(self):
+        # Trial processes mark their own trials as terminated
+        self._stop_trial_processes()
+
         # If worker is currently running a trial, mark it has terminated
         logger.info('Marking trial as terminated in DB...')
         try:
@@ -135,39 +146,269 @@ class TrainWorker(object):
             logger.error('Error marking trial as terminated:')
             logger.error(traceback.format_exc())
 
-    def _train_and_evaluate_model(self, clazz, knobs, train_dataset_uri, \
-                                test_dataset_uri, handle_log):
+    # Runs the current trial with knobs proposed by the advisor, then records its results
+    # Resumed trials are instead run with their previous knobs, from their model's latest checkpoint
+    def _perform_trial(self, clazz, advisor_id, task, train_dataset_uri, test_dataset_uri):
+        with self._db:
+            trial = self._db.get_trial(self._trial_id)
+            (knobs, checkpoint_artifact_id) = (trial.knobs, trial.checkpoint_artifact_id)
+
+        if checkpoint_artifact_id is not None:
+            logger.info('Resuming trial from checkpoint with knobs:')
+            logger.info(pprint.pformat(knobs))
+        else:
+            # Generate knobs for trial
+            logger.info('Requesting for knobs proposal from advisor...')
+            with phase_recorder.phase('propose_knobs'):
+                knobs = self._get_proposal_from_advisor(advisor_id)
+            logger.info('Received proposal of knobs from advisor:')
+            logger.info(pprint.pformat(knobs))
+
+        # Mark trial as running in DB
+        logger.info('Training & evaluating model...')
+        with self._db:
+            trial = self._db.get_trial(self._trial_id)
+            self._db.mark_trial_as_running(trial, knobs)
+
+        # Logs are shipped to DB in the background
+        if self._log_shipper is None:
+            self._log_shipper = TrialLogShipper()
+
+        trial_id = self._trial_id
+        def handle_log(log_line, log_lvl, is_rate_limited):
+            self._log_shipper.add_log(trial_id, log_line, log_lvl, is_rate_limited=is_rate_limited)
+
+        # Intermediate scores that the model reports are sent to the advisor, which decides whether the trial should stop early
+        def handle_report(score, step):
+            should_stop = self._report_to_advisor(advisor_id, trial_id, score, step)
+            if should_stop:
+                logger.info('Advisor has signalled trial to stop early at step {}'.format(step))
+            return should_stop
+
+        try:
+            (score, parameters_artifact_id, profile, parameters_size) = \
+                self._train_and_evaluate_model(clazz, knobs, task, train_dataset_uri, test_dataset_uri, 
+                                            handle_log, handle_report, checkpoint_artifact_id=checkpoint_artifact_id)
+        finally:
+            with phase_recorder.phase('flush_logs'):
+                self._log_shipper.flush(ended_trial_id=trial_id)
+
+        logger.info('Trial score: {}'.format(score))
+        
+        # Record where the trial spent its time & memory, for finding bottlenecks of trials
+        metrics = {
+            'phases': phase_recorder.stop(),
+            'parameters_size': parameters_size
+        }
+        logger.info('Trial metrics: {}'.format(metrics))
+
+        with self._db:
+            logger.info('Marking trial as complete in DB...')
+            trial = self._db.get_trial(self._trial_id)
+            last_checkpoint_artifact_id = trial.checkpoint_artifact_id
+            self._db.mark_trial_as_complete(trial, score, parameters_artifact_id, profile=profile, metrics=metrics)
+
+        # Checkpoints are only needed to resume trials
+        self._delete_checkpoint(last_checkpoint_artifact_id)
+
+        self._trial_id = None
+
+        # Report results of trial to advisor
+        try:
+            logger.info('Sending result of trials\' knobs to advisor...')
+            self._feedback_to_advisor(advisor_id, knobs, score)
+        except Exception:
+            logger.error('Error while sending result of proposal to advisor:')
+            logger.error(traceback.format_exc())
+
+    def _train_and_evaluate_model(self, clazz, knobs, task, train_dataset_uri, \
+                                test_dataset_uri, handle_log, handle_report, checkpoint_artifact_id=None):
 
         # Initialize model
         model_inst = clazz(**knobs)
 
+        # Restore model from its latest checkpoint, if any
+        # If the checkpoint can't be loaded, the model is trained from scratch instead
+        if checkpoint_artifact_id is not None:
+            try:
+                logger.info('Loading checkpoint of model...')
+                with phase_recorder.phase('load_checkpoint'):
+                    with self._artifact_store.open_artifact(checkpoint_artifact_id) as f:
+                        checkpoint = pickle.load(f)
+                    model_inst.load_checkpoint(checkpoint)
+            except Exception:
+                logger.warning('Error while loading checkpoint of model, training model from scratch:')
+                logger.warning(traceback.format_exc())
+                model_inst.destroy()
+                model_inst = clazz(**knobs)
+
+        # Checkpoint model periodically when it reports intermediate scores, when it is in a consistent state
+        last_checkpoint_time = time.time()
+        def handle_report_and_checkpoint(score, step):
+            nonlocal last_checkpoint_time
+            if time.time() - last_checkpoint_time >= TRAIN_WORKER_CHECKPOINT_INTERVAL:
+                self._save_checkpoint(model_inst)
+                last_checkpoint_time = time.time()
+
+            return handle_report(score, step)
+
         # Add logs handlers for trial, including adding handler to root logger 
-        # to handle logs emitted during model training with level above INFO
-        log_handler = ModelLoggerHandler(handle_log)
+        # to handle logs emitted during model training with level above INFO, except those of noisy libraries
+        # Logs of the model's logger (e.g. its metrics & plots) are never dropped by rate limits
+        log_handler = ModelLoggerHandler(handle_log, is_rate_limited=True, 
+                                        ignored_loggers=TRAIN_WORKER_LOG_IGNORED_LOGGERS)
+        model_log_handler = ModelLoggerHandler(handle_log, is_rate_limited=False)
         root_logger = logging.getLogger()
         root_logger.addHandler(log_handler)
         py_model_logger = logging.getLogger('{}.trial'.format(__name__))
         py_model_logger.setLevel(logging.INFO)
         py_model_logger.propagate = False # Avoid duplicate logs in root logger
-        py_model_logger.addHandler(log_handler)
+        py_model_logger.addHandler(model_log_handler)
         model_logger.set_logger(py_model_logger)
+        model_logger.set_report_handler(handle_report_and_checkpoint)
 
-        # Train model
-        model_inst.train(train_dataset_uri)
+        try:
+            # Train model
+            with phase_recorder.phase('train'):
+                model_inst.train(train_dataset_uri)
+
+            # Evaluate model
+            with phase_recorder.phase('evaluate'):
+                score = model_inst.evaluate(test_dataset_uri)
+
+        finally:
+            # Remove log handlers from loggers for this trial
+            root_logger.removeHandler(log_handler)
+            py_model_logger.removeHandler(model_log_handler)
+            model_logger.set_report_handler(None)
+
+        # Profile inference of model, for sizing of inference workers
+        # Trial doesn't fail if its model can't be profiled
+        profile = None
+        try:
+            logger.info('Profiling inference of model...')
+            with phase_recorder.phase('profile'):
+                profile = profile_model(model_inst, task, test_dataset_uri)
+            logger.info('Trial profile: {}'.format(profile))
+        except Exception:
+            logger.warning('Error while profiling inference of model:')
+            logger.warning(traceback.format_exc())
 
-        # Evaluate model
-        score = model_inst.evaluate(test_dataset_uri)
+        # Dump model parameters, and pickle them through a temporary file into the artifact store
+        logger.info('Storing model parameters...')
+        with phase_recorder.phase('dump_parameters'):
+            parameters = model_inst.dump_parameters()
+        model_inst.destroy()
+        with tempfile.TemporaryFile() as f:
+            with phase_recorder.phase('pickle_parameters'):
+                pickle.dump(parameters, f)
+                parameters_size = f.tell()
+            f.seek(0)
+            with phase_recorder.phase('store_parameters'):
+                parameters_artifact_id = self._artifact_store.put_artifact(f)
+
+        return (score, parameters_artifact_id, profile, parameters_size)
+
+    # Stores a checkpoint of the model of the current trial, if the model supports checkpointing
+    # Training continues if the checkpoint can't be stored
+    def _save_checkpoint(self, model_inst):
+        try:
+            checkpoint = model_inst.save_checkpoint()
+            if checkpoint is None:
+                return
 
-        # Remove log handlers from loggers for this trial
-        root_logger.removeHandler(log_handler)
-        py_model_logger.removeHandler(log_handler)
+            logger.info('Storing checkpoint of model...')
+            with phase_recorder.phase('save_checkpoint'), tempfile.TemporaryFile() as f:
+                pickle.dump(checkpoint, f)
+                f.seek(0)
+                checkpoint_artifact_id = self._artifact_store.put_artifact(f)
 
-        # Dump and pickle model parameters
-        parameters = model_inst.dump_parameters()
-        parameters = pickle.dumps(parameters)
-        model_inst.destroy()
+            with self._db:
+                trial = self._db.get_trial(self._trial_id)
+                prev_checkpoint_artifact_id = trial.checkpoint_artifact_id
+                self._db.mark_trial_as_checkpointed(trial, checkpoint_artifact_id)
+
+        except Exception:
+            logger.warning('Error while storing checkpoint of model:')
+            logger.warning(traceback.format_exc())
+            return
+
+        # Only the latest checkpoint of the trial is kept
+        if prev_checkpoint_artifact_id != checkpoint_artifact_id:
+            self._delete_checkpoint(prev_checkpoint_artifact_id)
 
-        return (score, parameters)
+    # Deletes a checkpoint that is no longer needed from the artifact store, unless the artifact
+    # is still referenced by any trial, as identical artifacts are only stored once
+    # Errors are only logged as warnings
+    def _delete_checkpoint(self, checkpoint_artifact_id):
+        if checkpoint_artifact_id is None:
+            return
+
+        try:
+            with self._db:
+                if self._db.count_trials_with_artifact(checkpoint_artifact_id) > 0:
+                    return
+
+            self._artifact_store.delete_artifact(checkpoint_artifact_id)
+        except Exception:
+            logger.warning('Error while deleting checkpoint of model:')
+            logger.warning(traceback.format_exc())
+
+    # Marks the current trial as errored in DB, deleting its checkpoint as the trial won't be resumed
+    def _mark_trial_as_errored(self):
+        logger.info('Marking trial as errored in DB...')
+        with self._db:
+            trial = self._db.get_trial(self._trial_id)
+            checkpoint_artifact_id = trial.checkpoint_artifact_id
+            self._db.mark_trial_as_errored(trial)
+
+        self._delete_checkpoint(checkpoint_artifact_id)
+
+    # Runs trials in parallel child processes until all of them exit, after reaching the budget
+    # Processes are forked, as they can't re-run the worker's start-up script
+    # Connections to DB are closed before forking, as processes open their own connections
+    def _run_trial_processes(self):
+        logger.info('Running {} trials in parallel...'.format(self._parallel_trials))
+        self._db.dispose()
+        context = multiprocessing.get_context('fork')
+        self._processes = [
+            context.Process(target=_run_trials_in_process, args=(self._service_id,))
+            for _ in range(self._parallel_trials)
+        ]
+        for process in self._processes:
+            process.start()
+
+        for process in self._processes:
+            process.join()
+
+        exit_codes = [x.exitcode for x in self._processes]
+        self._processes = []
+        if any([x != 0 for x in exit_codes]):
+            raise TrialProcessException('Trial processes exited with codes {}'.format(exit_codes))
+
+    # Signals trial processes to stop, then kills those that haven't exited after a timeout
+    def _stop_trial_processes(self):
+        processes = self._processes
+        self._processes = []
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.time() + TRIAL_PROCESS_STOP_TIMEOUT
+        for process in processes:
+            process.join(timeout=max(deadline - time.time(), 0))
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGKILL)
+
+    # Loads a model's class, only fetching & importing the model's file for the first trial of the model
+    def _load_model_class(self, model_id, model_class):
+        key = (model_id, model_class)
+        if key not in self._model_classes:
+            with self._db:
+                model_file_bytes = self._db.get_model_file(model_id)
+            self._model_classes[key] = load_model_class(model_file_bytes, model_class)
+
+        return self._model_classes[key]
 
     # Gets proposal of a set of knob values from advisor
     def _get_proposal_from_advisor(self, advisor_id):
@@ -179,6 +420,17 @@ class TrainWorker(object):
     def _feedback_to_advisor(self, advisor_id, knobs, score):
         self._client.feedback_to_advisor(advisor_id, knobs, score)
 
+    # Reports intermediate score of trial to advisor, returning whether the trial should stop early
+    # Trial continues if advisor can't be reached
+    def _report_to_advisor(self, advisor_id, trial_id, score, step):
+        try:
+            res = self._client.report_to_advisor(advisor_id, trial_id, score, step)
+            return res['should_stop']
+        except Exception:
+            logger.warning('Error while reporting intermediate score of trial to advisor:')
+            logger.warning(traceback.format_exc())
+            return False
+
     def _stop_worker(self):
         logger.warn('Stopping train job worker...')
         try:
@@ -188,13 +440,15 @@ class TrainWorker(object):
             logger.warn('Error while stopping train job worker service:')
             logger.warn(traceback.format_exc())
         
-    def _create_advisor(self, clazz):
+    # Creates an advisor (by default, associated with worker), or gets the existing advisor of the same ID
+    def _create_advisor(self, clazz, advisor_id=None, early_stopping=None):
         # Retrieve knob config for model of worker 
         knob_config = clazz.get_knob_config()
         knob_config_str = serialize_knob_config(knob_config)
 
         # Create advisor associated with worker
-        res = self._client.create_advisor(knob_config_str, advisor_id=self._service_id)
+        res = self._client.create_advisor(knob_config_str, advisor_id=(advisor_id or self._service_id),
+                                        early_stopping=early_stopping)
         advisor_id = res['id']
         return advisor_id
 
@@ -209,11 +463,51 @@ class TrainWorker(object):
 
     # Returns whether the worker reached its budget (only consider COMPLETED or ERRORED trials)
     def _if_budget_reached(self, budget, sub_train_job_id):
+        max_trials = self._get_max_trials(budget)
+        trial_count = self._db.count_trials_of_sub_train_job(sub_train_job_id, 
+                                                            statuses=[TrialStatus.COMPLETED, TrialStatus.ERRORED])
+        return trial_count >= max_trials
+
+    # Claims a trial slot within budget, preferring to resume a terminated trial from its checkpoint
+    # over creating a new trial, returning the trial, or `None` if all trial slots have been claimed
+    # Trials of other workers that are no longer running are reclaimed first
+    def _claim_trial(self, sub_train_job_id, model_id, budget):
+        # Claimed trials are kept alive in DB in the background
+        if self._heartbeat_thread is None:
+            self._heartbeat_thread = threading.Thread(target=self._send_trial_heartbeats, daemon=True)
+            self._heartbeat_thread.start()
+
+        max_trials = self._get_max_trials(budget)
+        trial = self._db.resume_trial_within_budget(sub_train_job_id, max_trials, 
+                                                    stale_timeout=TRAIN_WORKER_TRIAL_STALE_TIMEOUT)
+        if trial is not None:
+            logger.info('Resuming terminated trial in DB...')
+            return trial
+
+        logger.info('Creating new trial in DB...')
+        return self._db.create_trial_within_budget(sub_train_job_id, model_id, max_trials, 
+                                                    stale_timeout=TRAIN_WORKER_TRIAL_STALE_TIMEOUT)
+
+    # Periodically records in DB that the current trial is still running, with a separate DB session,
+    # so that its slot isn't reclaimed by other workers
+    def _send_trial_heartbeats(self):
+        db = Database()
+        while True:
+            time.sleep(TRAIN_WORKER_TRIAL_HEARTBEAT_INTERVAL)
+            trial_id = self._trial_id
+            if trial_id is None:
+                continue
+
+            try:
+                with db:
+                    db.update_trial_heartbeat(trial_id)
+            except Exception:
+                logger.warning('Error while sending heartbeat of trial:')
+                logger.warning(traceback.format_exc())
+
+    def _get_max_trials(self, budget):
         # By default, budget is model trial count of 2
-        max_trials = budget.get(BudgetType.MODEL_TRIAL_COUNT, 2)
-        trials = self._db.get_trials_of_sub_train_job(sub_train_job_id)
-        trials = [x for x in trials if x.status in [TrialStatus.COMPLETED, TrialStatus.ERRORED]]
-        return len(trials) >= max_trials
+        return budget.get(BudgetType.MODEL_TRIAL_COUNT, 2)
 
     def _read_worker_info(self):
         worker = self._db.get_train_job_worker(self._service_id)
@@ -235,9 +529,9 @@ class TrainWorker(object):
             sub_train_job.id,
             train_job.budget,
             model.id,
-            model.model_file_bytes,
             model.model_class,
             train_job.id,
+            train_job.task,
             train_job.train_dataset_uri,
             train_job.test_dataset_uri
         )
@@ -256,13 +550,139 @@ class TrainWorker(object):
         client.login(email=superadmin_email, password=superadmin_password)
         return client
 
+class PooledTrainWorker(TrainWorker):
+    '''
+    Train worker in a long-lived pool of train workers that is shared across train jobs.
+
+    Instead of running trials for a single sub train job until its budget is reached, it takes tasks 
+    from the pool's queue, each to run a trial for any sub train job that has been scheduled on the pool.
+    '''
+    def __init__(self, service_id, pool_id, db=None, cache=None, artifact_store=None):
+        if cache is None:
+            cache = Cache()
+
+        super().__init__(service_id, db=db, artifact_store=artifact_store)
+        self._pool_id = pool_id
+        self._cache = cache
+        self._task = None
+
+    def start(self):
+        logger.info('Starting train worker for pool of ID "{}"...'.format(self._pool_id))
+
+        while True:
+            self._task = self._cache.pop_train_task_of_pool(self._pool_id, TRAIN_WORKER_POOL_TASK_WAIT)
+            if self._task is None:
+                continue
+
+            self._run_task(self._task['sub_train_job_id'])
+            self._task = None
+
+    def stop(self):
+        super().stop()
+
+        # Return the task of the interrupted trial to the pool, so that another train worker runs the trial
+        if self._task is not None:
+            logger.info('Returning task of interrupted trial to pool...')
+            self._cache.add_train_tasks_of_pool([self._task], self._pool_id, at_front=True)
+            self._task = None
+
+    def _run_task(self, sub_train_job_id):
+        with self._db:
+            sub_train_job = self._db.get_sub_train_job(sub_train_job_id)
+            if sub_train_job is None or sub_train_job.status == TrainJobStatus.STOPPED:
+                logger.info('Skipping task of stopped sub train job of ID "{}"'.format(sub_train_job_id))
+                return
+
+            (budget, model_id, model_class, \
+                task, train_dataset_uri, test_dataset_uri) = self._read_task_info(sub_train_job)
+
+            trial = self._claim_trial(sub_train_job_id, model_id, budget)
+            self._db.commit()
+            if trial is None:
+                logger.info('Skipping task as all trials of sub train job have been claimed')
+                return
+
+            self._trial_id = trial.id
+            logger.info('Claimed trial of ID "{}" in DB'.format(self._trial_id))
+            phase_recorder.start()
+
+        try:
+            logger.info('Loading model class...')
+            with phase_recorder.phase('load_model_class'):
+                clazz = self._load_model_class(model_id, model_class)
+
+            # All train workers running trials for the sub train job share its advisor
+            advisor_id = self._create_advisor(clazz, advisor_id=sub_train_job_id, 
+                                            early_stopping=budget.get(BudgetType.EARLY_STOPPING))
+            self._perform_trial(clazz, advisor_id, task, train_dataset_uri, test_dataset_uri)
+
+        except Exception:
+            logger.error('Error while running trial:')
+            logger.error(traceback.format_exc())
+            self._mark_trial_as_errored()
+            self._trial_id = None
+
+        # Stop sub train job once its budget is reached by the train workers in the pool
+        with self._db:
+            if self._if_budget_reached(budget, sub_train_job_id):
+                logger.info('Budget for sub train job has reached')
+                sub_train_job = self._db.get_sub_train_job(sub_train_job_id)
+                if sub_train_job.status != TrainJobStatus.STOPPED:
+                    self._db.mark_sub_train_job_as_stopped(sub_train_job)
+                    self._db.commit()
+                    self._delete_advisor(sub_train_job_id)
+
+    def _read_task_info(self, sub_train_job):
+        train_job = self._db.get_train_job(sub_train_job.train_job_id)
+        model = self._db.get_model(sub_train_job.model_id)
+
+        if model is None:
+            raise InvalidModelException()
+
+        if train_job is None:
+            raise InvalidTrainJobException()
+
+        return (
+            train_job.budget,
+            model.id,
+            model.model_class,
+            train_job.task,
+            train_job.train_dataset_uri,
+            train_job.test_dataset_uri
+        )
+
+# Runs trials of the train worker's service in a child process of the train worker, with its own 
+# connections to DB & admin, marking its current trial as terminated when the process is signalled to stop
+# Exits once the budget is reached, leaving the train worker to stop its service, or with an error if a trial errors
+def _run_trials_in_process(service_id):
+    worker = None
+
+    def _sigterm_handler(_signo, _stack_frame):
+        if worker is not None:
+            worker.stop()
+        os._exit(0)
+
+    # Replace signal handlers of the service inherited from the train worker
+    signal.signal(signal.SIGTERM, _sigterm_handler)
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Train worker stops trial processes on interrupt
+
+    worker = TrainWorker(service_id)
+    (is_budget_reached, _) = worker._run_trials()
+    if not is_budget_reached:
+        sys.exit(1)
+
 class ModelLoggerHandler(logging.Handler):
-    def __init__(self, handle_log):
+    def __init__(self, handle_log, is_rate_limited=True, ignored_loggers=[]):
         logging.Handler.__init__(self)
         self._handle_log = handle_log
+        self._is_rate_limited = is_rate_limited
+        self._ignored_loggers = ignored_loggers
 
     def emit(self, record):
+        if any(record.name == x or record.name.startswith(x + '.') for x in self._ignored_loggers):
+            return
+
         log_line = record.msg
         log_lvl = record.levelname
-        self._handle_log(log_line, log_lvl)
+        self._handle_log(log_line, log_lvl, self._is_rate_limited)
       
\ No newline at end of file
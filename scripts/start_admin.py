@@ -1,8 +1,11 @@
 import os
+import threading
 
 from rafiki.utils.log import configure_logging
 from rafiki.admin import Admin
 from rafiki.admin.app import app
+from rafiki.admin.autoscaler import InferenceWorkerAutoscaler
+from rafiki.config import AUTOSCALER_ENABLED
 
 configure_logging('admin')
 
@@ -10,6 +13,13 @@ if __name__ == "__main__":
     # Run seed logic for admin at start-up
     admin = Admin()
     admin.seed()
+    admin.build_worker_images()
+    admin.create_warm_worker_pools()
+
+    # Run autoscaler of inference workers in background
+    if AUTOSCALER_ENABLED:
+        autoscaler = InferenceWorkerAutoscaler()
+        threading.Thread(target=autoscaler.start, daemon=True).start()
 
     # Run Flask app
     app.run(
@@ -28,6 +28,13 @@ docker run --rm --name $ADMIN_HOST \
   -e LOGS_DOCKER_WORKDIR_PATH=$LOGS_DOCKER_WORKDIR_PATH \
   -e DATA_DOCKER_WORKDIR_PATH=$DATA_DOCKER_WORKDIR_PATH \
   -e DOCKER_WORKDIR_PATH=$DOCKER_WORKDIR_PATH \
+  -e CONTAINER_MANAGER=$CONTAINER_MANAGER \
+  -e DOCKER_REGISTRY=$DOCKER_REGISTRY \
+  -e ARTIFACT_STORE=$ARTIFACT_STORE \
+  ${ARTIFACT_STORE_S3_BUCKET:+-e ARTIFACT_STORE_S3_BUCKET=$ARTIFACT_STORE_S3_BUCKET} \
+  ${ARTIFACT_STORE_S3_ENDPOINT_URL:+-e ARTIFACT_STORE_S3_ENDPOINT_URL=$ARTIFACT_STORE_S3_ENDPOINT_URL} \
+  ${AWS_ACCESS_KEY_ID:+-e AWS_ACCESS_KEY_ID=$AWS_ACCESS_KEY_ID} \
+  ${AWS_SECRET_ACCESS_KEY:+-e AWS_SECRET_ACCESS_KEY=$AWS_SECRET_ACCESS_KEY} \
   -v /var/run/docker.sock:/var/run/docker.sock \
   $VOLUME_MOUNTS \
   -p $ADMIN_EXT_PORT:$ADMIN_PORT \
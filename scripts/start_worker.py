@@ -1,27 +1,42 @@
 import os
+import sys
+import uuid
+import signal
+import threading
 from rafiki.utils.service import run_service
 from rafiki.db import Database
+from rafiki.cache import Cache
 from rafiki.constants import ServiceType
+from rafiki.config import WARM_WORKER_HEARTBEAT_INTERVAL
 
-# Run install command
-install_command = os.environ.get('WORKER_INSTALL_COMMAND', '')
-exit_code = os.system(install_command)
-if exit_code != 0: 
-    raise Exception('Install command gave non-zero exit code: "{}"'.format(install_command))
+# Run install command, unless it has already been run in this container
+if os.environ.get('WORKER_INSTALLED') != '1':
+    install_command = os.environ.get('WORKER_INSTALL_COMMAND', '')
+    if install_command != '' and 'WORKER_WHEELHOUSE_PATH' in os.environ:
+        from rafiki.model import make_wheelhouse_install_command
+        install_command = make_wheelhouse_install_command(install_command, os.environ['WORKER_WHEELHOUSE_PATH'])
+    exit_code = os.system(install_command)
+    if exit_code != 0: 
+        raise Exception('Install command gave non-zero exit code: "{}"'.format(install_command))
 
 worker = None
 
 def start_service(service_id, service_type):
     global worker
 
-    if service_type == ServiceType.TRAIN:
+    if service_type == ServiceType.TRAIN and 'RAFIKI_TRAIN_POOL_ID' in os.environ:
+        from rafiki.worker import PooledTrainWorker
+        worker = PooledTrainWorker(service_id, os.environ['RAFIKI_TRAIN_POOL_ID'])
+        worker.start()
+    elif service_type == ServiceType.TRAIN:
         from rafiki.worker import TrainWorker
-        worker = TrainWorker(service_id)
+        parallel_trials = int(os.environ.get('WORKER_PARALLEL_TRIALS', 1))
+        worker = TrainWorker(service_id, parallel_trials=parallel_trials)
         worker.start()
     elif service_type == ServiceType.INFERENCE:
         from rafiki.worker import InferenceWorker
         worker = InferenceWorker(service_id)
-        worker.start()
+        return worker.start()
     else:
         raise Exception('Invalid service type: {}'.format(service_type))
 
@@ -30,5 +45,57 @@ def end_service(service_id, service_type):
     if worker is not None:
         worker.stop()    
 
-db = Database()
-run_service(db, start_service, end_service)
+def drain_service(service_id, service_type):
+    global worker
+
+    # Only inference workers drain their in-flight queries
+    if service_type == ServiceType.INFERENCE and worker is not None:
+        worker.drain()
+        return True
+
+    return False
+
+# As a warm worker in a pool, wait for a service to be assigned, then run it
+# After the service ends, restart this process to wait for the next assignment with a clean state
+def run_warm_worker(pool_id):
+    cache = Cache()
+    replica_id = str(uuid.uuid4())
+
+    # Keep sending heartbeats while idle, so that this warm worker is only taken from the pool while it is alive
+    is_assigned = threading.Event()
+    def send_heartbeats():
+        while True:
+            try:
+                cache.add_idle_warm_worker(replica_id, pool_id)
+            except Exception:
+                pass
+            if is_assigned.wait(WARM_WORKER_HEARTBEAT_INTERVAL):
+                break
+
+    threading.Thread(target=send_heartbeats, daemon=True).start()
+    assignment = cache.wait_for_warm_worker_assignment(replica_id)
+    is_assigned.set()
+    pool_environment_vars = dict(os.environ)
+    os.environ.update({ k: str(v) for (k, v) in assignment['environment_vars'].items() })
+
+    # Stopping the service is signalled through the cache, instead of by stopping the container
+    def wait_for_stop():
+        cache.wait_for_warm_worker_stop(replica_id)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+
+    try:
+        db = Database()
+        run_service(db, start_service, end_service, drain_service)
+    except BaseException:
+        pass
+
+    os.execve(sys.executable, [sys.executable] + sys.argv, 
+            { **pool_environment_vars, 'WORKER_INSTALLED': '1' })
+
+if 'RAFIKI_WARM_POOL_ID' in os.environ and 'RAFIKI_SERVICE_ID' not in os.environ:
+    run_warm_worker(os.environ['RAFIKI_WARM_POOL_ID'])
+else:
+    db = Database()
+    run_service(db, start_service, end_service, drain_service)